@@ -0,0 +1,57 @@
+# src/benchmarks/bench_flow_pool.py
+#
+# Multi-day hourly USDT pull: one Snowflake login per window (old behaviour) vs a shared pool.
+# Uses SQLite as a local stand-in DB-API backend with an artificial login delay.
+# Run from src/:  python -m benchmarks.bench_flow_pool
+
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fakes import build_standin_warehouse, standin_connect
+from flowAnalysis.connection_pool import ConnectionPool
+from flowAnalysis.flowfetcher import fetch_usdt_flows_hourly_chunks, DIM_LABELS_SQL, query_frame
+from flowAnalysis.label_index import LabelIndex
+
+LOGIN_SECONDS = 0.05  # Snowflake logins + session setup are typically far slower than this
+DAYS = 3
+TRANSFERS_PER_HOUR = 200
+START = datetime(2024, 3, 1)
+
+
+class PerCallPool(ConnectionPool):
+    """Baseline: a fresh login for every query, like the original fetcher."""
+
+    def run(self, fn):
+        conn = self._connect()
+        try:
+            return fn(conn)
+        finally:
+            conn.close()
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), "warehouse.db")
+    build_standin_warehouse(path, START, DAYS, TRANSFERS_PER_HOUR)
+    end = START + timedelta(days=DAYS)
+    labels = LabelIndex.from_frame(query_frame(standin_connect(path, 0)(), DIM_LABELS_SQL))
+
+    t0 = time.perf_counter()
+    per_call_pool = PerCallPool(standin_connect(path, LOGIN_SECONDS))
+    baseline = fetch_usdt_flows_hourly_chunks(START, end, pool=per_call_pool, labels=labels)
+    per_call = time.perf_counter() - t0
+
+    pool = ConnectionPool(standin_connect(path, LOGIN_SECONDS), max_size=2)
+    t0 = time.perf_counter()
+    pooled = fetch_usdt_flows_hourly_chunks(START, end, pool=pool, labels=labels)
+    shared = time.perf_counter() - t0
+
+    assert len(baseline) == len(pooled)
+    print(f"{DAYS} days / {DAYS * 24} hourly windows, {len(pooled):,} rows")
+    print(f"connect per window: {per_call:.2f}s")
+    print(f"shared pool:        {shared:.2f}s  ({per_call / shared:.1f}x)  stats={pool.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# src/benchmarks/bench_fred_fetch.py
+#
+# Sequential vs concurrent FRED fetching against a local stand-in FRED server.
+# Run from src/:  python -m benchmarks.bench_fred_fetch
+
+import time
+
+from benchmarks.fakes import start_fake_fred
+from requestScheduler import DEFAULT_ENDPOINTS, get_scheduler
+from treasuryData.fetch import fetch_yield_data, fetch_many_yield_series
+
+LATENCY_SECONDS = 0.15
+N_SERIES = 12
+START, END = "2000-01-01", "2024-12-31"
+
+
+def main():
+    server, url = start_fake_fred(LATENCY_SECONDS)
+    series_ids = [f"SERIES{i}" for i in range(N_SERIES)]
+
+    t0 = time.perf_counter()
+    for sid in series_ids:
+        fetch_yield_data(sid, "test", START, END, base_url=url)
+    sequential = time.perf_counter() - t0
+    print(f"sequential:          {sequential:.2f}s")
+
+    for workers in (4, 8):
+        # A fresh FRED budget per run, so each one starts with the full 120-request burst
+        get_scheduler().configure("fred", **DEFAULT_ENDPOINTS["fred"])
+        t0 = time.perf_counter()
+        results, errors = fetch_many_yield_series(
+            series_ids, "test", START, END, max_workers=workers, base_url=url
+        )
+        elapsed = time.perf_counter() - t0
+        assert len(results) == N_SERIES and not errors
+        print(f"concurrent ({workers} workers): {elapsed:.2f}s  ({sequential / elapsed:.1f}x)")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
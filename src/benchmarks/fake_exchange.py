@@ -0,0 +1,91 @@
+# src/benchmarks/fake_exchange.py
+#
+# Deterministic, offline stand-in for a ccxt exchange: trades arrive on a fixed schedule with a
+# synthetic price path, so pagination, tailing and aggregation can be exercised without network.
+
+import math
+import time
+
+TRADE_FIELDS = ("timestamp", "id", "side", "price", "amount", "cost")
+
+
+class FakeExchange:
+    """
+    Synthetic exchange listing one trade every `interval_ms` from `start_ms` up to `clock()`
+    (seconds, defaults to wall time). Trade i is always the same, so pages are reproducible and
+    re-requests return identical trades, as a real exchange would. Every symbol in `symbols` is
+    listed in `markets` and served the same stream.
+    """
+
+    id = "fake"
+    rateLimit = None
+    timeframes = {"1m": "1m", "5m": "5m", "15m": "15m", "1h": "1h", "4h": "4h", "1d": "1d"}
+
+    def __init__(self, start_ms: int, interval_ms: int = 1000, clock=None, price: float = 95.0,
+                 page_limit: int = 1000, symbols=("USDT/TRY",)):
+        self.markets = {s: {"symbol": s, "base": s.split("/")[0], "quote": s.split("/")[1], "spot": True}
+                        for s in symbols}
+        self.currencies = {}
+        self.start_ms = start_ms
+        self.interval_ms = interval_ms
+        self.clock = clock or time.time
+        self.price = price
+        self.page_limit = page_limit
+        self.calls = 0
+
+    def _trade(self, i: int) -> dict:
+        price = self.price * (1 + 0.002 * math.sin(i * 0.013) + 0.0005 * math.sin(i * 0.37))
+        amount = 1.0 + (i * 7919 % 1000) / 100.0
+        ts = self.start_ms + i * self.interval_ms
+        return {
+            "timestamp": ts, "datetime": None, "symbol": None, "id": str(i), "order": None,
+            "type": None, "side": "buy" if i * 2654435761 % 7 < 4 else "sell", "takerOrMaker": None,
+            "price": price, "amount": amount, "cost": price * amount,
+            "fee": None, "fees": [], "info": {"i": i},
+        }
+
+    def _range(self, since: int, limit: int):
+        now_ms = int(self.clock() * 1000)
+        first = max(0, -(-(since - self.start_ms) // self.interval_ms)) if since is not None else 0
+        last = (now_ms - self.start_ms) // self.interval_ms   # inclusive; nothing from the future
+        if since is None:
+            first = max(0, last - limit + 1)
+        return range(first, min(last + 1, first + min(limit or self.page_limit, self.page_limit)))
+
+    def fetch_trades(self, symbol: str, since: int = None, limit: int = None, params=None) -> list:
+        self.calls += 1
+        return [dict(self._trade(i), symbol=symbol) for i in self._range(since, limit)]
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = "1m", since: int = None, limit: int = None,
+                    params=None) -> list:
+        """Bars built from the same trade stream, so trade and OHLCV paths agree."""
+        from flowAnalysis.trade_bars import RESOLUTIONS, trades_to_bars
+
+        self.calls += 1
+        tf_ms = RESOLUTIONS[timeframe]
+        limit = min(limit or self.page_limit, self.page_limit)
+        since = since if since is not None else self.start_ms
+        since = -(-since // tf_ms) * tf_ms
+        end = min(since + limit * tf_ms, int(self.clock() * 1000))
+        trades = [self._trade(i) for i in self._range(since, (end - since) // self.interval_ms + 1)
+                  if self._trade(i)["timestamp"] < end]
+        if not trades:
+            return []
+        bars = trades_to_bars(trades, timeframe)
+        # Integer ms timestamps like ccxt's; `.values` on the mixed frame would upcast them to float
+        return [[int(ts), *row] for ts, *row in
+                bars[["timestamp", "open", "high", "low", "close", "volume"]].itertuples(index=False)]
+
+
+class FakeAsyncExchange(FakeExchange):
+    """Same trade stream behind awaitable methods, like ccxt.async_support."""
+
+    async def fetch_trades(self, symbol: str, since: int = None, limit: int = None, params=None) -> list:
+        return FakeExchange.fetch_trades(self, symbol, since, limit, params)
+
+    async def fetch_ohlcv(self, symbol: str, timeframe: str = "1m", since: int = None, limit: int = None,
+                          params=None) -> list:
+        return FakeExchange.fetch_ohlcv(self, symbol, timeframe, since, limit, params)
+
+    async def close(self):
+        pass
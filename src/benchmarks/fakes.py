@@ -0,0 +1,81 @@
+# src/benchmarks/fakes.py
+#
+# Local stand-ins for the network layers: an HTTP server speaking FRED's observations API and a
+# SQLite file shaped like the Snowflake tables, reached through the same DB-API calls. The ccxt
+# layer is faked by benchmarks.fake_exchange.
+
+import json
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks.generators import fred_observations, label_rows, transfer_rows, wallet_addresses
+
+FRED_LATENCY_SECONDS = 0.15
+LOGIN_SECONDS = 0.05  # Snowflake logins + session setup are typically far slower than this
+
+
+# ──────────────────────────────────────────────────────────────
+# 🌐 FRED over HTTP
+# ──────────────────────────────────────────────────────────────
+class FakeFredHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    latency = FRED_LATENCY_SECONDS
+
+    def do_GET(self):
+        qs = parse_qs(urlparse(self.path).query)
+        time.sleep(self.latency)
+        body = json.dumps({"observations": fred_observations(
+            qs["series_id"][0], qs["observation_start"][0], qs["observation_end"][0]
+        )}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_fred(latency=FRED_LATENCY_SECONDS):
+    """Serve FRED observations on a free local port; returns (server, observations URL)."""
+    handler = type("FakeFredHandler", (FakeFredHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/fred/series/observations"
+
+
+# ──────────────────────────────────────────────────────────────
+# ❄️ Snowflake over DB-API (SQLite)
+# ──────────────────────────────────────────────────────────────
+def build_standin_warehouse(path, start=datetime(2024, 3, 1), days=3, per_hour=200, seed=11):
+    """Create a SQLite file shaped like CORE.ez_token_transfers + CORE.DIM_LABELS."""
+    rng = random.Random(seed)
+    addresses = wallet_addresses(rng)
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE ez_token_transfers (block_timestamp TEXT, tx_hash TEXT, from_address TEXT,
+                                         to_address TEXT, amount REAL, symbol TEXT);
+        CREATE TABLE DIM_LABELS (address TEXT, label TEXT);
+    """)
+    db.executemany("INSERT INTO DIM_LABELS VALUES (?, ?)", label_rows(rng, addresses))
+    db.executemany("INSERT INTO ez_token_transfers VALUES (?, ?, ?, ?, ?, ?)",
+                   transfer_rows(rng, addresses, start, days, per_hour))
+    db.execute("CREATE INDEX ix_transfers_ts ON ez_token_transfers (block_timestamp)")
+    db.commit()
+    db.close()
+
+
+def standin_connect(path, login_seconds=LOGIN_SECONDS):
+    """Connection factory for ConnectionPool: each login sleeps `login_seconds`, then attaches `path` as CORE."""
+    def _connect():
+        time.sleep(login_seconds)
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        conn.execute("ATTACH DATABASE ? AS CORE", (path,))
+        return conn
+    return _connect
@@ -0,0 +1,65 @@
+# src/benchmarks/generators.py
+#
+# Deterministic synthetic inputs shaped like the real sources: FRED observations, Snowflake
+# transfer rows and ccxt trades. The same seed always produces the same data, so benchmark runs
+# on different commits process identical inputs.
+
+import random
+from datetime import date, timedelta
+
+import numpy as np
+
+LABELS = ("binance", "kraken", "okx")
+
+
+def fred_observations(series_id, start, end):
+    """Weekday observations for [start, end] as FRED returns them, with the odd "." gap."""
+    day = date.fromisoformat(start)
+    stop = date.fromisoformat(end)
+    seed = sum(map(ord, series_id))
+    obs = []
+    while day <= stop:
+        if day.weekday() < 5:
+            value = "." if (day.toordinal() + seed) % 97 == 0 else f"{(day.toordinal() % 500 + seed) / 100:.2f}"
+            obs.append({"realtime_start": end, "realtime_end": end, "date": day.isoformat(), "value": value})
+        day += timedelta(days=1)
+    return obs
+
+
+def wallet_addresses(rng: random.Random, n=2_000):
+    return [f"0x{rng.getrandbits(160):040X}" for _ in range(n)]
+
+
+def label_rows(rng: random.Random, addresses, n_labeled=300):
+    """(address, label) rows like CORE.DIM_LABELS, covering the first `n_labeled` addresses."""
+    return [(a.lower(), rng.choice(LABELS)) for a in addresses[:n_labeled]]
+
+
+def transfer_rows(rng: random.Random, addresses, start, days, per_hour):
+    """Evenly spaced USDT transfers like CORE.ez_token_transfers rows, `per_hour` every hour."""
+    rows = []
+    for i in range(days * 24 * per_hour):
+        ts = start + timedelta(seconds=i * 3600 / per_hour)
+        rows.append((f"{ts:%Y-%m-%d %H:%M:%S}", f"0x{rng.getrandbits(256):064x}", rng.choice(addresses),
+                     rng.choice(addresses), round(rng.uniform(1, 50_000), 2), "USDT"))
+    return rows
+
+
+def trade_arrays(rng: np.random.Generator, n_trades, span_days, start_ms):
+    """Columnar trades (as TradeBuffer.arrays() returns them) scattered over `span_days`."""
+    ts = np.sort(start_ms + rng.integers(0, span_days * 86_400_000, n_trades))
+    price = 90 + np.cumsum(rng.normal(0, 0.01, n_trades))
+    amount = rng.lognormal(3, 1.2, n_trades)
+    side = rng.choice(np.array([1, -1], dtype="int8"), n_trades)
+    return {"timestamp": ts, "price": price, "amount": amount, "cost": price * amount, "side": side}
+
+
+def trade_pages(exchange, symbol, since, end_ms, limit=1000):
+    """Consecutive fetch_trades pages from `exchange` (e.g. a FakeExchange) covering [since, end_ms)."""
+    while since < end_ms:
+        page = exchange.fetch_trades(symbol, since=since, limit=limit)
+        if not page:
+            return
+        yield page
+        since = page[-1]["timestamp"] + 1
+
@@ -0,0 +1,487 @@
+# src/benchmarks/suite.py
+#
+# Per-stage benchmarks of the FRED, Snowflake-flow and fiat-trade pipelines on deterministic
+# synthetic data behind local fakes (no network). Each stage reports throughput and peak traced
+# memory; a run is saved as JSON so two commits can be compared for regressions.
+# Run from src/:  python -m benchmarks.suite [--quick] [--only fred.] [--out results.json]
+#                 python -m benchmarks.suite --compare base.json [new.json] [--threshold 0.1]
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+import bigQueryUtils
+import exportUtils
+from benchmarks.fake_exchange import FakeExchange
+from benchmarks.fakes import build_standin_warehouse, standin_connect, start_fake_fred
+from benchmarks.generators import fred_observations, trade_arrays, trade_pages
+from flowAnalysis.connection_pool import ConnectionPool
+from flowAnalysis.fiat_scanner import export_pair_trades
+from flowAnalysis.fiat_tracker import fetch_fiat_stable_trades
+from flowAnalysis.flowfetcher import DIM_LABELS_SQL, fetch_usdt_flows_hourly_chunks, prepare_flow_chunk, query_frame
+from flowAnalysis.label_index import LabelIndex
+from flowAnalysis.market_cache import register_exchange
+from flowAnalysis.trade_bars import aggregate_trades
+from flowAnalysis.trade_buffer import TradeBuffer
+from requestScheduler import DEFAULT_ENDPOINTS, get_scheduler
+from treasuryData.align import align_series, aligned_frame
+from treasuryData.cache import ObservationCache
+from treasuryData.fetch import fetch_many_yield_series
+from treasuryData.pipeline import merge_yield_series_incremental
+from treasuryData.transform import clean_yield_data, spread_matrix
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+REPEATS = 3
+REGRESSION_THRESHOLD = 0.10
+MEMORY_NOISE_MB = 1.0      # peak-memory changes smaller than this are never flagged
+
+SCALES = {
+    "quick": {"fred_series": 6, "fred_start": "2015-01-01", "fred_latency": 0.01,
+              "flow_days": 1, "flow_per_hour": 200, "trade_hours": 6, "trade_interval_ms": 500,
+              "agg_trades": 500_000},
+    "full": {"fred_series": 24, "fred_start": "1990-01-01", "fred_latency": 0.05,
+             "flow_days": 3, "flow_per_hour": 1_000, "trade_hours": 24, "trade_interval_ms": 250,
+             "agg_trades": 5_000_000},
+}
+FRED_END = "2024-12-31"
+FLOW_START = datetime(2024, 3, 1)
+TRADE_START = datetime(2024, 3, 1)
+EXPORT_SPILL_ROWS = 10_000
+UPLOAD_CHUNK_BYTES = 8 * 1024 ** 2   # small enough that the benchmark frames split into several chunks
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str, stage: str):
+    """
+    Register `fn(size, stack) -> (run, rows)`: setup happens in `fn` and is not timed; `run()` is
+    the timed stage and `rows` the number of records it processes. Cleanup goes on `stack`.
+    """
+    def _register(fn):
+        BENCHMARKS[name] = (stage, fn)
+        return fn
+    return _register
+
+
+# ──────────────────────────────────────────────────────────────
+# 🏦 FRED
+# ──────────────────────────────────────────────────────────────
+def _series_ids(size):
+    return [f"SERIES{i}" for i in range(size["fred_series"])]
+
+
+def _spreads(series_ids):
+    return [(a, b) for a, b in zip(series_ids[1:], series_ids[:-1])]
+
+
+def _fred_raw(size):
+    return {sid: fred_observations(sid, size["fred_start"], FRED_END) for sid in _series_ids(size)}
+
+
+@benchmark("fred.fetch", "fetch")
+def bench_fred_fetch(size, stack):
+    server, url = start_fake_fred(size["fred_latency"])
+    stack.callback(server.shutdown)
+    # The real 120/minute budget would dominate; only request handling is measured here
+    get_scheduler().configure("fred", max_retries=0)
+    stack.callback(lambda: get_scheduler().configure("fred", **DEFAULT_ENDPOINTS["fred"]))
+    series_ids = _series_ids(size)
+    rows = sum(len(obs) for obs in _fred_raw(size).values())
+
+    def run():
+        results, errors = fetch_many_yield_series(series_ids, "bench", size["fred_start"], FRED_END,
+                                                  max_workers=8, base_url=url)
+        assert not errors, errors
+    return run, rows
+
+
+@benchmark("fred.clean", "clean")
+def bench_fred_clean(size, stack):
+    raw = _fred_raw(size)
+
+    def run():
+        for sid, obs in raw.items():
+            clean_yield_data(obs, sid)
+    return run, sum(len(obs) for obs in raw.values())
+
+
+@benchmark("fred.merge", "merge")
+def bench_fred_merge(size, stack):
+    raw = _fred_raw(size)
+    cleaned = []
+    for sid, obs in raw.items():
+        df = clean_yield_data(obs, sid)
+        cleaned.append((sid, df["date"].to_numpy(), df[sid].to_numpy(dtype="float64")))
+    spreads = _spreads(list(raw))
+
+    def run():
+        dates, block, columns = align_series(cleaned)
+        names, values = spread_matrix(block, columns, spreads)
+        aligned_frame(dates, np.hstack([block, values]), columns + names)
+    return run, sum(len(obs) for obs in raw.values())
+
+
+@benchmark("fred.pipeline", "merge")
+def bench_fred_pipeline(size, stack):
+    """merge_yield_series_incremental end to end, served from a warm ObservationCache."""
+    cache_dir = tempfile.mkdtemp(prefix="bench_fred_cache_")
+    stack.callback(shutil.rmtree, cache_dir, ignore_errors=True)
+    cache = ObservationCache(cache_dir)
+    raw = _fred_raw(size)
+    for sid, obs in raw.items():
+        cache.write(sid, obs, size["fred_start"], FRED_END)
+    series_ids = list(raw)
+
+    def run():
+        df = merge_yield_series_incremental(series_ids, "bench", size["fred_start"], FRED_END,
+                                            spreads_to_compute=_spreads(series_ids), cache=cache)
+        assert len(df)
+    return run, sum(len(obs) for obs in raw.values())
+
+
+# ──────────────────────────────────────────────────────────────
+# 🔄 USDT flows (Snowflake)
+# ──────────────────────────────────────────────────────────────
+def _flow_warehouse(size, stack):
+    workdir = tempfile.mkdtemp(prefix="bench_flows_")
+    stack.callback(shutil.rmtree, workdir, ignore_errors=True)
+    path = os.path.join(workdir, "warehouse.db")
+    build_standin_warehouse(path, FLOW_START, size["flow_days"], size["flow_per_hour"])
+    labels = LabelIndex.from_frame(query_frame(standin_connect(path, 0)(), DIM_LABELS_SQL))
+    return path, labels, workdir
+
+
+def _flow_frame(size, stack):
+    path, labels, workdir = _flow_warehouse(size, stack)
+    end = FLOW_START + timedelta(days=size["flow_days"])
+    df = fetch_usdt_flows_hourly_chunks(FLOW_START, end, pool=ConnectionPool(standin_connect(path, 0)), labels=labels)
+    return df, workdir
+
+
+@benchmark("flows.fetch", "fetch")
+def bench_flows_fetch(size, stack):
+    path, labels, _ = _flow_warehouse(size, stack)
+    pool = ConnectionPool(standin_connect(path, 0), max_size=4)
+    stack.callback(pool.close)
+    end = FLOW_START + timedelta(days=size["flow_days"])
+
+    def run():
+        return fetch_usdt_flows_hourly_chunks(FLOW_START, end, pool=pool, max_workers=4, labels=labels)
+    return run, len(run())
+
+
+@benchmark("flows.export", "export")
+def bench_flows_export(size, stack):
+    df, workdir = _flow_frame(size, stack)
+    runs = iter(range(1_000_000))
+
+    def run():
+        exportUtils.write_dataset(df, os.path.join(workdir, f"export_{next(runs)}"), exportUtils.USDT_FLOW_SCHEMA)
+    return run, len(df)
+
+
+def _encode_for_load(df, schema):
+    """Everything a chunked load does before its first request: Arrow cast, chunking, Parquet encode."""
+    return sum(buf.size for buf in bigQueryUtils.encode_for_load(df, schema, UPLOAD_CHUNK_BYTES))
+
+
+@benchmark("flows.upload_prep", "upload_prep")
+def bench_flows_upload_prep(size, stack):
+    df, _ = _flow_frame(size, stack)
+
+    def run():
+        _encode_for_load(prepare_flow_chunk(df.copy(), "bench"), bigQueryUtils.FLIPSIDE_SCHEMA)
+    return run, len(df)
+
+
+# ──────────────────────────────────────────────────────────────
+# 💱 Fiat ⇄ stablecoin trades (ccxt)
+# ──────────────────────────────────────────────────────────────
+def _trade_window(size):
+    start, end = TRADE_START, TRADE_START + timedelta(hours=size["trade_hours"])
+    start_ms, end_ms = (int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000) for dt in (start, end))
+    return start, end, start_ms, end_ms
+
+
+def _fake_exchange(size):
+    _, _, start_ms, end_ms = _trade_window(size)
+    # The clock stops at the window end, so the last page is short and the pull terminates
+    return FakeExchange(start_ms, interval_ms=size["trade_interval_ms"], clock=lambda: end_ms / 1000)
+
+
+def _trade_buffer(size, stack):
+    _, _, start_ms, end_ms = _trade_window(size)
+    # Small spill blocks, so exports see several chunks as long pulls do
+    buffer = TradeBuffer(spill_rows=EXPORT_SPILL_ROWS)
+    stack.callback(buffer.close)
+    for page in trade_pages(_fake_exchange(size), "USDT/TRY", start_ms, end_ms):
+        buffer.append(page)
+    return buffer
+
+
+@benchmark("fiat.fetch", "fetch")
+def bench_fiat_fetch(size, stack):
+    start, end, start_ms, end_ms = _trade_window(size)
+    register_exchange("fakebench", _fake_exchange(size))
+
+    def run():
+        df, summary = fetch_fiat_stable_trades("fakebench", "USDT", "TRY", start, end, resolution="1h")
+        assert summary["trades"] > 0
+    return run, (end_ms - start_ms) // size["trade_interval_ms"] + 1
+
+
+@benchmark("fiat.clean", "clean")
+def bench_fiat_clean(size, stack):
+    """ccxt trade dicts into the columnar TradeBuffer, the per-page cost of every trade pull."""
+    _, _, start_ms, end_ms = _trade_window(size)
+    pages = list(trade_pages(_fake_exchange(size), "USDT/TRY", start_ms, end_ms))
+
+    def run():
+        buffer = TradeBuffer()
+        try:
+            for page in pages:
+                buffer.append(page)
+            buffer.arrays()
+        finally:
+            buffer.close()
+    return run, sum(len(p) for p in pages)
+
+
+@benchmark("fiat.aggregate", "aggregate")
+def bench_fiat_aggregate(size, stack):
+    _, _, start_ms, _ = _trade_window(size)
+    arrays = trade_arrays(np.random.default_rng(11), size["agg_trades"], 30, start_ms)
+
+    def run():
+        aggregate_trades(arrays, ("1m", "1h", "1d"))
+    return run, size["agg_trades"]
+
+
+def _bench_fiat_export(size, stack, fmt):
+    buffer = _trade_buffer(size, stack)
+    workdir = tempfile.mkdtemp(prefix="bench_fiat_")
+    stack.callback(shutil.rmtree, workdir, ignore_errors=True)
+    runs = iter(range(1_000_000))
+
+    def run():
+        root = os.path.join(workdir, f"export_{next(runs)}")
+        export_pair_trades(buffer, "fake", "USDT/TRY", root, fmt)
+        if fmt == exportUtils.CSV:
+            # Every chunk must land in the pair's single CSV file
+            assert sum(1 for _ in open(os.path.join(root, "fake_USDT_TRY.csv"))) == len(buffer) + 1
+    return run, len(buffer)
+
+
+@benchmark("fiat.export", "export")
+def bench_fiat_export(size, stack):
+    return _bench_fiat_export(size, stack, exportUtils.PARQUET)
+
+
+@benchmark("fiat.export_csv", "export")
+def bench_fiat_export_csv(size, stack):
+    return _bench_fiat_export(size, stack, exportUtils.CSV)
+
+
+@benchmark("fiat.upload_prep", "upload_prep")
+def bench_fiat_upload_prep(size, stack):
+    buffer = _trade_buffer(size, stack)
+    bars = aggregate_trades(buffer.arrays(), ("1m",))["1m"]
+    bars = bars.assign(exchange="fake", symbol="USDT/TRY", adjusted_pair="USDT/TRY")
+
+    def run():
+        _encode_for_load(*bigQueryUtils.prepare_fiat_bars(bars, "bench"))
+    return run, len(bars)
+
+
+# ──────────────────────────────────────────────────────────────
+# ⏱️ Measurement
+# ──────────────────────────────────────────────────────────────
+def measure(name: str, size: dict, repeat: int = REPEATS) -> dict:
+    """Best-of-`repeat` wall time, then one traced run for the stage's peak Python/NumPy memory."""
+    stage, fn = BENCHMARKS[name]
+    quiet = io.StringIO()   # pipeline progress prints would swamp the report
+    with contextlib.ExitStack() as stack, contextlib.redirect_stdout(quiet):
+        run, rows = fn(size, stack)
+        run()   # warm-up: imports, sessions, pools, page cache
+
+        times = []
+        for _ in range(repeat):
+            gc.collect()
+            t0 = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - t0)
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "stage": stage,
+        "rows": int(rows),
+        "seconds": round(best, 4),
+        "mean_seconds": round(sum(times) / len(times), 4),
+        "runs": [round(t, 4) for t in times],
+        "rows_per_sec": round(rows / best, 1) if best else None,
+        "peak_mb": round(peak / 1024 ** 2, 2),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_suite(scale: str = "full", only=None, repeat: int = REPEATS) -> dict:
+    """Run every registered benchmark (or those whose name starts with one of `only`) and return the report."""
+    size = SCALES[scale]
+    names = [n for n in BENCHMARKS if not only or any(n.startswith(o) for o in only)]
+    results = {}
+    for name in names:
+        print(f"⏱️ {name:<18}", end=" ", flush=True)
+        try:
+            r = measure(name, size, repeat)
+        except Exception as e:
+            results[name] = {"stage": BENCHMARKS[name][0], "error": f"{type(e).__name__}: {e}"}
+            print(f"❌ {results[name]['error']}")
+            continue
+        results[name] = r
+        print(f"{r['rows']:>10,} rows  {r['seconds']:>8.3f}s  {r['rows_per_sec']:>12,.0f} rows/s  {r['peak_mb']:>8.1f} MB peak")
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "scale": scale,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            # Process-wide high-water mark (KiB on Linux), for context; per-stage peaks are traced
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+        "results": results,
+    }
+
+
+def save_report(report: dict, path: str = None) -> str:
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"{stamp}_{report['meta']['commit'] or 'nocommit'}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+# ──────────────────────────────────────────────────────────────
+# 📊 Compare
+# ──────────────────────────────────────────────────────────────
+def compare_reports(base: dict, new: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    """
+    Per-benchmark throughput and peak-memory ratios of `new` against `base`. A benchmark regresses
+    when its throughput drops, or its peak memory grows (by more than MEMORY_NOISE_MB), by more
+    than `threshold`.
+    """
+    rows = []
+    for name, b in base["results"].items():
+        n = new["results"].get(name)
+        if n is None or "error" in b or "error" in n:
+            continue
+        speed = n["rows_per_sec"] / b["rows_per_sec"] if b["rows_per_sec"] else None
+        memory = n["peak_mb"] / b["peak_mb"] if b["peak_mb"] else None
+        slower = speed is not None and speed < 1 - threshold
+        heavier = memory is not None and memory > 1 + threshold and n["peak_mb"] - b["peak_mb"] > MEMORY_NOISE_MB
+        rows.append({"name": name, "speed": speed, "memory": memory, "slower": slower, "heavier": heavier,
+                     "base": b, "new": n})
+    return rows
+
+
+def print_comparison(rows: list, base: dict, new: dict):
+    print(f"\n📊 {base['meta'].get('commit') or 'base'} ({base['meta'].get('scale')}) → "
+          f"{new['meta'].get('commit') or 'new'} ({new['meta'].get('scale')})")
+    if base["meta"].get("scale") != new["meta"].get("scale"):
+        print("⚠️ Reports were run at different scales; ratios are not comparable")
+    for r in rows:
+        flag = "❌" if r["slower"] or r["heavier"] else "✅"
+        speed = f"{r['speed']:.2f}x" if r["speed"] is not None else "n/a"
+        memory = f"{r['memory']:.2f}x" if r["memory"] is not None else "n/a"
+        print(f"{flag} {r['name']:<18} throughput {r['base']['rows_per_sec']:>12,.0f} → {r['new']['rows_per_sec']:>12,.0f} "
+              f"rows/s ({speed})   peak {r['base']['peak_mb']:>7.1f} → {r['new']['peak_mb']:>7.1f} MB ({memory})")
+    missing = sorted(set(base["results"]) ^ set(new["results"]))
+    if missing:
+        print(f"⚠️ Only in one report: {', '.join(missing)}")
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage benchmarks on synthetic data with local fakes")
+    parser.add_argument("--quick", action="store_true", help="Small inputs, for a fast smoke run")
+    parser.add_argument("--only", action="append", help="Benchmark name prefix, e.g. fred. or fiat.aggregate (repeatable)")
+    parser.add_argument("--repeat", type=int, default=REPEATS)
+    parser.add_argument("--out", help=f"Report path (default: {RESULTS_DIR}/<time>_<commit>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="REPORT",
+                        help="BASE [NEW]: compare two reports, or a fresh run against BASE")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Relative throughput drop / memory growth counted as a regression")
+    parser.add_argument("--list", action="store_true", help="List benchmarks and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (stage, _) in BENCHMARKS.items():
+            print(f"{name:<18} {stage}")
+        return 0
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes BASE and optionally NEW")
+
+    if args.compare and len(args.compare) == 2:
+        base, new = _load(args.compare[0]), _load(args.compare[1])
+    else:
+        base = _load(args.compare[0]) if args.compare else None
+        scale = "quick" if args.quick else (base["meta"]["scale"] if base else "full")
+        new = run_suite(scale, args.only, args.repeat)
+        print(f"💾 Saved {save_report(new, args.out)}")
+        if base is None:
+            return 0
+
+    rows = compare_reports(base, new, args.threshold)
+    print_comparison(rows, base, new)
+    regressions = [r["name"] for r in rows if r["slower"] or r["heavier"]]
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
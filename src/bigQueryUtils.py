@@ -1,35 +1,151 @@
 # src/bigquery_utils.py
+import atexit
+import io
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.api_core.exceptions import Conflict
 from google.cloud import bigquery
-from pandas.api.types import is_datetime64_any_dtype
+from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype
+from instrumentation import current_run_id, in_run_context
+from requestScheduler import get_scheduler
 
+AUDIT_TABLE = "load_audit_log"
+AUDIT_FLUSH_ROWS = 100
 
+# pandas_gbq if_exists values → load job write dispositions
+WRITE_DISPOSITIONS = {
+    "append": bigquery.WriteDisposition.WRITE_APPEND,
+    "replace": bigquery.WriteDisposition.WRITE_TRUNCATE,
+    "fail": bigquery.WriteDisposition.WRITE_EMPTY,
+}
 
-def get_latest_date_from_bq(project_id, dataset, table):
-    client = bigquery.Client(project=project_id)
-    query = f"""
-    SELECT MAX(date) as latest_date
-    FROM `{project_id}.{dataset}.{table}`
+
+# ──────────────────────────────────────────────────────────────
+# 🔌 Shared clients
+# ──────────────────────────────────────────────────────────────
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(project_id=None):
+    """
+    One bigquery.Client per project for the whole process (None = the credentials' default).
+    Clients are thread-safe and keep their authorized HTTP session, so auth and connection
+    setup happen once instead of on every call.
     """
-    result = client.query(query).result()
-    rows = list(result)
-    return rows[0].latest_date if rows else None
+    with _clients_lock:
+        if project_id not in _clients:
+            _clients[project_id] = bigquery.Client(project=project_id)
+        return _clients[project_id]
+
+
+def _sink():
+    # Imported here: warehouseSink builds its BigQuery sink on top of this module
+    from warehouseSink import get_sink
+    return get_sink()
+
+
+def get_latest_date_from_bq(project_id, dataset, table):
+    return _sink().latest_date(f"{project_id}.{dataset}.{table}")
 
 def upload_to_bigquery(df, dataset, table, project_id, mode="append"):
-    from pandas_gbq import to_gbq
+    # `mode` keeps pandas_gbq's if_exists values (append / replace / fail)
+    return _sink().append(df, f"{project_id}.{dataset}.{table}", mode=mode)
 
-    to_gbq(
-        df,
-        destination_table=f"{dataset}.{table}",
-        project_id=project_id,
-        if_exists=mode
-    )
 
-import pandas as pd
-from datetime import datetime
-from pandas_gbq import to_gbq
+# ──────────────────────────────────────────────────────────────
+# 📝 Buffered audit log
+# ──────────────────────────────────────────────────────────────
+AUDIT_SCHEMA = [
+    bigquery.SchemaField("project_id", "STRING"),
+    bigquery.SchemaField("dataset_id", "STRING"),
+    bigquery.SchemaField("table_name", "STRING"),
+    bigquery.SchemaField("start_date", "STRING"),
+    bigquery.SchemaField("end_date", "STRING"),
+    bigquery.SchemaField("row_count", "INTEGER"),
+    bigquery.SchemaField("status", "STRING"),
+    bigquery.SchemaField("error_message", "STRING"),
+    bigquery.SchemaField("load_time", "TIMESTAMP"),
+    # Stage metrics from instrumentation; plain load entries only carry run_id
+    bigquery.SchemaField("run_id", "STRING"),
+    bigquery.SchemaField("pipeline", "STRING"),
+    bigquery.SchemaField("stage", "STRING"),
+    bigquery.SchemaField("seconds", "FLOAT"),
+    bigquery.SchemaField("rows_in", "INTEGER"),
+    bigquery.SchemaField("bytes", "INTEGER"),
+    bigquery.SchemaField("peak_rss_mb", "FLOAT"),
+    bigquery.SchemaField("details", "STRING"),
+]
+
+
+class AuditLogBuffer:
+    """
+    Audit rows queued in memory and written with one load job per destination dataset on
+    `flush()`, rather than a job per row. Flushes by itself once `max_rows` rows are queued and
+    at interpreter exit; rows from a failed flush are kept for the next one.
+    """
+
+    def __init__(self, max_rows=AUDIT_FLUSH_ROWS):
+        self.max_rows = max_rows
+        self._rows = {}   # {(project_id, dataset_id): [row dicts]}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(rows) for rows in self._rows.values())
+
+    def add(self, project_id, dataset_id, row):
+        with self._lock:
+            self._rows.setdefault((project_id, dataset_id), []).append(row)
+        if len(self) >= self.max_rows:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._rows = self._rows, {}
+
+        written = 0
+        for (project_id, dataset_id), rows in pending.items():
+            client = get_client(project_id)
+            table_ref = f"{project_id or client.project}.{dataset_id}.{AUDIT_TABLE}"
+            df = pd.DataFrame(rows, columns=[f.name for f in AUDIT_SCHEMA])
+            # Field addition lets tables created before the stage-metric columns pick them up
+            job_config = bigquery.LoadJobConfig(schema=AUDIT_SCHEMA,
+                                                write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+                                                schema_update_options=[bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION])
+            try:
+                # Creates the table on first use, as to_gbq did
+                get_scheduler().call("bigquery", lambda: client.load_table_from_dataframe(df, table_ref, job_config=job_config).result())
+            except Exception as e:
+                print(f"❌ Audit log flush to {table_ref} failed, keeping {len(rows)} row(s): {e}")
+                with self._lock:
+                    self._rows[(project_id, dataset_id)] = rows + self._rows.get((project_id, dataset_id), [])
+                continue
+            written += len(rows)
+
+        if written:
+            print(f"📝 {written} audit log entr{'y' if written == 1 else 'ies'} written.")
+        return written
+
+
+_audit_log = AuditLogBuffer()
+atexit.register(_audit_log.flush)
+
+
+def flush_audit_log():
+    """Write all queued audit rows now; returns how many were written."""
+    return _sink().flush_audit()
+
 
 def log_load_metadata(project_id, dataset_id, table_name, start_date, end_date, row_count, status, error_msg):
-    log_df = pd.DataFrame([{
+    _sink().audit(project_id, dataset_id, {
         "project_id": project_id,
         "dataset_id": dataset_id,
         "table_name": table_name,
@@ -38,47 +154,213 @@ def log_load_metadata(project_id, dataset_id, table_name, start_date, end_date,
         "row_count": row_count,
         "status": status,
         "error_message": error_msg,
-        "load_time": datetime.utcnow()
-    }])
-
-    # Destination table in the form dataset.table
-    full_table_id = f"{dataset_id}.load_audit_log"
-
-    # This will auto-create the table if it doesn't exist
-    to_gbq(
-        dataframe=log_df,
-        destination_table=full_table_id,
-        project_id=project_id,
-        if_exists="append"
+        "load_time": pd.Timestamp.now(tz="UTC"),
+        "run_id": current_run_id(),
+    })
+
+    print("📝 Audit log entry queued.")
+
+
+
+# ──────────────────────────────────────────────────────────────
+# 📦 Chunked load jobs
+# ──────────────────────────────────────────────────────────────
+UPLOAD_CHUNK_BYTES = 128 * 1024 ** 2
+UPLOAD_MAX_PARALLEL = 4
+UPLOAD_JOB_TIMEOUT = 600
+
+ARROW_TO_BQ = [
+    (pa.types.is_boolean, "BOOLEAN"),
+    (pa.types.is_integer, "INTEGER"),
+    (pa.types.is_floating, "FLOAT"),
+    # Naive datetimes are wall-clock DATETIMEs, as load_table_from_dataframe maps them
+    (lambda t: pa.types.is_timestamp(t) and t.tz is None, "DATETIME"),
+    (pa.types.is_timestamp, "TIMESTAMP"),
+    (pa.types.is_date, "DATE"),
+]
+BQ_TO_ARROW = {"BOOLEAN": pa.bool_(), "INTEGER": pa.int64(), "FLOAT": pa.float64(), "STRING": pa.string(),
+               "TIMESTAMP": pa.timestamp("us", tz="UTC"), "DATETIME": pa.timestamp("us"), "DATE": pa.date32()}
+
+
+class UploadResult:
+    """
+    Outcome of a chunked load: one dict per chunk with its rows, Parquet bytes, seconds,
+    attempts, status ("loaded" / "failed") and error. `ok` is only true when every chunk loaded,
+    so callers can tell a partial load from a complete one.
+    """
+
+    def __init__(self, table_ref, chunks, seconds):
+        self.table_ref = table_ref
+        self.chunks = sorted(chunks, key=lambda c: c["chunk"])
+        self.seconds = seconds
+
+    @property
+    def loaded(self):
+        return [c for c in self.chunks if c["status"] == "loaded"]
+
+    @property
+    def failed(self):
+        return [c for c in self.chunks if c["status"] != "loaded"]
+
+    @property
+    def rows_loaded(self):
+        return sum(c["rows"] for c in self.loaded)
+
+    @property
+    def bytes_loaded(self):
+        return sum(c["bytes"] for c in self.loaded)
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    @property
+    def partial(self):
+        return bool(self.loaded) and bool(self.failed)
+
+    def to_dict(self):
+        return {"table": self.table_ref, "ok": self.ok, "rows_loaded": self.rows_loaded,
+                "bytes_loaded": self.bytes_loaded, "seconds": round(self.seconds, 3), "chunks": self.chunks}
+
+    def report(self):
+        status = "✅" if self.ok else ("⚠️" if self.partial else "❌")
+        print(f"{status} {self.table_ref}: {self.rows_loaded:,} rows / {self.bytes_loaded / 1e6:,.1f} MB loaded "
+              f"in {len(self.loaded)}/{len(self.chunks)} chunk(s), {self.seconds:.1f}s")
+        for c in self.failed:
+            print(f"   - chunk {c['chunk']} ({c['rows']:,} rows) failed after {c['attempts']} attempt(s): {c['error']}")
+
+
+def _arrow_for_schema(df, schema):
+    """
+    Arrow table of `df` with every column cast to the Arrow type its BigQuery field loads from,
+    plus the full schema. Undeclared columns get the type load_table_from_dataframe would infer;
+    timestamps always go out as microseconds, the finest precision BigQuery keeps.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    declared = {f.name: f for f in schema}
+    fields = []
+    for i, name in enumerate(table.column_names):
+        field = declared.get(name)
+        if field is None:
+            arrow_type = table.schema.field(i).type
+            field = bigquery.SchemaField(name, next((bq for check, bq in ARROW_TO_BQ if check(arrow_type)), "STRING"))
+        target = BQ_TO_ARROW.get(field.field_type)
+        if target is not None and table.schema.field(i).type != target:
+            table = table.set_column(i, name, table.column(i).cast(target))
+        fields.append(field)
+    return table, fields
+
+
+def _chunk_bounds(table, max_bytes):
+    """Row ranges whose Arrow size, an upper bound on their compressed Parquet size, fits `max_bytes`."""
+    per_row = max(1, table.nbytes // max(1, table.num_rows))
+    rows = max(1, max_bytes // per_row)
+    return [(start, min(rows, table.num_rows - start)) for start in range(0, table.num_rows, rows)]
+
+
+def _encode_chunk(table, start, length):
+    """Rows [start, start + length) of `table` as a Parquet buffer, the body of one load job."""
+    sink = pa.BufferOutputStream()
+    pq.write_table(table.slice(start, length), sink, compression="snappy")
+    return sink.getvalue()
+
+
+def _load_chunk(client, table, table_ref, fields, job_id, index, start, length, schema_update_options, timeout):
+    t0 = time.perf_counter()
+    buf = _encode_chunk(table, start, length)
+    out = {"chunk": index, "rows": length, "bytes": buf.size, "seconds": 0.0, "attempts": 0,
+           "status": "failed", "error": None, "job_id": job_id}
+
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        schema=fields,
+        write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        schema_update_options=schema_update_options,
     )
 
-    print("📝 Audit log entry inserted.")
+    def _submit(jid):
+        return client.load_table_from_file(io.BytesIO(buf.to_pybytes()), table_ref, job_id=jid,
+                                           job_config=job_config)
 
+    def _load():
+        out["attempts"] += 1
+        while True:
+            try:
+                job = _submit(out["job_id"])
+                break
+            except Conflict:
+                # An earlier attempt under this id was accepted. While it is pending, running or
+                # done without error, wait on it instead of appending the same rows twice; once it
+                # has failed it can never succeed, so move on to the next id of the fixed
+                # job_id, job_id_retry1, ... chain. A later call with the same job_id walks the
+                # same chain and ends on the job that loaded
+                job = client.get_job(out["job_id"])
+                if not (job.state == "DONE" and job.error_result):
+                    break
+                out["retry"] = out.get("retry", 0) + 1
+                out["job_id"] = f"{job_id}_retry{out['retry']}"
+        job.result(timeout=timeout)
+        return job.output_rows
 
+    try:
+        get_scheduler().call("bigquery", _load)
+        out["status"] = "loaded"
+    except Exception as e:
+        out["error"] = f"{type(e).__name__}: {e}"
+    out["seconds"] = round(time.perf_counter() - t0, 3)
+    return out
 
-def upload_fiat_trades_to_bq(df, project_id, dataset_id, table_id, tag):
-    #  Rename timestamp to match BigQuery schema if not already done
-    #  not sure why i keep getting this problem but this fixes it for now revisit anotehr time
-    if "timestamp" in df.columns and "date" not in df.columns:
-        df["date"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
-        df.drop(columns=["timestamp"], inplace=True)
 
-    elif "datetime" in df.columns and "date" not in df.columns:
-        df["date"] = pd.to_datetime(df["datetime"], utc=True, errors="coerce")
-        df.drop(columns=["datetime"], inplace=True)
+def load_job_id(*parts):
+    """A job id prefix built from `parts` (e.g. tag, file checksum, batch); BigQuery allows only [A-Za-z0-9_-]."""
+    return re.sub(r"[^A-Za-z0-9_-]", "_", "_".join(str(p) for p in parts))[:900]
 
-    #  Drop any leftover unwanted columns
-    for col in ["timestamp", "datetime", "Date_UTC_Time"]:
-        if col in df.columns:
-            df.drop(columns=[col], inplace=True)
 
-    df['label'] = tag  # Add a tag for traceability
+def plan_load(df, schema, max_chunk_bytes=UPLOAD_CHUNK_BYTES):
+    """
+    Everything a chunked load works out before its first request: the Arrow table of `df` cast to
+    `schema`, the job's full field list, and the (start, length) row range of every chunk.
+    """
+    table, fields = _arrow_for_schema(df, schema)
+    return table, fields, _chunk_bounds(table, max_chunk_bytes)
 
-    print("📋 Final column types before BigQuery upload:")
-    print(df.dtypes)
-    print("📋 Final columns:", df.columns.tolist())
 
-    schema = [
+def encode_for_load(df, schema, max_chunk_bytes=UPLOAD_CHUNK_BYTES):
+    """Yield the Parquet body of each load job upload_dataframe_chunked would submit for `df`, in order."""
+    table, _, bounds = plan_load(df, schema, max_chunk_bytes)
+    for start, length in bounds:
+        yield _encode_chunk(table, start, length)
+
+
+def upload_dataframe_chunked(df, table_ref, schema, client=None, max_chunk_bytes=UPLOAD_CHUNK_BYTES,
+                             max_parallel=UPLOAD_MAX_PARALLEL, timeout=UPLOAD_JOB_TIMEOUT,
+                             schema_update_options=None, job_id_prefix=None):
+    """
+    Append `df` to `table_ref` as size-bounded Parquet load jobs. The first chunk is loaded on its
+    own (it creates the table or adds fields); the rest are submitted `max_parallel` at a time.
+    Each chunk is retried on its own through the "bigquery" endpoint, under a job id that makes
+    resubmitting after a timeout safe. A stable `job_id_prefix` (see load_job_id) extends that
+    across calls: uploading the same rows again waits on the jobs that already loaded them
+    instead of appending a second copy. Never raises for a failed chunk; returns an UploadResult.
+    """
+    client = client or get_client()
+    t0 = time.perf_counter()
+    table, fields, bounds = plan_load(df, schema, max_chunk_bytes)
+    prefix = job_id_prefix or f"upload_{uuid.uuid4().hex}"
+
+    def _run(i):
+        start, length = bounds[i]
+        return _load_chunk(client, table, table_ref, fields, f"{prefix}_{i}", i, start, length,
+                           schema_update_options, timeout)
+
+    chunks = [_run(0)] if bounds else []
+    if len(bounds) > 1:
+        with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+            chunks += list(pool.map(in_run_context(_run), range(1, len(bounds))))
+    return UploadResult(table_ref, chunks, time.perf_counter() - t0)
+
+
+FIAT_BARS_SCHEMA = [
     bigquery.SchemaField("date", "TIMESTAMP"),
     bigquery.SchemaField("open", "FLOAT"),
     bigquery.SchemaField("high", "FLOAT"),
@@ -92,30 +374,58 @@ def upload_fiat_trades_to_bq(df, project_id, dataset_id, table_id, tag):
     bigquery.SchemaField("label", "STRING"),
     bigquery.SchemaField("usdt_volume", "FLOAT"),  #  NEW
     bigquery.SchemaField("fiat_volume", "FLOAT"),  #  NEW
-    ]
+    bigquery.SchemaField("quote_volume", "FLOAT"),
+    bigquery.SchemaField("buy_volume", "FLOAT"),
+    bigquery.SchemaField("sell_volume", "FLOAT"),
+    bigquery.SchemaField("trades", "INTEGER"),
+]
 
-    table_ref = f"{project_id}.{dataset_id}.{table_id}"
-    job_config = bigquery.LoadJobConfig(schema=schema)
+FLIPSIDE_SCHEMA = [
+    bigquery.SchemaField("date_UTC", "STRING"),
+    bigquery.SchemaField("tx_hash", "STRING"),
+    bigquery.SchemaField("from_address", "STRING"),
+    bigquery.SchemaField("from_entity", "STRING"),
+    bigquery.SchemaField("to_address", "STRING"),
+    bigquery.SchemaField("to_entity", "STRING"),
+    bigquery.SchemaField("usdt_amount", "FLOAT"),
+    bigquery.SchemaField("label", "STRING"),
+]
 
-    client = bigquery.Client(project=project_id)
-    print(f"🚀 Uploading to BigQuery: {table_ref}")
-    job = client.load_table_from_dataframe(df, table_ref, job_config=job_config)
-    job.result()
-    print("✅ Upload complete.")
 
-import time
-from google.api_core.exceptions import ServiceUnavailable, GoogleAPICallError
+def prepare_fiat_bars(df, tag):
+    """
+    Fiat bars from any path (trade aggregation, OHLCV fallback, tail flushes) in upload shape: one
+    UTC `date` column taken from `date`, `timestamp` or `datetime` (epoch ms or datetimes), no
+    leftover time columns, and the `label` tag. Returns a new frame and the FIAT_BARS_SCHEMA
+    fields it has; bars from exchange OHLCV lack the trade-derived columns.
+    """
+    source = next((c for c in ("date", "timestamp", "datetime") if c in df.columns), None)
+    out = df.drop(columns=[c for c in ("date", "timestamp", "datetime", "Date_UTC_Time") if c in df.columns])
+    if source is not None:
+        values = df[source]
+        out["date"] = (pd.to_datetime(values, unit="ms", utc=True, errors="coerce") if is_numeric_dtype(values)
+                       else pd.to_datetime(values, utc=True, errors="coerce"))
+    out["label"] = tag  # Add a tag for traceability
+    return out, [f for f in FIAT_BARS_SCHEMA if f.name in out.columns]
 
 
-from google.cloud import bigquery
-from pandas.api.types import is_datetime64_any_dtype
-import time
-from google.api_core.exceptions import ServiceUnavailable, GoogleAPICallError
+def upload_fiat_trades_to_bq(df, project_id, dataset_id, table_id, tag):
+    df, schema = prepare_fiat_bars(df, tag)
+
+    print("📋 Final column types before BigQuery upload:")
+    print(df.dtypes)
+    print("📋 Final columns:", df.columns.tolist())
 
-def upload_flipside_to_bq(df, dataset_id, table_id, tag, max_retries=3):
-    client = bigquery.Client()
-    project_id = client.project
     table_ref = f"{project_id}.{dataset_id}.{table_id}"
+    sink = _sink()
+    print(f"🚀 Uploading to {sink.name}: {table_ref}")
+    result = sink.append(df, table_ref, schema, allow_field_addition=True)
+    result.report()
+    return result
+
+def upload_flipside_to_bq(df, dataset_id, table_id, tag, job_id_prefix=None):
+    # The sink fills in the project (the credentials' default one for BigQuery)
+    table_ref = f"{dataset_id}.{table_id}"
 
     # Ensure datetime type for upload
     if "date" in df.columns and not is_datetime64_any_dtype(df["date"]):
@@ -130,32 +440,9 @@ def upload_flipside_to_bq(df, dataset_id, table_id, tag, max_retries=3):
     print("📋 Columns:", df.columns.tolist())
     print("📋 Preview:\n", df.head(2).to_dict())
 
-    schema = [
-        bigquery.SchemaField("date_UTC", "STRING"),
-        bigquery.SchemaField("tx_hash", "STRING"),
-        bigquery.SchemaField("from_address", "STRING"),
-        bigquery.SchemaField("from_entity", "STRING"),
-        bigquery.SchemaField("to_address", "STRING"),
-        bigquery.SchemaField("to_entity", "STRING"),
-        bigquery.SchemaField("usdt_amount", "FLOAT"),
-        bigquery.SchemaField("label", "STRING"),
-    ]
-
-    job_config = bigquery.LoadJobConfig(schema=schema)
-
-    for attempt in range(max_retries):
-        try:
-            print(f"🚀 Uploading to BigQuery: {table_ref} (Attempt {attempt + 1})")
-            job = client.load_table_from_dataframe(df, table_ref, job_config=job_config)
-            job.result(timeout=60)
-            print("✅ Upload complete.")
-            return
-        except ServiceUnavailable:
-            print(f"⚠️ Upload failed (503). Retrying in {2 ** attempt} seconds...")
-            time.sleep(2 ** attempt)
-        except GoogleAPICallError as e:
-            print(f"❌ Upload failed (API error): {e}")
-            return
-        except Exception as e:
-            print(f"❌ Unexpected error: {e}")
-            return
+    # Chunks load concurrently; 503s and timeouts are retried per chunk by the "bigquery" endpoint
+    sink = _sink()
+    print(f"🚀 Uploading to {sink.name}: {table_ref}")
+    result = sink.append(df, table_ref, FLIPSIDE_SCHEMA, job_id_prefix=job_id_prefix)
+    result.report()
+    return result
@@ -0,0 +1,237 @@
+# src/exportUtils.py
+#
+# Shared export layer for flow and fiat pulls: typed, compressed, day-partitioned Parquet by
+# default, with CSV kept as an opt-in format.
+
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.fs
+import pyarrow.parquet as pq
+
+PARQUET = "parquet"
+CSV = "csv"
+FORMATS = (PARQUET, CSV)
+
+# Hive partition key; deliberately not "date" so it never collides with the timestamp column
+PARTITION_KEY = "day"
+COMPRESSION = "zstd"
+
+USDT_FLOW_SCHEMA = pa.schema([
+    ("date", pa.timestamp("us", tz="UTC")),
+    ("tx_hash", pa.string()),
+    ("from_address", pa.string()),
+    ("from_entity", pa.string()),
+    ("to_address", pa.string()),
+    ("to_entity", pa.string()),
+    ("usdt_amount", pa.float64()),
+])
+
+FIAT_BAR_SCHEMA = pa.schema([
+    ("date", pa.timestamp("ms", tz="UTC")),
+    ("open", pa.float64()),
+    ("high", pa.float64()),
+    ("low", pa.float64()),
+    ("close", pa.float64()),
+    ("volume", pa.float64()),
+    # Only bars aggregated from trades carry these; exchange OHLCV bars leave them null
+    ("quote_volume", pa.float64()),
+    ("vwap", pa.float64()),
+    ("buy_volume", pa.float64()),
+    ("sell_volume", pa.float64()),
+    ("trades", pa.int64()),
+])
+
+FIAT_TRADE_SCHEMA = pa.schema([
+    ("date", pa.timestamp("ms", tz="UTC")),
+    ("exchange", pa.string()),
+    ("symbol", pa.string()),
+    ("id", pa.string()),
+    ("side", pa.string()),
+    ("price", pa.float64()),
+    ("amount", pa.float64()),
+    ("cost", pa.float64()),
+])
+
+
+def extension(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"❌ Unsupported export format '{fmt}' (expected one of {FORMATS})")
+    return f".{fmt}"
+
+
+def prompt_format():
+    """Ask for an export format until the answer is one of FORMATS; Enter picks Parquet."""
+    while True:
+        fmt = input(f"📦 Output format ({'/'.join(FORMATS)}, default: {PARQUET}): ").strip().lower() or PARQUET
+        if fmt in FORMATS:
+            return fmt
+        print(f"❌ Unsupported format '{fmt}'. Please enter one of: {', '.join(FORMATS)}")
+
+
+def conform(df, schema):
+    """
+    Cast a frame to `schema` as an Arrow table. Columns are matched case-insensitively (Snowflake
+    upper-cases unquoted aliases), missing columns become nulls and extra columns are dropped.
+    Naive timestamps are taken to be UTC.
+    """
+    by_lower = {str(c).lower(): c for c in df.columns}
+    arrays = []
+    for field in schema:
+        col = by_lower.get(field.name.lower())
+        if col is None:
+            arrays.append(pa.nulls(len(df), type=field.type))
+            continue
+
+        values = df[col]
+        if pa.types.is_timestamp(field.type):
+            if pd.api.types.is_numeric_dtype(values):
+                values = pd.to_datetime(values, unit="ms", utc=True, errors="coerce")
+            else:
+                values = pd.to_datetime(values, utc=True, errors="coerce")
+        elif pa.types.is_floating(field.type):
+            values = pd.to_numeric(values, errors="coerce")
+        elif pa.types.is_string(field.type):
+            values = values.astype(object).where(values.notna(), None)
+            values = values.map(lambda v: v if v is None else str(v))
+        arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+# ──────────────────────────────────────────────────────────────
+# ✍️ Streaming writers
+# ──────────────────────────────────────────────────────────────
+class ExportWriter:
+    """
+    Append batches to a single Parquet or CSV file (format taken from the file extension).
+    Parquet batches become row groups, so memory is bounded by the batch size.
+    """
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self.fmt = os.path.splitext(path)[1].lstrip(".")
+        extension(self.fmt)
+        self.rows = 0
+        self._writer = None
+
+    def write(self, df):
+        table = conform(df, self.schema)
+        if self._writer is None:
+            if self.fmt == PARQUET:
+                self._writer = pq.ParquetWriter(self.path, self.schema, compression=COMPRESSION)
+            else:
+                self._writer = pacsv.CSVWriter(self.path, self.schema)
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def concat_files(part_paths, path, schema):
+    """
+    Concatenate same-format part files into `path` in order without loading them whole
+    (Parquet is copied row group by row group). Returns False if no part existed.
+    """
+    parts = [p for p in part_paths if os.path.exists(p)]
+    if not parts:
+        return False
+
+    if path.endswith(extension(PARQUET)):
+        with pq.ParquetWriter(path, schema, compression=COMPRESSION) as writer:
+            for part in parts:
+                reader = pq.ParquetFile(part)
+                for i in range(reader.num_row_groups):
+                    writer.write_table(reader.read_row_group(i))
+        return True
+
+    with open(path, "wb") as out:
+        for n, part in enumerate(parts):
+            with open(part, "rb") as src:
+                header = src.readline()
+                if n == 0:
+                    out.write(header)
+                while True:
+                    block = src.read(1 << 20)
+                    if not block:
+                        break
+                    out.write(block)
+    return True
+
+
+# ──────────────────────────────────────────────────────────────
+# 📦 Partitioned datasets
+# ──────────────────────────────────────────────────────────────
+def partition_dir(root, day):
+    return os.path.join(root, f"{PARTITION_KEY}={pd.Timestamp(day):%Y-%m-%d}")
+
+
+def write_dataset(df, root, schema, fmt=PARQUET, basename="part", partition_col="date", append=False):
+    """
+    Write `df` under `root`. Parquet goes to a day-partitioned dataset
+    (`root/day=YYYY-MM-DD/<basename>-<n>.parquet`, new files on every call); CSV goes to a single
+    `root/<basename>.csv`, replaced unless `append` adds the rows to it (for chunked writes).
+    Returns the list of files written.
+    """
+    os.makedirs(root, exist_ok=True)
+    table = conform(df, schema)
+
+    if fmt == CSV:
+        path = os.path.join(root, f"{basename}.csv")
+        if append and os.path.exists(path):
+            with open(path, "ab") as f:
+                pacsv.write_csv(table, f, write_options=pacsv.WriteOptions(include_header=False))
+        else:
+            pacsv.write_csv(table, path)
+        return [path]
+
+    extension(fmt)
+    days = pd.to_datetime(table.column(partition_col).to_pandas(), utc=True).dt.strftime("%Y-%m-%d")
+    table = table.append_column(PARTITION_KEY, pa.array(days.fillna("unknown"), type=pa.string()))
+
+    written = []
+    ds.write_dataset(
+        table, root, format="parquet",
+        partitioning=ds.partitioning(pa.schema([(PARTITION_KEY, pa.string())]), flavor="hive"),
+        basename_template=f"{basename}-{uuid.uuid4().hex[:8]}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        file_options=ds.ParquetFileFormat().make_write_options(compression=COMPRESSION),
+        file_visitor=lambda f: written.append(f.path),
+    )
+    return written
+
+
+def read_dataset(root, columns=None, filters=None, memory_map=True):
+    """
+    Read a day-partitioned Parquet dataset (or a single Parquet/CSV file) back as a typed frame.
+    With `memory_map`, Parquet files are mapped rather than read into private buffers.
+    """
+    if os.path.isfile(root) and root.endswith(extension(CSV)):
+        return pacsv.read_csv(root).to_pandas()
+
+    filesystem = pa.fs.LocalFileSystem(use_mmap=memory_map)
+    dataset = ds.dataset(root, format="parquet", partitioning="hive", filesystem=filesystem,
+                         exclude_invalid_files=True)
+    return dataset.to_table(columns=columns, filter=filters).to_pandas()
+
+
+def iter_batches(path, batch_rows=500_000, memory_map=True):
+    """Yield a Parquet or CSV file as typed DataFrames of at most `batch_rows` rows."""
+    if path.endswith(extension(CSV)):
+        yield from pd.read_csv(path, chunksize=batch_rows)
+        return
+    for batch in pq.ParquetFile(path, memory_map=memory_map).iter_batches(batch_size=batch_rows):
+        yield batch.to_pandas()
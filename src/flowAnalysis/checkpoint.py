@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+
+MANIFEST_NAME = "_manifest.json"
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def window_key(start_dt: datetime, end_dt: datetime) -> str:
+    return f"{start_dt:%Y-%m-%dT%H:%M}_{end_dt:%Y-%m-%dT%H:%M}"
+
+
+# ──────────────────────────────────────────────────────────────
+# 📒 Checkpoint manifest
+# ──────────────────────────────────────────────────────────────
+class CheckpointStore:
+    """
+    Manifest of a range pull kept next to its output as `<export_dir>/_manifest.json`.
+
+    Every extraction unit (an hourly window or a finished output file) gets an entry with its
+    status, row count, output path and SHA-256, so a rerun can skip work whose output is still
+    on disk and intact, and retry only what failed or never ran. The pull's own parameters are
+    stored under "params" so `--resume <tag>` can restart it without prompting.
+    """
+
+    def __init__(self, export_dir: str):
+        self.export_dir = export_dir
+        self.path = os.path.join(export_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        os.makedirs(export_dir, exist_ok=True)
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                self._data = json.load(f)
+        else:
+            self._data = {"params": {}, "units": {}}
+
+    @classmethod
+    def exists(cls, export_dir: str) -> bool:
+        return os.path.exists(os.path.join(export_dir, MANIFEST_NAME))
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._data, f, indent=2, default=str)
+        os.replace(tmp, self.path)
+
+    # ── run parameters ────────────────────────────────────────
+    @property
+    def params(self) -> dict:
+        return dict(self._data["params"])
+
+    def set_params(self, **params):
+        with self._lock:
+            self._data["params"].update(params)
+            self._save()
+
+    # ── unit status ───────────────────────────────────────────
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._data["units"].get(key)
+            return dict(entry) if entry else None
+
+    def _update(self, key: str, **fields):
+        with self._lock:
+            entry = self._data["units"].setdefault(key, {})
+            entry.update(fields, updated_at=datetime.utcnow().isoformat())
+            self._save()
+
+    def is_done(self, key: str) -> bool:
+        """True when `key` finished and its output (if it had rows) is still on disk unchanged."""
+        entry = self.get(key)
+        if not entry or entry.get("status") != "done":
+            return False
+        if not entry.get("rows"):
+            return True
+        path = entry.get("path")
+        return bool(path) and os.path.exists(path) and file_checksum(path) == entry.get("checksum")
+
+    def mark_running(self, key: str):
+        self._update(key, status="running", error=None)
+
+    def mark_done(self, key: str, rows: int, path: str = None):
+        checksum = file_checksum(path) if path and rows and os.path.exists(path) else None
+        self._update(key, status="done", rows=rows, path=path, checksum=checksum, error=None)
+
+    def mark_failed(self, key: str, error: BaseException):
+        self._update(key, status="failed", error=f"{type(error).__name__}: {error}")
+
+    def mark_uploaded(self, key: str):
+        self._update(key, uploaded=True)
+
+    def uploaded_batches(self, key: str, checksum: str) -> set:
+        """Upload batches of `key` already loaded, as long as they were cut from the file with `checksum`."""
+        upload = (self.get(key) or {}).get("upload") or {}
+        return set(upload.get("batches", [])) if upload.get("checksum") == checksum else set()
+
+    def mark_batch_uploaded(self, key: str, checksum: str, batch: int):
+        with self._lock:
+            entry = self._data["units"].setdefault(key, {})
+            upload = entry.get("upload") or {}
+            if upload.get("checksum") != checksum:
+                upload = {"checksum": checksum, "batches": []}
+            upload["batches"] = sorted(set(upload["batches"]) | {batch})
+            entry.update(upload=upload, updated_at=datetime.utcnow().isoformat())
+            self._save()
+
+    def failed(self) -> dict:
+        with self._lock:
+            return {k: v.get("error") for k, v in self._data["units"].items() if v.get("status") == "failed"}
+
+    def summary(self) -> dict:
+        with self._lock:
+            counts = {}
+            for entry in self._data["units"].values():
+                counts[entry.get("status")] = counts.get(entry.get("status"), 0) + 1
+            return counts
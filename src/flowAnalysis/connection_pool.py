@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Tuple, Type
+
+
+# ──────────────────────────────────────────────────────────────
+# 🔌 DB-API connection pool
+# ──────────────────────────────────────────────────────────────
+class ConnectionPool:
+    """
+    Bounded pool of DB-API connections shared by the fetch functions.
+
+    Idle connections are reused instead of logging in again for every query. A connection
+    that has been idle longer than `health_check_interval` seconds is probed with
+    `health_check_sql` before it is handed out, and `run()` retries a query on a fresh
+    connection when it fails with one of the `reconnect_on` errors.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], object],
+        max_size: int = 4,
+        health_check_sql: str = "SELECT 1",
+        health_check_interval: float = 300.0,
+        reconnect_on: Tuple[Type[BaseException], ...] = (Exception,),
+        max_retries: int = 2,
+    ):
+        self._connect = connect
+        self.max_size = max_size
+        self.health_check_sql = health_check_sql
+        self.health_check_interval = health_check_interval
+        self.reconnect_on = reconnect_on
+        self.max_retries = max_retries
+
+        self._idle: "queue.LifoQueue[Tuple[object, float]]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"connects": 0, "reuses": 0, "health_checks": 0, "reconnects": 0}
+
+    # ── lifecycle ─────────────────────────────────────────────
+    def _new_connection(self):
+        conn = self._connect()
+        with self._lock:
+            self.stats["connects"] += 1
+        return conn
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn) -> bool:
+        with self._lock:
+            self.stats["health_checks"] += 1
+        try:
+            cs = conn.cursor()
+            try:
+                cs.execute(self.health_check_sql)
+                cs.fetchall()
+            finally:
+                cs.close()
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    conn, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._new_connection()
+
+                if time.monotonic() - last_used < self.health_check_interval or self._is_healthy(conn):
+                    with self._lock:
+                        self.stats["reuses"] += 1
+                    return conn
+                self._close_quietly(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn, broken: bool = False):
+        if broken or self._closed:
+            self._close_quietly(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it goes back to the pool unless the block raised a reconnect error."""
+        conn = self._checkout()
+        broken = False
+        try:
+            yield conn
+        except self.reconnect_on:
+            broken = True
+            raise
+        finally:
+            self._checkin(conn, broken=broken)
+
+    def run(self, fn: Callable[[object], object]):
+        """Call `fn(connection)`, retrying on a new connection after a reconnect error."""
+        attempt = 0
+        while True:
+            try:
+                with self.connection() as conn:
+                    return fn(conn)
+            except self.reconnect_on:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                with self._lock:
+                    self.stats["reconnects"] += 1
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close_quietly(conn)
@@ -0,0 +1,278 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytz
+
+import exportUtils
+from exportUtils import FIAT_TRADE_SCHEMA
+from flowAnalysis.fiat_tracker import fetch_trades_sharded_async
+from flowAnalysis.market_cache import fiat_stable_pairs, new_async_exchange
+from flowAnalysis.trade_buffer import TradeBuffer, trades_frame
+from requestScheduler import ccxt_endpoint, get_scheduler
+
+SCAN_EXPORT_ROOT = "CEX_FIAT_to_USDT"
+DEFAULT_SCAN_EXCHANGES = ("binance", "kraken", "coinbase")
+
+SUMMARY_COLUMNS = [
+    "exchange", "symbol", "fiat", "stable", "status", "trades", "usdt_volume", "fiat_volume", "vwap",
+    "first_trade", "last_trade", "seconds", "trades_per_sec", "errors", "error",
+]
+
+
+# ──────────────────────────────────────────────────────────────
+# 🎯 Scan targets
+# ──────────────────────────────────────────────────────────────
+def scan_targets(exchanges, pairs: dict = None, fiat: set = None, stable: set = None) -> dict:
+    """
+    {exchange: [pair dicts]} for the scan. Explicit `pairs` ({exchange: ["USDT/TRY", ...]}) win;
+    otherwise every cached fiat ⇄ stablecoin market, optionally narrowed by `fiat` / `stable`.
+    Exchanges whose markets can't be loaded are reported and left out.
+    """
+    fiat = {f.upper() for f in fiat} if fiat else None
+    stable = {s.upper() for s in stable} if stable else None
+
+    targets = {}
+    for name in exchanges:
+        try:
+            available = fiat_stable_pairs(name)
+        except Exception as e:
+            print(f"❌ Error loading markets for {name}: {e}")
+            continue
+
+        if pairs and name in pairs:
+            wanted = {p.upper() for p in pairs[name]}
+            selected = [p for p in available if p["symbol"] in wanted]
+            for missing in wanted - {p["symbol"] for p in selected}:
+                print(f"⚠️ {missing} is not a fiat ⇄ stablecoin market on {name}, skipping")
+        else:
+            selected = [p for p in available
+                        if (fiat is None or p["fiat"] in fiat) and (stable is None or p["stable"] in stable)]
+
+        if selected:
+            targets[name] = selected
+        else:
+            print(f"⚠️ No matching fiat ⇄ stablecoin pairs on {name}")
+    return targets
+
+
+# ──────────────────────────────────────────────────────────────
+# 📊 Per-pair results
+# ──────────────────────────────────────────────────────────────
+def pair_summary(arrays: dict, target: dict) -> dict:
+    """Stablecoin / fiat volume and VWAP of one pair's trades, whichever side the stablecoin is on."""
+    base_volume, quote_volume = float(np.sum(arrays["amount"])), float(np.sum(arrays["cost"]))
+    stable_is_base = target["base"] == target["stable"]
+    ts = arrays["timestamp"]
+
+    usdt_volume = base_volume if stable_is_base else quote_volume
+    fiat_volume = quote_volume if stable_is_base else base_volume
+    return {
+        "trades": len(ts),
+        "usdt_volume": round(usdt_volume, 2),
+        "fiat_volume": round(fiat_volume, 2),
+        "vwap": round(quote_volume / base_volume, 4) if base_volume else None,
+        "first_trade": pd.to_datetime(int(ts.min()), unit="ms", utc=True) if len(ts) else None,
+        "last_trade": pd.to_datetime(int(ts.max()), unit="ms", utc=True) if len(ts) else None,
+    }
+
+
+def export_pair_trades(buffer: TradeBuffer, exchange_name: str, symbol: str, trades_dir: str,
+                       fmt: str = exportUtils.PARQUET) -> list:
+    """
+    Write one pair's buffered trades under `trades_dir`, one buffer chunk at a time so a long pull
+    is never materialized as a single frame. CSV keeps one file per pair, so later chunks are
+    appended to it. Returns the files written.
+    """
+    basename = f"{exchange_name}_{symbol.replace('/', '_')}"
+    written = []
+    for i, chunk in enumerate(buffer.chunks()):
+        df = trades_frame(chunk)
+        df.insert(1, "exchange", exchange_name)
+        df.insert(2, "symbol", symbol)
+        written += exportUtils.write_dataset(df, trades_dir, FIAT_TRADE_SCHEMA, fmt=fmt, basename=basename,
+                                             append=i > 0)
+    return sorted(set(written))
+
+
+# ──────────────────────────────────────────────────────────────
+# ⚡ Concurrent scan
+# ──────────────────────────────────────────────────────────────
+async def _scan_pair(exchange, exchange_name: str, target: dict, since: int, end_ts: int, shards: int,
+                     semaphore: asyncio.Semaphore, trades_dir: str, fmt: str) -> dict:
+    row = {"exchange": exchange_name, "symbol": target["symbol"], "fiat": target["fiat"],
+           "stable": target["stable"], "status": "ok", "trades": 0, "errors": 0, "error": None}
+    t0 = time.perf_counter()
+    buffer = TradeBuffer()
+    try:
+        buffer, errors = await fetch_trades_sharded_async(exchange, target["symbol"], since, end_ts,
+                                                          shards=shards, semaphore=semaphore, buffer=buffer)
+        row["errors"] = len(errors)
+        if errors:
+            row["status"] = "partial" if len(buffer) else "failed"
+            row["error"] = "; ".join(f"shard {i}: {e}" for i, e in errors.items())
+
+        if len(buffer):
+            row.update(pair_summary(buffer.arrays(), target))
+            # Encoding is CPU-bound; keep it off the event loop
+            await asyncio.to_thread(export_pair_trades, buffer, exchange_name, target["symbol"], trades_dir, fmt)
+        elif not errors:
+            row["status"] = "empty"
+    except Exception as e:
+        row.update(status="failed", errors=row["errors"] + 1, error=f"{type(e).__name__}: {e}")
+    finally:
+        buffer.close()
+
+    row["seconds"] = round(time.perf_counter() - t0, 2)
+    row["trades_per_sec"] = round(row["trades"] / row["seconds"], 1) if row["seconds"] else None
+    icon = {"ok": "✅", "empty": "⚪", "partial": "⚠️", "failed": "❌"}[row["status"]]
+    print(f"{icon} {exchange_name} {target['symbol']}: {row['trades']:,} trades in {row['seconds']}s")
+    return row
+
+
+async def _scan_exchange(exchange_name: str, targets: list, since: int, end_ts: int, shards: int,
+                         max_concurrency: int, rate_limit_ms: int, trades_dir: str, fmt: str,
+                         exchange=None) -> list:
+    config = {"rateLimit": rate_limit_ms} if rate_limit_ms else None
+    ex = exchange or new_async_exchange(exchange_name, config=config)
+    if rate_limit_ms:
+        if exchange is not None and hasattr(exchange, "throttler"):
+            # ccxt reads rateLimit once at construction; an injected exchange's throttle is retuned in place
+            exchange.rateLimit = rate_limit_ms
+            exchange.throttler.config["refillRate"] = 1 / rate_limit_ms
+        get_scheduler().configure(ccxt_endpoint(ex), rate=1000.0 / rate_limit_ms, burst=1)
+    # One budget per exchange shared by all of its pairs; the ccxt throttle spaces the requests
+    semaphore = asyncio.Semaphore(max_concurrency)
+    try:
+        return await asyncio.gather(*(
+            _scan_pair(ex, exchange_name, t, since, end_ts, shards, semaphore, trades_dir, fmt) for t in targets
+        ))
+    finally:
+        if exchange is None:
+            await ex.close()
+
+
+async def scan_fiat_stable_markets_async(targets: dict, since: int, end_ts: int, trades_dir: str,
+                                         fmt: str = exportUtils.PARQUET, shards: int = 1,
+                                         max_concurrency: dict = None, rate_limits: dict = None,
+                                         exchanges: dict = None) -> list:
+    """
+    Scan every exchange's targets at once. Exchanges run side by side; within an exchange,
+    `max_concurrency[name]` (default 2) caps requests in flight and `rate_limits[name]` sets the ms
+    between requests, both in the ccxt throttle and the shared scheduler. `exchanges` injects ready-made async exchanges by name.
+    """
+    max_concurrency = max_concurrency or {}
+    rate_limits = rate_limits or {}
+    exchanges = exchanges or {}
+    per_exchange = await asyncio.gather(*(
+        _scan_exchange(name, pair_targets, since, end_ts, shards, max_concurrency.get(name, 2),
+                       rate_limits.get(name), trades_dir, fmt, exchanges.get(name))
+        for name, pair_targets in targets.items()
+    ))
+    return [row for rows in per_exchange for row in rows]
+
+
+def scan_fiat_stable_markets(exchanges, start_dt: datetime, end_dt: datetime, tag: str, pairs: dict = None,
+                             fiat: set = None, stable: set = None, fmt: str = exportUtils.PARQUET,
+                             shards: int = 1, max_concurrency: dict = None, rate_limits: dict = None,
+                             export_root: str = SCAN_EXPORT_ROOT, async_exchanges: dict = None) -> pd.DataFrame:
+    """
+    Batch fiat → stablecoin scan over several exchanges and pairs for one window.
+
+    Trades from every pair land in one day-partitioned result set at `<export_root>/<tag>/trades`,
+    and a per-pair summary (volumes, VWAP, throughput, errors) is written next to it and returned.
+    """
+    start_dt_utc = start_dt.replace(tzinfo=pytz.UTC)
+    end_dt_utc = end_dt.replace(tzinfo=pytz.UTC)
+    since = int(start_dt_utc.timestamp() * 1000)
+    end_ts = int(end_dt_utc.timestamp() * 1000)
+
+    targets = scan_targets(exchanges, pairs, fiat, stable)
+    n_pairs = sum(len(t) for t in targets.values())
+    if not n_pairs:
+        print("⚠️ Nothing to scan.")
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    export_dir = os.path.join(export_root, tag)
+    trades_dir = os.path.join(export_dir, "trades")
+    os.makedirs(trades_dir, exist_ok=True)
+
+    print(f"\n📡 Scanning {n_pairs} pair(s) on {len(targets)} exchange(s) "
+          f"between {start_dt_utc} and {end_dt_utc} (UTC)...")
+    t0 = time.perf_counter()
+    rows = asyncio.run(scan_fiat_stable_markets_async(
+        targets, since, end_ts, trades_dir, fmt=fmt, shards=shards,
+        max_concurrency=max_concurrency, rate_limits=rate_limits, exchanges=async_exchanges,
+    ))
+    elapsed = time.perf_counter() - t0
+
+    summary = pd.DataFrame(rows, columns=SUMMARY_COLUMNS).sort_values(["exchange", "symbol"], ignore_index=True)
+    summary["start"], summary["end"], summary["label"] = start_dt, end_dt, tag
+    summary_path = os.path.join(export_dir, f"summary{exportUtils.extension(fmt)}")
+    if fmt == exportUtils.PARQUET:
+        summary.to_parquet(summary_path, index=False)
+    else:
+        summary.to_csv(summary_path, index=False)
+
+    print_scan_report(summary, elapsed)
+    get_scheduler().report()
+    print(f"✅ Trades saved to {trades_dir}, summary to {summary_path}")
+    return summary
+
+
+def print_scan_report(summary: pd.DataFrame, elapsed: float):
+    print("\n📈 Scan summary:")
+    cols = ["exchange", "symbol", "status", "trades", "usdt_volume", "fiat_volume", "vwap",
+            "seconds", "trades_per_sec", "errors"]
+    print(summary[cols].to_string(index=False))
+
+    total = int(summary["trades"].sum())
+    failed = int((summary["status"] == "failed").sum())
+    partial = int((summary["status"] == "partial").sum())
+    print(f"\n⏱️ {len(summary)} pair(s), {total:,} trades in {elapsed:.1f}s "
+          f"({total / elapsed if elapsed else 0:,.0f} trades/s overall)")
+    if failed or partial:
+        print(f"⚠️ {failed} failed, {partial} partial:")
+        for _, r in summary[summary["status"].isin(["failed", "partial"])].iterrows():
+            print(f"   - {r['exchange']} {r['symbol']}: {r['error']}")
+
+
+# ──────────────────────────────────────────────────────────────
+# 🖥️ CLI
+# ──────────────────────────────────────────────────────────────
+def interactive_fiat_scanner():
+    """CLI prompt for a batch fiat → stablecoin scan across exchanges."""
+    print("\n🛰️ Batch Fiat ⇄ Stablecoin Scanner")
+
+    names = input(f"🌐 Exchanges, comma-separated (default: {', '.join(DEFAULT_SCAN_EXCHANGES)}): ").strip()
+    exchanges = [n.strip() for n in names.split(",") if n.strip()] or list(DEFAULT_SCAN_EXCHANGES)
+    fiat = input("💱 (Optional) Fiat filter, comma-separated (e.g. RUB,TRY) or press Enter for all: ").strip()
+    stable = input("🪙 (Optional) Stablecoin filter (e.g. USDT) or press Enter for all: ").strip()
+
+    while True:
+        try:
+            start_dt = datetime.strptime(input("🕐 Start datetime (YYYY-MM-DD HH:MM): ").strip(), "%Y-%m-%d %H:%M")
+            end_dt = datetime.strptime(input("🕐 End datetime (YYYY-MM-DD HH:MM): ").strip(), "%Y-%m-%d %H:%M")
+            break
+        except ValueError:
+            print("❌ Invalid format. Please use YYYY-MM-DD HH:MM")
+
+    concurrency = input("⚡ Requests in flight per exchange (default: 2): ").strip()
+    concurrency = int(concurrency) if concurrency.isdigit() and int(concurrency) > 0 else 2
+    shards = input("⚡ Time shards per pair (default: 1): ").strip()
+    shards = int(shards) if shards.isdigit() and int(shards) > 0 else 1
+
+    tag = input("🏷️ Enter a label for this time period (e.g. russian_sanctions): ").strip().replace(" ", "_")
+    tag = tag or f"scan_{start_dt.strftime('%Y-%m-%d_%H%M')}"
+    fmt = exportUtils.prompt_format()
+
+    scan_fiat_stable_markets(
+        exchanges, start_dt, end_dt, tag,
+        fiat={f.strip() for f in fiat.split(",") if f.strip()} or None,
+        stable={s.strip() for s in stable.split(",") if s.strip()} or None,
+        fmt=fmt, shards=shards,
+        max_concurrency={name: concurrency for name in exchanges},
+    )
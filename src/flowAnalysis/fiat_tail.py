@@ -0,0 +1,372 @@
+import json
+import os
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+import exportUtils
+from exportUtils import FIAT_BAR_SCHEMA
+from flowAnalysis.market_cache import get_exchange
+from flowAnalysis.trade_bars import RESOLUTIONS, aggregate_trades, trade_arrays
+from flowAnalysis.trade_buffer import TradeBuffer
+from requestScheduler import ccxt_endpoint, get_scheduler
+
+TAIL_EXPORT_ROOT = "CEX_FIAT_to_USDT"
+TAIL_PAGE_LIMIT = 1000
+TAIL_MAX_PAGES = 20          # per pair per poll, so one busy pair can't starve the others
+TAIL_RING_BARS = 1440        # a day of 1m bars
+TAIL_LOOKBACK_MS = 3_600_000 # where a pair with no saved state starts
+TAIL_SETTLE_MS = 5_000       # exchanges can publish a trade a little after its timestamp
+
+
+# ──────────────────────────────────────────────────────────────
+# 💾 High-water marks
+# ──────────────────────────────────────────────────────────────
+class TailState:
+    """
+    Per-(exchange, pair) high-water marks in a JSON file, rewritten atomically after each flush.
+
+    A mark is the `since` to resume from plus the ids of trades already taken at exactly that
+    millisecond, so a restart neither re-exports flushed bars nor misses trades that were polled
+    but not yet flushed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self._marks = json.load(f)
+        else:
+            self._marks = {}
+
+    @staticmethod
+    def key(exchange_name: str, pair: str) -> str:
+        return f"{exchange_name}|{pair}"
+
+    def get(self, exchange_name: str, pair: str) -> dict:
+        return self._marks.get(self.key(exchange_name, pair))
+
+    def set(self, exchange_name: str, pair: str, since: int, seen=(), **extra):
+        self._marks[self.key(exchange_name, pair)] = {
+            "since": int(since), "seen": sorted(seen), "updated_at": pd.Timestamp.now(tz="UTC").isoformat(), **extra,
+        }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._marks, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+# ──────────────────────────────────────────────────────────────
+# 🔁 Recent-bar ring
+# ──────────────────────────────────────────────────────────────
+class BarRing:
+    """
+    The last `capacity` bars of one pair, kept in memory for quick summaries. New trades are
+    folded into the newest bar while it is still forming; older bars fall off the front.
+    """
+
+    FIELDS = ("timestamp", "open", "high", "low", "close", "volume", "quote_volume",
+              "buy_volume", "sell_volume", "trades")
+
+    def __init__(self, resolution: str = "1m", capacity: int = TAIL_RING_BARS):
+        self.resolution = resolution
+        self._bars = deque(maxlen=capacity)
+
+    def __len__(self):
+        return len(self._bars)
+
+    def update(self, bars: pd.DataFrame):
+        for row in bars[list(self.FIELDS)].itertuples(index=False, name=None):
+            bar = dict(zip(self.FIELDS, row))
+            last = self._bars[-1] if self._bars else None
+            if last is not None and last["timestamp"] == bar["timestamp"]:
+                last["high"] = max(last["high"], bar["high"])
+                last["low"] = min(last["low"], bar["low"])
+                last["close"] = bar["close"]
+                for col in ("volume", "quote_volume", "buy_volume", "sell_volume", "trades"):
+                    last[col] += bar[col]
+            elif last is None or bar["timestamp"] > last["timestamp"]:
+                self._bars.append(bar)
+
+    def summary(self, minutes: int = 60) -> dict:
+        """Volume, VWAP, trade count and last price over the trailing `minutes` held in the ring."""
+        if not self._bars:
+            return {"bars": 0, "volume": 0.0, "quote_volume": 0.0, "vwap": None, "trades": 0, "last": None}
+        cutoff = self._bars[-1]["timestamp"] - minutes * 60_000 + RESOLUTIONS[self.resolution]
+        recent = [b for b in self._bars if b["timestamp"] >= cutoff]
+        volume = float(np.sum([b["volume"] for b in recent]))
+        quote_volume = float(np.sum([b["quote_volume"] for b in recent]))
+        return {
+            "bars": len(recent),
+            "volume": round(volume, 2),
+            "quote_volume": round(quote_volume, 2),
+            "vwap": round(quote_volume / volume, 4) if volume else None,
+            "trades": int(sum(b["trades"] for b in recent)),
+            "last": recent[-1]["close"],
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        df = pd.DataFrame(list(self._bars), columns=list(self.FIELDS))
+        df["datetime"] = pd.to_datetime(df["timestamp"], unit="ms")
+        return df
+
+
+# ──────────────────────────────────────────────────────────────
+# 📡 One tailed pair
+# ──────────────────────────────────────────────────────────────
+class PairTail:
+    """
+    Incremental poller for one (exchange, pair). `poll()` asks only for trades at or after the
+    high-water mark; trades wait in a TradeBuffer until `flush()` turns the completed bars into
+    a micro-batch, and the still-forming bar's trades are carried over to the next one.
+    """
+
+    def __init__(self, exchange_name: str, pair: str, exchange, since: int, seen=(),
+                 resolution: str = "1m", ring_bars: int = TAIL_RING_BARS):
+        self.exchange_name = exchange_name
+        self.pair = pair
+        self.exchange = exchange
+        self.resolution = resolution
+        self.hwm = since
+        self._seen = set(seen)      # ids already taken at exactly self.hwm
+        self.synced_ms = since      # every trade before this has been polled
+        self.pending = TradeBuffer()
+        self.ring = BarRing(resolution, ring_bars)
+        self.stats = {"polls": 0, "trades": 0, "bars_flushed": 0, "flushes": 0, "errors": 0, "last_error": None}
+
+    def poll(self, now_ms: int, limit: int = TAIL_PAGE_LIMIT, max_pages: int = TAIL_MAX_PAGES) -> int:
+        """Fetch new trades since the high-water mark; returns how many were new."""
+        endpoint = ccxt_endpoint(self.exchange)
+        taken = 0
+        caught_up = False
+        for _ in range(max_pages):
+            trades = get_scheduler().call(endpoint, self.exchange.fetch_trades, self.pair, since=self.hwm, limit=limit)
+            new = [t for t in trades or []
+                   if t["timestamp"] > self.hwm or (t["timestamp"] == self.hwm and str(t.get("id")) not in self._seen)]
+            if not new:
+                caught_up = True
+                break
+
+            self.pending.append(new)
+            self.ring.update(aggregate_trades(trade_arrays(new), (self.resolution,))[self.resolution])
+            taken += len(new)
+
+            last_ts = new[-1]["timestamp"]
+            at_last = {str(t.get("id")) for t in new if t["timestamp"] == last_ts}
+            self._seen = (self._seen | at_last) if last_ts == self.hwm else at_last
+            self.hwm = last_ts
+            if len(trades) < limit:
+                caught_up = True
+                break
+
+        # A pair still paging through a backlog is only known to be complete up to its last trade
+        self.synced_ms = max(self.synced_ms, now_ms - TAIL_SETTLE_MS if caught_up else self.hwm)
+        self.stats["polls"] += 1
+        self.stats["trades"] += taken
+        return taken
+
+    def flush(self) -> pd.DataFrame:
+        """
+        Completed bars from pending trades, as a FIAT_BAR_SCHEMA-ready frame. A bar is complete once
+        polling has caught up past its end, so quiet pairs still flush on time. Returns None when
+        nothing is complete.
+        """
+        ms = RESOLUTIONS[self.resolution]
+        if not len(self.pending):
+            return None
+        arrays = self.pending.arrays()
+        order = np.argsort(arrays["timestamp"], kind="stable")
+        arrays = {k: v[order] for k, v in arrays.items()}
+
+        cutoff = self.synced_ms // ms * ms
+        split = int(np.searchsorted(arrays["timestamp"], cutoff, side="left"))
+        if split == 0:
+            return None
+
+        done = {k: v[:split] for k, v in arrays.items()}
+        bars = aggregate_trades(done, (self.resolution,))[self.resolution]
+
+        carry = TradeBuffer()
+        if split < len(arrays["timestamp"]):
+            carry.append_arrays({k: v[split:] for k, v in arrays.items()})
+        self.pending.close()
+        self.pending = carry
+        self.stats["flushes"] += 1
+        self.stats["bars_flushed"] += len(bars)
+        return bars.rename(columns={"timestamp": "date"}).drop(columns=["datetime"])
+
+    def mark(self) -> tuple:
+        """(since, seen) to resume from: the oldest unflushed trade, or just past everything taken."""
+        if len(self.pending):
+            return int(np.min(self.pending.arrays()["timestamp"])), set()
+        return self.hwm, set(self._seen)
+
+    def close(self):
+        self.pending.close()
+
+
+# ──────────────────────────────────────────────────────────────
+# 🔄 Tail loop
+# ──────────────────────────────────────────────────────────────
+def _flush_all(tails: list, state: TailState, export_dir: str, tag: str, fmt: str, upload: bool):
+    for tail in tails:
+        try:
+            bars = tail.flush()
+        except Exception as e:
+            tail.stats["errors"] += 1
+            tail.stats["last_error"] = str(e)
+            print(f"❌ Flush failed for {tail.exchange_name} {tail.pair}: {e}")
+            continue
+
+        if bars is not None and not bars.empty:
+            folder = os.path.join(export_dir, f"{tail.exchange_name}_{tail.pair.replace('/', '-')}")
+            basename = f"bars_{int(bars['date'].iloc[0])}"
+            exportUtils.write_dataset(bars, folder, FIAT_BAR_SCHEMA, fmt=fmt, basename=basename)
+
+            if upload:
+                from bigQueryUtils import upload_fiat_trades_to_bq
+
+                # Epoch-ms `date` is converted by the upload's own prep
+                df = bars.assign(exchange=tail.exchange_name, symbol=tail.pair, adjusted_pair=tail.pair)
+                try:
+                    result = upload_fiat_trades_to_bq(df=df, project_id="macropipeline", dataset_id="fiatToUSDTCEX",
+                                                      table_id=tail.exchange_name, tag=tag)
+                    error = None if result.ok else result.failed[0]["error"]
+                except Exception as e:
+                    error = str(e)
+                if error:
+                    tail.stats["errors"] += 1
+                    tail.stats["last_error"] = error
+                    print(f"⚠️ BigQuery upload failed for {tail.exchange_name} {tail.pair}: {error}")
+
+        since, seen = tail.mark()
+        state.set(tail.exchange_name, tail.pair, since, seen, bars_flushed=tail.stats["bars_flushed"])
+    state.save()
+
+
+def print_tail_report(tails: list, minutes: int = 60):
+    print(f"\n📈 Tail summary (last {minutes} min held in memory):")
+    rows = []
+    for tail in tails:
+        s = tail.ring.summary(minutes)
+        rows.append({
+            "exchange": tail.exchange_name, "symbol": tail.pair, "trades": s["trades"],
+            "volume": s["volume"], "quote_volume": s["quote_volume"], "vwap": s["vwap"], "last": s["last"],
+            "pending": len(tail.pending), "flushed_bars": tail.stats["bars_flushed"], "errors": tail.stats["errors"],
+            "high_water": pd.to_datetime(tail.hwm, unit="ms") if tail.hwm else None,
+        })
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+def run_fiat_tail(targets, tag: str, resolution: str = "1m", poll_interval: float = 10.0,
+                  flush_interval: float = 60.0, upload: bool = False, fmt: str = exportUtils.PARQUET,
+                  start_ms: int = None, exchanges: dict = None, max_polls: int = None,
+                  export_root: str = TAIL_EXPORT_ROOT, clock=time.time, sleep=time.sleep) -> list:
+    """
+    Continuously tail fiat ⇄ stablecoin pairs: poll each [(exchange, pair), ...] for trades past
+    its high-water mark every `poll_interval` seconds, keep recent bars in memory, and every
+    `flush_interval` seconds write completed bars to `<export_root>/<tag>/tail/<exchange>_<pair>`
+    (and BigQuery with `upload`). Marks are persisted there too, so a rerun with the same tag
+    resumes where the last one stopped.
+
+    `exchanges` ({name: exchange}) injects ready-made exchanges (e.g. a local fake), and `clock`
+    / `sleep` a fake clock; `max_polls` bounds the loop, which otherwise runs until Ctrl+C.
+    Returns the PairTail objects, whose rings and stats hold the session's results.
+    """
+    export_dir = os.path.join(export_root, tag, "tail")
+    state = TailState(os.path.join(export_dir, "_state.json"))
+    now_ms = int(clock() * 1000)
+    default_since = start_ms if start_ms is not None else now_ms - TAIL_LOOKBACK_MS
+
+    tails = []
+    for exchange_name, pair in targets:
+        exchange = (exchanges or {}).get(exchange_name) or get_exchange(exchange_name)
+        mark = state.get(exchange_name, pair)
+        since, seen = (mark["since"], mark["seen"]) if mark else (default_since, ())
+        tails.append(PairTail(exchange_name, pair, exchange, since, seen, resolution))
+        print(f"📡 Tailing {pair} on {exchange_name} from {pd.to_datetime(since, unit='ms')} "
+              f"({'resumed' if mark else 'new'})")
+
+    polls = 0
+    last_flush = clock()
+    try:
+        while max_polls is None or polls < max_polls:
+            for tail in tails:
+                try:
+                    tail.poll(int(clock() * 1000))
+                except Exception as e:
+                    tail.stats["errors"] += 1
+                    tail.stats["last_error"] = str(e)
+                    print(f"⚠️ Poll failed for {tail.exchange_name} {tail.pair}: {e}")
+            polls += 1
+
+            if clock() - last_flush >= flush_interval:
+                _flush_all(tails, state, export_dir, tag, fmt, upload)
+                print_tail_report(tails)
+                last_flush = clock()
+
+            if max_polls is None or polls < max_polls:
+                sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("\n⏹️ Stopping tail...")
+    finally:
+        # Completed bars are written; the forming bar's trades are refetched on the next run
+        _flush_all(tails, state, export_dir, tag, fmt, upload)
+        for tail in tails:
+            tail.close()
+
+    print_tail_report(tails)
+    print(f"✅ Bars saved under {export_dir}, high-water marks in {state.path}")
+    return tails
+
+
+# ──────────────────────────────────────────────────────────────
+# 🖥️ CLI
+# ──────────────────────────────────────────────────────────────
+def interactive_fiat_tail():
+    """CLI prompt for continuously tailing fiat ⇄ stablecoin pairs."""
+    from flowAnalysis.market_cache import resolve_pair
+
+    print("\n📡 Continuous Fiat ⇄ Stablecoin Tail (Ctrl+C to stop)")
+
+    targets = []
+    while True:
+        entry = input("🌐 exchange:FIAT/STABLE (e.g. binance:TRY/USDT), or Enter when done: ").strip()
+        if not entry:
+            break
+        try:
+            exchange_name, symbol = entry.split(":", 1)
+            base, quote = symbol.upper().split("/")
+        except ValueError:
+            print("❌ Invalid format. Please use exchange:FIAT/STABLE")
+            continue
+        pair = resolve_pair(exchange_name.strip(), base.strip(), quote.strip())
+        if pair is None:
+            print(f"❌ Neither {base}/{quote} nor {quote}/{base} supported on {exchange_name}")
+            continue
+        targets.append((exchange_name.strip(), pair))
+
+    if not targets:
+        print("⚠️ Nothing to tail.")
+        return
+
+    resolution = input("📊 Bar resolution (1m/5m/15m/1h, default: 1m): ").strip() or "1m"
+    if resolution not in RESOLUTIONS:
+        print(f"❌ Unknown resolution {resolution}, using 1m")
+        resolution = "1m"
+    poll = input("⏱️ Poll every N seconds (default: 10): ").strip()
+    flush = input("⏱️ Flush bars every N seconds (default: 60): ").strip()
+    tag = input("🏷️ Enter a label for this tail (e.g. try_live): ").strip().replace(" ", "_") or "tail"
+    upload = input("🚀 Upload flushed bars to BigQuery? (y/n): ").strip().lower() == "y"
+
+    run_fiat_tail(
+        targets, tag, resolution=resolution,
+        poll_interval=float(poll) if poll.replace(".", "", 1).isdigit() else 10.0,
+        flush_interval=float(flush) if flush.replace(".", "", 1).isdigit() else 60.0,
+        upload=upload,
+    )
@@ -1,29 +1,24 @@
 from datetime import datetime
+import asyncio
+import os
 import pytz
-import ccxt
 import pandas as pd
-FIAT_CURRENCIES = {"USD", "EUR", "RUB", "TRY", "JPY", "GBP", "AUD", "CAD", "CHF", "ZAR", "MXN", "SGD", "HKD"}
-STABLECOINS = {"USDT", "USDC", "BUSD", "TUSD", "DAI", "GUSD", "USDP"}
+from flowAnalysis.market_cache import get_exchange, new_async_exchange, fiat_stable_pairs, resolve_pair
+from flowAnalysis.trade_bars import aggregate_trades, bars_summary, window
+from flowAnalysis.trade_buffer import TradeBuffer
+from flowAnalysis.ohlcv_backfill import backfill_ohlcv
+from requestScheduler import ccxt_endpoint, get_scheduler
 
 
 
 
 def list_fiat_stable_pairs(exchange_name: str, fiat_hint: str = None, stable_hint: str = None):
-    import ccxt
-
-    # Define common fiat and stablecoin symbols
-    fiat_currencies = {"USD", "EUR", "RUB", "TRY", "JPY", "GBP", "AUD", "CAD", "CHF", "ZAR", "MXN", "SGD", "HKD"}
-    stablecoins = {"USDT", "USDC", "BUSD", "TUSD", "DAI", "GUSD", "USDP"}
-
     # Normalize input
     fiat_hint = fiat_hint.upper() if fiat_hint else None
     stable_hint = stable_hint.upper() if stable_hint else None
 
-    exchange_class = getattr(ccxt, exchange_name)
-    exchange = exchange_class()
-
     try:
-        markets = exchange.load_markets()
+        pairs = fiat_stable_pairs(exchange_name)
     except Exception as e:
         print(f"❌ Error loading markets for {exchange_name}: {e}")
         return
@@ -31,57 +26,151 @@ def list_fiat_stable_pairs(exchange_name: str, fiat_hint: str = None, stable_hin
     print(f"\n🔎 Fiat ⇄ Stablecoin Pairs on {exchange_name}:")
 
     found = False
-    for symbol in markets:
-        if "/" not in symbol:
-            continue
-        base, quote = symbol.split("/")
-
-        # One side must be fiat, the other must be a stablecoin
-        fiat_side = base in fiat_currencies or quote in fiat_currencies
-        stable_side = base in stablecoins or quote in stablecoins
-
-        # Must match fiat + stablecoin
-        if not (fiat_side and stable_side):
-            continue
-
+    for p in pairs:
         # Apply user-specified filters if present
-        if fiat_hint and fiat_hint not in (base, quote):
+        if fiat_hint and fiat_hint != p["fiat"]:
             continue
-        if stable_hint and stable_hint not in (base, quote):
+        if stable_hint and stable_hint != p["stable"]:
             continue
 
-        print(f" - {symbol}")
+        print(f" - {p['symbol']}")
         found = True
 
     if not found:
         print("⚠️ No fiat-stablecoin pairs found with current filters.")
 
 
+TRADE_PAGE_LIMIT = 1000
 
 
-from datetime import datetime
-import pytz
-import ccxt
-import pandas as pd
+def _trade_key(trade: dict):
+    # Exchanges without trade ids still give a stable identity for shard-boundary duplicates
+    if trade.get("id") is not None:
+        return trade["id"]
+    return (trade.get("timestamp"), trade.get("price"), trade.get("amount"), trade.get("side"))
 
-def fetch_fiat_stable_trades(exchange_name: str, base_symbol: str, quote_symbol: str, start_dt: datetime, end_dt: datetime):
-    exchange_class = getattr(ccxt, exchange_name)
-    exchange = exchange_class()
 
-    base_upper = base_symbol.upper()
-    quote_upper = quote_symbol.upper()
+def merge_trade_shards(shards: list) -> list:
+    """Merge per-shard trade lists in time order, dropping trades seen in more than one shard."""
+    seen = set()
+    merged = []
+    for trades in shards:
+        for trade in trades:
+            key = _trade_key(trade)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(trade)
+    merged.sort(key=lambda t: t["timestamp"])
+    return merged
 
-    pair_a = f"{base_upper}/{quote_upper}"
-    pair_b = f"{quote_upper}/{base_upper}"
 
-    markets = exchange.load_markets()
+async def _paginate_trade_shard(exchange, pair: str, shard_start: int, shard_end: int,
+                                semaphore: asyncio.Semaphore, limit: int = TRADE_PAGE_LIMIT,
+                                sink: TradeBuffer = None) -> list:
+    """
+    Page through [shard_start, shard_end) ms, one request at a time within the shard. With a
+    `sink` buffer each page is copied into it and dropped, and the buffer is returned instead.
+    """
+    trades_out = []
+    seen = set()
+    since = shard_start
+    while since < shard_end:
+        async with semaphore:
+            trades = await get_scheduler().acall(ccxt_endpoint(exchange), exchange.fetch_trades,
+                                                 pair, since=since, limit=limit)
+        if not trades:
+            break
 
-    if pair_a in markets:
-        pair = pair_a
-    elif pair_b in markets:
-        pair = pair_b
-    else:
-        raise ValueError(f"❌ Neither {pair_a} nor {pair_b} supported on {exchange_name}")
+        new = [t for t in trades if t["timestamp"] < shard_end and _trade_key(t) not in seen]
+        if sink is not None:
+            sink.append(new)
+        else:
+            trades_out.extend(new)
+
+        last_ts = trades[-1]["timestamp"]
+        if last_ts >= shard_end:
+            break
+        # Only trades in the re-requested millisecond can come back, so that is all `seen` keeps
+        seen = {_trade_key(t) for t in trades if t["timestamp"] == last_ts} | (seen if last_ts == since else set())
+        # Re-request the last millisecond so trades sharing it across a page boundary aren't lost;
+        # only step past it once a page brings nothing new
+        since = last_ts if new and last_ts > since else max(since, last_ts) + 1
+    return sink if sink is not None else trades_out
+
+
+async def fetch_trades_sharded_async(exchange, pair: str, since: int, end_ts: int, shards: int = 8,
+                                     max_concurrency: int = None, limit: int = TRADE_PAGE_LIMIT,
+                                     semaphore: asyncio.Semaphore = None, buffer: TradeBuffer = None):
+    """
+    Split [since, end_ts) ms into `shards` equal time shards and paginate them concurrently on one
+    async ccxt exchange (or any object with an awaitable fetch_trades). The exchange's own
+    throttle (`enableRateLimit`) spaces the requests; `max_concurrency` caps requests in flight.
+    Pass a shared `semaphore` instead to cap requests across several pairs on the same exchange.
+
+    Returns (trades, errors): trades merged in time order and de-duplicated by id at shard
+    boundaries, and a {shard_index: exception} map for shards that failed part-way. Given a
+    `buffer`, trades are appended to it shard by shard instead (shards never overlap in time,
+    so appending in shard order keeps it sorted) and the buffer is returned in place of the list.
+    """
+    shards = max(1, min(shards, end_ts - since))
+    step = -(-(end_ts - since) // shards)
+    bounds = [(since + i * step, min(since + (i + 1) * step, end_ts)) for i in range(shards)]
+    semaphore = semaphore or asyncio.Semaphore(max_concurrency or shards)
+    sinks = [None] * shards
+    if buffer is not None:
+        sinks = [TradeBuffer(buffer.spill_rows, os.path.join(buffer.spill_dir, f"shard_{i:03d}"))
+                 for i in range(shards)]
+
+    results = await asyncio.gather(
+        *(_paginate_trade_shard(exchange, pair, s, e, semaphore, limit, sink)
+          for (s, e), sink in zip(bounds, sinks)),
+        return_exceptions=True,
+    )
+
+    errors = {i: r for i, r in enumerate(results) if isinstance(r, BaseException)}
+    for i, err in errors.items():
+        print(f"⚠️ Shard {i} ({pd.to_datetime(bounds[i][0], unit='ms')} → "
+              f"{pd.to_datetime(bounds[i][1], unit='ms')}) failed: {err}")
+
+    if buffer is None:
+        trades = merge_trade_shards([r for r in results if not isinstance(r, BaseException)])
+        return trades, errors
+
+    for i, sink in enumerate(sinks):
+        if i not in errors:
+            for chunk in sink.chunks():
+                buffer.append_arrays(chunk)
+        sink.close()
+    return buffer, errors
+
+
+def fetch_trades_sharded(exchange_name: str, pair: str, since: int, end_ts: int, shards: int = 8,
+                         max_concurrency: int = None, exchange=None, buffer: TradeBuffer = None):
+    """Blocking wrapper around fetch_trades_sharded_async; builds an async ccxt exchange if none is given."""
+    async def _run():
+        ex = exchange or new_async_exchange(exchange_name)
+        try:
+            return await fetch_trades_sharded_async(ex, pair, since, end_ts, shards, max_concurrency,
+                                                    buffer=buffer)
+        finally:
+            if exchange is None:
+                await ex.close()
+
+    return asyncio.run(_run())
+
+
+def fetch_fiat_stable_trades(exchange_name: str, base_symbol: str, quote_symbol: str, start_dt: datetime, end_dt: datetime,
+                             shards: int = 1, async_exchange=None, resolution: str = "1h"):
+    # Shared exchange instance; markets come from the on-disk cache when it is fresh
+    exchange = get_exchange(exchange_name)
+
+    base_upper = base_symbol.upper()
+    quote_upper = quote_symbol.upper()
+
+    pair = resolve_pair(exchange_name, base_upper, quote_upper)
+    if pair is None:
+        raise ValueError(f"❌ Neither {base_upper}/{quote_upper} nor {quote_upper}/{base_upper} supported on {exchange_name}")
 
     # ✅ Use actual CCXT pair for both symbol and adjusted_pair
     adjusted_pair = pair
@@ -99,16 +188,29 @@ def fetch_fiat_stable_trades(exchange_name: str, base_symbol: str, quote_symbol:
     # Optional quick test
     try:
         print(f"📦 Sample check: Fetching last 5 trades for {pair}...")
-        recent = exchange.fetch_trades(pair, limit=5)
+        recent = get_scheduler().call(ccxt_endpoint(exchange), exchange.fetch_trades, pair, limit=5)
         print(f"✅ Got {len(recent)} recent trades")
     except Exception as e:
         print(f"⚠️ Error fetching recent trades: {e}")
 
-    all_trades = []
-    while since < end_ts:
+    # Only the fields the bars need are kept; pages of ccxt dicts are dropped as soon as they're copied
+    all_trades = TradeBuffer()
+    # Shards that failed part-way leave a gap in the window; they are reported in the summary
+    failed_shards = {}
+    if shards > 1:
+        print(f"⚡ Paginating {shards} time shards concurrently...")
+        all_trades, errors = fetch_trades_sharded(exchange_name, pair, since, end_ts, shards=shards,
+                                                  exchange=async_exchange, buffer=all_trades)
+        failed_shards = {i: f"{type(e).__name__}: {e}" for i, e in errors.items()}
+        print(f"✅ Collected {len(all_trades):,} unique trades")
+        if failed_shards:
+            print(f"⚠️ {len(failed_shards)} of {shards} shards failed — bars are partial")
+
+    while shards <= 1 and since < end_ts:
         try:
             print(f"→ Fetching from {pd.to_datetime(since, unit='ms')} to {pd.to_datetime(end_ts, unit='ms')}")
-            trades = exchange.fetch_trades(pair, since=since, limit=1000)
+            # Rate-limit and network errors are retried with backoff before the loop gives up
+            trades = get_scheduler().call(ccxt_endpoint(exchange), exchange.fetch_trades, pair, since=since, limit=1000)
         except Exception as e:
             print(f"⚠️ Error fetching trades: {e}")
             break
@@ -117,7 +219,7 @@ def fetch_fiat_stable_trades(exchange_name: str, base_symbol: str, quote_symbol:
             print("→ No trades returned.")
             break
 
-        all_trades.extend(trades)
+        all_trades.append(trades)
         last_ts = trades[-1]['timestamp']
         if last_ts <= since:
             print("⚠️ Stuck at same timestamp, breaking to prevent infinite loop.")
@@ -125,47 +227,39 @@ def fetch_fiat_stable_trades(exchange_name: str, base_symbol: str, quote_symbol:
 
         since = last_ts + 1
 
-    # Fallback to OHLCV if no trades
-    if not all_trades:
-        print("⚠️ No trade-level data — falling back to OHLCV...")
-
+    if len(all_trades):
         try:
-            ohlcv = exchange.fetch_ohlcv(pair, timeframe='1h', since=since)
-            if not ohlcv:
-                print("⚠️ No OHLCV data found either.")
-                return None, None
-
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
-
-            # Filter by time range
-            start_dt_naive = start_dt_utc.replace(tzinfo=None)
-            end_dt_naive = end_dt_utc.replace(tzinfo=None)
-            df = df[(df['datetime'] >= start_dt_naive) & (df['datetime'] <= end_dt_naive)]
-
-            # Compute volume metrics
-            usdt_volume = df['volume'].sum()  # base asset volume
-            fiat_volume = (df['volume'] * df['close']).sum()
-            vwap = (df['close'] * df['volume']).sum() / df['volume'].sum()
-
-            summary = {
-                "exchange": exchange_name,
-                "symbol": pair,                 # raw CCXT pair
-                "adjusted_pair": adjusted_pair, # use actual pair for correct direction
-                "usdt_volume": round(usdt_volume, 2),
-                "fiat_volume": round(fiat_volume, 2),
-                "vwap": round(vwap, 4),
-                "trades": len(df),
-                "start": start_dt,
-                "end": end_dt,
-            }
-
-            return df, summary
+            # The last serial page can run past the window; keep the same inclusive bounds as the OHLCV path
+            arrays = window(all_trades.arrays(), int(start_dt_utc.timestamp() * 1000), end_ts)
+            df = aggregate_trades(arrays, (resolution,))[resolution]
+        finally:
+            all_trades.close()
+        summary = bars_summary(df, exchange_name, pair, adjusted_pair, start_dt, end_dt)
+        summary["failed_shards"] = failed_shards
+        print(f"✅ Aggregated {summary['trades']:,} trades into {len(df):,} {resolution} bars")
+        return df, summary
+    all_trades.close()
 
-        except Exception as e:
-            print(f"⚠️ OHLCV fallback failed: {e}")
+    # Fallback to OHLCV if no trades
+    print("⚠️ No trade-level data — falling back to OHLCV...")
+    try:
+        # Whole window from its real start (the trade loop may have advanced `since`), paginated
+        df = backfill_ohlcv(exchange_name, pair, int(start_dt_utc.timestamp() * 1000), end_ts,
+                            resolution=resolution, exchange=async_exchange)
+        if df.empty:
+            print("⚠️ No OHLCV data found either.")
             return None, None
 
+        summary = bars_summary(df, exchange_name, pair, adjusted_pair, start_dt, end_dt)
+        # OHLCV covers the whole window, so shards lost on the trade path leave no gap here
+        summary["failed_shards"] = {}
+
+        return df, summary
+
+    except Exception as e:
+        print(f"⚠️ OHLCV fallback failed: {e}")
+        return None, None
+
 
 def interactive_fiat_tracker():
     """
@@ -177,6 +271,8 @@ def interactive_fiat_tracker():
     import pandas as pd
     from flowAnalysis.fiat_tracker import fetch_fiat_stable_trades
     from bigQueryUtils import upload_fiat_trades_to_bq
+    import exportUtils
+    from exportUtils import FIAT_BAR_SCHEMA
 
     print("\n📊 Fiat → Stablecoin Market Trade Fetcher")
 
@@ -193,7 +289,10 @@ def interactive_fiat_tracker():
         except ValueError:
             print("❌ Invalid format. Please use YYYY-MM-DD HH:MM")
 
-    df, summary = fetch_fiat_stable_trades(exchange, base, quote, start_dt, end_dt)
+    shards = input("⚡ Concurrent time shards (default: 1 = serial): ").strip()
+    shards = int(shards) if shards.isdigit() and int(shards) > 0 else 1
+
+    df, summary = fetch_fiat_stable_trades(exchange, base, quote, start_dt, end_dt, shards=shards)
 
     if df is None or df.empty:
         print("⚠️ No data returned.")
@@ -205,17 +304,18 @@ def interactive_fiat_tracker():
 
     tag = f"{exchange}_{base}_{quote}_{start_dt.strftime('%Y-%m-%d_%H:%M')}"
 
-    # Save to CSV
-    save = input("\n💾 Save to CSV? (y/n): ").strip().lower()
+    # Save export (typed, day-partitioned Parquet by default; CSV on request)
+    save = input("\n💾 Save export? (y/n): ").strip().lower()
     if save == "y":
         user_tag = input("🏷️ Enter a label for this time period (e.g. russian_sanctions): ").strip().replace(" ", "_")
         if user_tag:
             tag = user_tag
+        fmt = exportUtils.prompt_format()
 
         folder = os.path.join("CEX_FIAT_to_USDT", tag)
         os.makedirs(folder, exist_ok=True)
 
-        filename = f"{exchange}_{base.upper()}_{quote.upper()}_{start_dt.strftime('%Y-%m-%d_%H:%M')}_to_{end_dt.strftime('%Y%m%d_%H%M')}.csv"
+        basename = f"{exchange}_{base.upper()}_{quote.upper()}_{start_dt.strftime('%Y-%m-%d_%H:%M')}_to_{end_dt.strftime('%Y%m%d_%H%M')}"
 
         if 'timestamp' not in df.columns and 'datetime' in df.columns:
             df['timestamp'] = df['datetime']
@@ -228,27 +328,18 @@ def interactive_fiat_tracker():
 
         df.rename(columns={"timestamp": "date"}, inplace=True)
 
-        output_path = os.path.join(folder, filename)
-        df.to_csv(output_path, index=False)
-        print(f"✅ Saved to {output_path}")
+        written = exportUtils.write_dataset(df, folder, FIAT_BAR_SCHEMA, fmt=fmt, basename=basename)
+        print(f"✅ Saved {len(written)} file(s) to {folder}")
 
     # Upload to BigQuery
     upload = input("\n🚀 Upload this file to BigQuery? (y/n): ").strip().lower()
     if upload == "y":
-        # ✅ Add all expected fields
+        # ✅ Add all expected fields (bars built from trades already carry their own per-bar vwap)
         for field in ['exchange', 'symbol', 'adjusted_pair', 'vwap', 'usdt_volume', 'fiat_volume']:
-            if field in summary:
+            if field in summary and field not in df.columns:
                 df[field] = summary[field]
 
-        df['label'] = tag
-
-        for col in ["timestamp", "datetime", "Date_UTC_Time"]:
-            if col in df.columns:
-                df.drop(columns=[col], inplace=True)
-
-        print("📋 Final columns being uploaded to BigQuery:")
-        print(df.columns.tolist())
-
+        # The date column, label and leftover time columns are settled by the upload's own prep
         upload_fiat_trades_to_bq(
             df=df,
             project_id="macropipeline",
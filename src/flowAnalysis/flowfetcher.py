@@ -1,9 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import os
+import shutil
+import threading
+import time
+from typing import Optional
 import pandas as pd
 from dotenv import load_dotenv
-from bigQueryUtils import upload_flipside_to_bq
+from bigQueryUtils import load_job_id, upload_flipside_to_bq
+import exportUtils
+from exportUtils import USDT_FLOW_SCHEMA, ExportWriter
 import snowflake.connector
+from snowflake.connector.errors import InterfaceError, OperationalError
+from flowAnalysis.connection_pool import ConnectionPool
+from flowAnalysis.label_index import LabelIndex, LABEL_INDEX_DIR, cex_wallet_labels
+from flowAnalysis.checkpoint import CheckpointStore, file_checksum, window_key
+from instrumentation import in_run_context, pipeline_run, stage
+from requestScheduler import get_scheduler
 
 # ──────────────────────────────────────────────────────────────
 # 🔐 Load .env variables
@@ -21,75 +34,542 @@ SNOWFLAKE_CONFIG = {
 
 
 # ──────────────────────────────────────────────────────────────
-# 🔄 Core Query
+# 🔌 Shared Snowflake connections
 # ──────────────────────────────────────────────────────────────
-def fetch_usdt_transfers_snowflake(start_dt: datetime, end_dt: datetime) -> pd.DataFrame:
-    ctx = snowflake.connector.connect(**SNOWFLAKE_CONFIG)
-    cs = ctx.cursor()
+_pool = None
+
+
+def get_snowflake_pool(max_size: int = 4) -> ConnectionPool:
+    """
+    Process-wide Snowflake connection pool. Connections use server-side `qmark` binding
+    so every window runs the same statement text and Snowflake can reuse the compiled plan.
+    The pool is rebuilt if a caller needs more concurrent connections than it allows.
+    A connection error still retires the connection, but the retry itself is left to the
+    request scheduler's "snowflake" endpoint, which backs off between attempts.
+    """
+    global _pool
+    if _pool is not None and _pool.max_size < max_size:
+        _pool.close()
+        _pool = None
+    if _pool is None:
+        _pool = ConnectionPool(
+            lambda: snowflake.connector.connect(**SNOWFLAKE_CONFIG, paramstyle="qmark"),
+            max_size=max_size,
+            reconnect_on=(OperationalError, InterfaceError),
+            max_retries=0,
+        )
+    return _pool
 
-    sql = f"""
+
+# ──────────────────────────────────────────────────────────────
+# 🔄 Core Query
+# ──────────────────────────────────────────────────────────────
+# Raw transfers only; entities are attached client-side from the label index
+USDT_TRANSFERS_SQL = """
     SELECT
         t.block_timestamp AS date,
         t.tx_hash,
         t.from_address,
-        l_from.label AS from_entity,
         t.to_address,
-        l_to.label   AS to_entity,
         t.amount     AS usdt_amount
     FROM CORE.ez_token_transfers t
-    LEFT JOIN CORE.DIM_LABELS l_from
-           ON LOWER(t.from_address) = LOWER(l_from.address)
-    LEFT JOIN CORE.DIM_LABELS l_to
-           ON LOWER(t.to_address)  = LOWER(l_to.address)
     WHERE t.symbol = 'USDT'
-      AND t.block_timestamp BETWEEN '{start_dt:%Y-%m-%d %H:%M:%S}'
-                                AND '{end_dt:%Y-%m-%d %H:%M:%S}'
+      AND t.block_timestamp BETWEEN ? AND ?
     ORDER BY t.block_timestamp ASC
 """
 
+DIM_LABELS_SQL = """
+    SELECT LOWER(address) AS address, MIN(label) AS label
+    FROM CORE.DIM_LABELS
+    WHERE label IS NOT NULL
+    GROUP BY LOWER(address)
+"""
+
+LABEL_INDEX_MAX_AGE = timedelta(days=7)
+_label_index = None
+_label_lock = threading.Lock()
 
-    cs.execute(sql)
-    df = cs.fetch_pandas_all()
-    ctx.close()
-    return df
+
+def get_label_index(pool: ConnectionPool = None, refresh: bool = False, cache_dir: str = LABEL_INDEX_DIR,
+                    max_age: timedelta = LABEL_INDEX_MAX_AGE, source: str = "dim_labels") -> LabelIndex:
+    """
+    Process-wide address → entity index. Loaded from the local snapshot when it is younger than
+    `max_age`, otherwise rebuilt and saved as a new version, either from one DIM_LABELS scan
+    (`source="dim_labels"`) or from the BigQuery CEXWallets table (`source="cex_wallets"`).
+    """
+    global _label_index
+    with _label_lock:
+        if _label_index is not None and not refresh:
+            return _label_index
+
+        index = None if refresh else LabelIndex.load(cache_dir)
+        if index is None or time.time() - index.built_at > max_age.total_seconds():
+            print(f"🏷️ Refreshing address label index from {source}...")
+            if source == "cex_wallets":
+                index = cex_wallet_labels()
+            else:
+                df = get_scheduler().call("snowflake", (pool or get_snowflake_pool()).run,
+                                          lambda ctx: query_frame(ctx, DIM_LABELS_SQL))
+                df.columns = [c.lower() for c in df.columns]
+                index = LabelIndex.from_frame(df, source="CORE.DIM_LABELS")
+            index.save(cache_dir)
+            print(f"✅ Label index {index.version}: {len(index):,} addresses")
+
+        _label_index = index
+        return index
+
+
+def _fetch_frame(cs) -> pd.DataFrame:
+    # Snowflake cursors build the frame natively; plain DB-API cursors fall back to fetchall
+    if hasattr(cs, "fetch_pandas_all"):
+        return cs.fetch_pandas_all()
+    columns = [col[0] for col in cs.description]
+    return pd.DataFrame(cs.fetchall(), columns=columns)
+
+
+def query_frame(ctx, sql: str, params=None) -> pd.DataFrame:
+    """Run `sql` on a DB-API connection and return the result as a DataFrame."""
+    cs = ctx.cursor()
+    try:
+        cs.execute(sql, params) if params else cs.execute(sql)
+        return _fetch_frame(cs)
+    finally:
+        cs.close()
+
+
+def fetch_usdt_transfers_snowflake(start_dt: datetime, end_dt: datetime, pool: ConnectionPool = None,
+                                   labels: LabelIndex = None) -> pd.DataFrame:
+    pool = pool or get_snowflake_pool()
+    labels = labels if labels is not None else get_label_index(pool)
+    params = (f"{start_dt:%Y-%m-%d %H:%M:%S}", f"{end_dt:%Y-%m-%d %H:%M:%S}")
+
+    df = get_scheduler().call("snowflake", pool.run, lambda ctx: query_frame(ctx, USDT_TRANSFERS_SQL, params))
+    return labels.attach(df)
+
+
+# ──────────────────────────────────────────────────────────────
+# 🌊 Streaming Extraction
+# ──────────────────────────────────────────────────────────────
+STREAM_BATCH_ROWS = 100_000
+
+
+def iter_usdt_transfer_batches(start_dt: datetime, end_dt: datetime, pool: ConnectionPool = None,
+                               batch_rows: int = STREAM_BATCH_ROWS, labels: LabelIndex = None):
+    """
+    Yield the transfers in [start_dt, end_dt] as a sequence of DataFrames, one result batch at a
+    time, so a window never has to fit in memory. Snowflake cursors stream their Arrow result
+    chunks via fetch_pandas_batches(); plain DB-API cursors use fetchmany(batch_rows).
+    """
+    pool = pool or get_snowflake_pool()
+    labels = labels if labels is not None else get_label_index(pool)
+    params = (f"{start_dt:%Y-%m-%d %H:%M:%S}", f"{end_dt:%Y-%m-%d %H:%M:%S}")
+
+    with pool.connection() as ctx:
+        cs = ctx.cursor()
+        try:
+            cs.execute(USDT_TRANSFERS_SQL, params)
+            if hasattr(cs, "fetch_pandas_batches"):
+                for batch in cs.fetch_pandas_batches():
+                    if not batch.empty:
+                        yield labels.attach(batch)
+                return
+
+            columns = [col[0] for col in cs.description]
+            while True:
+                rows = cs.fetchmany(batch_rows)
+                if not rows:
+                    break
+                yield labels.attach(pd.DataFrame(rows, columns=columns))
+        finally:
+            cs.close()
+
+
+def stream_usdt_transfers_to_file(start_dt: datetime, end_dt: datetime, fpath: str, pool: ConnectionPool = None,
+                                  batch_rows: int = STREAM_BATCH_ROWS, labels: LabelIndex = None) -> int:
+    """
+    Write one window's transfers to `fpath` (Parquet or CSV, by extension) batch by batch and
+    return the row count. The file is only created when the window has rows.
+    A dropped connection restarts the window, with the "snowflake" endpoint's backoff.
+    """
+    pool = pool or get_snowflake_pool()
+
+    def _write_window():
+        try:
+            with ExportWriter(fpath, USDT_FLOW_SCHEMA) as writer:
+                for batch in iter_usdt_transfer_batches(start_dt, end_dt, pool=pool, batch_rows=batch_rows,
+                                                        labels=labels):
+                    writer.write(batch)
+            return writer.rows
+        except Exception:
+            if os.path.exists(fpath):
+                os.remove(fpath)
+            raise
+
+    return get_scheduler().call("snowflake", _write_window)
+
+
+# ──────────────────────────────────────────────────────────────
+# 📈 Progress & Throughput
+# ──────────────────────────────────────────────────────────────
+class ExtractionProgress:
+    """Thread-safe window/row counter that prints throughput at most every `interval` seconds."""
+
+    def __init__(self, total_windows: int, interval: float = 5.0, enabled: bool = True):
+        self.total_windows = total_windows
+        self.interval = interval
+        self.enabled = enabled
+        self.windows_done = 0
+        self.windows_skipped = 0
+        self.rows = 0
+        self._started = time.monotonic()
+        self._last_report = self._started
+        self._lock = threading.Lock()
+
+    def update(self, rows: int):
+        with self._lock:
+            self.windows_done += 1
+            self.rows += rows
+            now = time.monotonic()
+            if self.enabled and (now - self._last_report >= self.interval or self.windows_done == self.total_windows):
+                self._last_report = now
+                self._print(now)
+
+    def skip(self, windows: int = 1):
+        """Count windows already completed by an earlier run without crediting their rows."""
+        with self._lock:
+            self.windows_done += windows
+            self.windows_skipped += windows
+
+    def _print(self, now: float):
+        elapsed = max(now - self._started, 1e-9)
+        fetched = self.windows_done - self.windows_skipped
+        skipped = f" ({self.windows_skipped} from checkpoint)" if self.windows_skipped else ""
+        print(f"⏳ {self.windows_done}/{self.total_windows} windows{skipped} | {self.rows:,} rows | "
+              f"{self.rows / elapsed:,.0f} rows/s | {fetched / elapsed:.2f} windows/s")
+
+    def finish(self):
+        if self.enabled:
+            elapsed = time.monotonic() - self._started
+            skipped = f", {self.windows_skipped} skipped from checkpoint" if self.windows_skipped else ""
+            print(f"✅ Extracted {self.rows:,} rows from {self.windows_done} windows in {elapsed:.1f}s{skipped}")
 
 
 # ──────────────────────────────────────────────────────────────
 # 🕓 Hourly & Daily Pulls
 # ──────────────────────────────────────────────────────────────
-def fetch_usdt_flows_hourly_chunks(start_dt: datetime, end_dt: datetime) -> pd.DataFrame:
-    all_dfs = []
+def _iter_windows(start_dt: datetime, end_dt: datetime, step: timedelta):
+    windows = []
     while start_dt < end_dt:
-        next_dt = min(start_dt + timedelta(hours=1), end_dt)
-        df = fetch_usdt_transfers_snowflake(start_dt, next_dt)
+        next_dt = min(start_dt + step, end_dt)
+        windows.append((start_dt, next_dt))
+        start_dt = next_dt
+    return windows
+
+
+def _fetch_windows(windows, pool: ConnectionPool = None, max_workers: int = 1,
+                   progress: ExtractionProgress = None, labels: LabelIndex = None) -> list:
+    """Fetch every (start, end) window, up to `max_workers` at a time; frames come back in window order."""
+    labels = labels if labels is not None else get_label_index(pool)
+
+    def _fetch(window):
+        df = fetch_usdt_transfers_snowflake(*window, pool=pool, labels=labels)
+        if progress is not None:
+            progress.update(len(df))
+        return df
+
+    if max_workers <= 1:
+        return [_fetch(w) for w in windows]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(in_run_context(_fetch), windows))
+
+
+def fetch_usdt_flows_parallel(start_dt: datetime, end_dt: datetime, max_workers: int = 4,
+                              window: timedelta = timedelta(hours=1), pool: ConnectionPool = None,
+                              progress: bool = True, labels: LabelIndex = None) -> pd.DataFrame:
+    """
+    Pull [start_dt, end_dt) as `window`-sized queries running `max_workers` at a time on a
+    shared connection pool, reassembled in time order.
+    """
+    pool = pool or get_snowflake_pool(max_size=max_workers)
+    windows = _iter_windows(start_dt, end_dt, window)
+    tracker = ExtractionProgress(len(windows), enabled=progress)
+
+    all_dfs = [df for df in _fetch_windows(windows, pool, max_workers, tracker, labels) if not df.empty]
+    tracker.finish()
+    return pd.concat(all_dfs, ignore_index=True) if all_dfs else pd.DataFrame()
+
+
+def fetch_usdt_flows_hourly_chunks(start_dt: datetime, end_dt: datetime, pool: ConnectionPool = None,
+                                   max_workers: int = 1, labels: LabelIndex = None) -> pd.DataFrame:
+    if max_workers > 1:
+        return fetch_usdt_flows_parallel(start_dt, end_dt, max_workers=max_workers, pool=pool, progress=False,
+                                         labels=labels)
+
+    labels = labels if labels is not None else get_label_index(pool)
+    all_dfs = []
+    for window_start, window_end in _iter_windows(start_dt, end_dt, timedelta(hours=1)):
+        df = fetch_usdt_transfers_snowflake(window_start, window_end, pool=pool, labels=labels)
         if not df.empty:
             all_dfs.append(df)
-        start_dt = next_dt
     return pd.concat(all_dfs, ignore_index=True) if all_dfs else pd.DataFrame()
 
 
-def fetch_usdt_flows_daily_range(start_dt: datetime, end_dt: datetime, export_dir: str):
+def daily_export_path(export_dir: str, day: datetime, fmt: str = exportUtils.PARQUET) -> str:
+    """Parquet days go to a `day=YYYY-MM-DD` partition; CSV days stay flat as before."""
+    fname = f"usdtflows_{day:%Y-%m-%d}{exportUtils.extension(fmt)}"
+    if fmt == exportUtils.PARQUET:
+        return os.path.join(exportUtils.partition_dir(export_dir, day), fname)
+    return os.path.join(export_dir, fname)
+
+
+def stream_usdt_flows_to_file(start_dt: datetime, end_dt: datetime, fpath: str, pool: ConnectionPool = None,
+                              max_workers: int = 1, window: timedelta = timedelta(hours=1),
+                              progress: ExtractionProgress = None, batch_rows: int = STREAM_BATCH_ROWS,
+                              labels: LabelIndex = None, checkpoint: CheckpointStore = None) -> Optional[int]:
+    """
+    Extract [start_dt, end_dt) into a single Parquet or CSV file at `fpath` with bounded memory:
+    each window is streamed batch by batch into its own part file (up to `max_workers` windows at
+    a time) and the parts are then concatenated on disk in time order. Returns the number of rows
+    written.
+
+    With a checkpoint, finished windows and files are skipped, a failing window is recorded
+    instead of aborting the pull, and None is returned while any window is still missing
+    (its finished part files are kept for the next run).
+    """
+    windows = _iter_windows(start_dt, end_dt, window)
+    file_key = os.path.basename(fpath)
+    if checkpoint is not None and checkpoint.is_done(file_key):
+        if progress is not None:
+            progress.skip(len(windows))
+        return checkpoint.get(file_key)["rows"]
+
+    # Leading underscore keeps unfinished parts out of dataset readers
+    parts_dir = os.path.join(os.path.dirname(fpath), f"_{os.path.basename(fpath)}.parts")
+    os.makedirs(parts_dir, exist_ok=True)
+    ext = os.path.splitext(fpath)[1]
+    part_paths = [os.path.join(parts_dir, f"{i:05d}{ext}") for i in range(len(windows))]
+    labels = labels if labels is not None else get_label_index(pool)
+
+    def _run(i):
+        key = window_key(*windows[i])
+        if checkpoint is not None and checkpoint.is_done(key):
+            if progress is not None:
+                progress.skip()
+            return checkpoint.get(key)["rows"]
+
+        if checkpoint is not None:
+            checkpoint.mark_running(key)
+        try:
+            rows = stream_usdt_transfers_to_file(*windows[i], part_paths[i], pool=pool, batch_rows=batch_rows,
+                                                 labels=labels)
+        except Exception as e:
+            if checkpoint is None:
+                raise
+            checkpoint.mark_failed(key, e)
+            print(f"❌ Window {key} failed: {e}")
+            return None
+
+        if checkpoint is not None:
+            checkpoint.mark_done(key, rows, part_paths[i] if rows else None)
+        if progress is not None:
+            progress.update(rows)
+        return rows
+
+    with stage("fetch", table=file_key, rows_in=len(windows), workers=max_workers) as st:
+        if max_workers <= 1:
+            results = [_run(i) for i in range(len(windows))]
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(in_run_context(_run), range(len(windows))))
+        st.set(rows_out=sum(rows or 0 for rows in results),
+               failed_windows=sum(rows is None for rows in results))
+
+    if any(rows is None for rows in results):
+        return None
+
+    total = sum(results)
+    with stage("export", table=file_key, rows_in=total) as st:
+        wrote = exportUtils.concat_files(part_paths, fpath, USDT_FLOW_SCHEMA)
+        st.set(rows_out=total if wrote else 0, bytes=os.path.getsize(fpath) if wrote else 0)
+    if checkpoint is not None:
+        checkpoint.mark_done(file_key, total, fpath if wrote else None)
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    return total
+
+
+def stream_usdt_flows_daily_range(start_dt: datetime, end_dt: datetime, export_dir: str, pool: ConnectionPool = None,
+                                  max_workers: int = 1, batch_rows: int = STREAM_BATCH_ROWS,
+                                  labels: LabelIndex = None, checkpoint: CheckpointStore = None,
+                                  fmt: str = exportUtils.PARQUET):
+    """
+    Generator over the daily files of a range: yields (fpath, row_count) as each day is written.
+    No DataFrame outlives its batch, so peak memory does not grow with the length of the range.
+    With a checkpoint, days with failed windows are left incomplete instead of stopping the pull.
+    """
     os.makedirs(export_dir, exist_ok=True)
-    daily_outputs = []
-    while start_dt < end_dt:
-        next_dt = min(start_dt + timedelta(days=1), end_dt)
-        df = fetch_usdt_flows_hourly_chunks(start_dt, next_dt)
-        if not df.empty:
-            fname = f"usdtflows_{start_dt.strftime('%Y-%m-%d')}.csv"
-            fpath = os.path.join(export_dir, fname)
-            df.to_csv(fpath, index=False)
-            print(f"✅ Saved: {fpath} ({len(df)} rows)")
-            daily_outputs.append((fpath, df))
-        start_dt = next_dt
+    pool = pool or get_snowflake_pool(max_size=max(max_workers, 1))
+    labels = labels if labels is not None else get_label_index(pool)
+
+    days = _iter_windows(start_dt, end_dt, timedelta(days=1))
+    progress = ExtractionProgress(sum(len(_iter_windows(*day, timedelta(hours=1))) for day in days))
+
+    for day_start, day_end in days:
+        fpath = daily_export_path(export_dir, day_start, fmt)
+        os.makedirs(os.path.dirname(fpath), exist_ok=True)
+        rows = stream_usdt_flows_to_file(day_start, day_end, fpath, pool=pool, max_workers=max_workers,
+                                         progress=progress, batch_rows=batch_rows, labels=labels,
+                                         checkpoint=checkpoint)
+        if rows:
+            yield fpath, rows
+    progress.finish()
+
+
+def fetch_usdt_flows_daily_range(start_dt: datetime, end_dt: datetime, export_dir: str, pool: ConnectionPool = None,
+                                 max_workers: int = 1, labels: LabelIndex = None,
+                                 checkpoint: CheckpointStore = None, fmt: str = exportUtils.PARQUET):
+    """Write one file per day under `export_dir` and return [(fpath, row_count), ...]."""
+    daily_outputs = list(stream_usdt_flows_daily_range(start_dt, end_dt, export_dir, pool=pool,
+                                                       max_workers=max_workers, labels=labels,
+                                                       checkpoint=checkpoint, fmt=fmt))
+    print(f"💾 Wrote {len(daily_outputs)} daily files to {export_dir}")
     return daily_outputs
 
 
+UPLOAD_CHUNK_ROWS = 500_000
+FLOW_DATASET = "usdtFlows"
+
+
+def prepare_flow_chunk(df: pd.DataFrame, tag: str) -> pd.DataFrame:
+    """Cast an exported flow chunk to the Flipside table's columns, in place."""
+    df["date"] = pd.to_datetime(df["date"], utc=True, errors="coerce")
+    df["date_UTC"] = df["date"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    df["tx_hash"] = df["tx_hash"].astype(str)
+    df["from_address"] = df["from_address"].astype(str)
+    df["to_address"] = df["to_address"].astype(str)
+    df["usdt_amount"] = pd.to_numeric(df["usdt_amount"], errors="coerce")
+    df["label"] = tag
+    return df
+
+
+def _upload_flow_chunk(df: pd.DataFrame, tag: str, table_id: str, job_id_prefix: str = None):
+    with stage("transform", table=table_id, rows_in=len(df)) as st:
+        st.output(prepare_flow_chunk(df, tag))
+    print("🔍 Uploading sample row:", df.head(1).to_dict())
+
+    with stage("upload", table=table_id, rows_in=len(df)) as st:
+        return st.output(upload_flipside_to_bq(
+            df=df,
+            dataset_id=FLOW_DATASET,
+            table_id=table_id,
+            tag=tag,
+            job_id_prefix=job_id_prefix,
+        ))
+
+
+# ──────────────────────────────────────────────────────────────
+# 🗂️ Checkpointed Pulls
+# ──────────────────────────────────────────────────────────────
+FLOW_EXPORT_ROOT = "SNOWFLAKE_USDT_FLOWS"
+
+
+def run_stablecoin_flow_pull(start_dt: datetime, end_dt: datetime, tag: str, table_id: str = "usdt_to_binance",
+                             daily: bool = True, max_workers: int = 1, upload: bool = False,
+                             fmt: str = exportUtils.PARQUET):
+    """
+    Checkpointed pull of [start_dt, end_dt) into SNOWFLAKE_USDT_FLOWS/<tag>. Rerunning with the
+    same tag skips windows and files the manifest already has, retries failed windows, and only
+    uploads files that were not uploaded before.
+    """
+    with pipeline_run("flows", dataset_id=FLOW_DATASET, start_date=start_dt, end_date=end_dt, tag=tag):
+        folder = os.path.join(FLOW_EXPORT_ROOT, tag)
+        checkpoint = CheckpointStore(folder)
+        checkpoint.set_params(start=f"{start_dt:%Y-%m-%d %H:%M}", end=f"{end_dt:%Y-%m-%d %H:%M}", table_id=table_id,
+                              daily=daily, max_workers=max_workers, upload=upload, fmt=fmt)
+
+        if daily:
+            results = fetch_usdt_flows_daily_range(start_dt, end_dt, export_dir=folder, max_workers=max_workers,
+                                                   checkpoint=checkpoint, fmt=fmt)
+        else:
+            fname = f"usdtflows_{start_dt:%Y%m%d_%H%M}_to_{end_dt:%Y%m%d_%H%M}{exportUtils.extension(fmt)}"
+            fpath = os.path.join(folder, fname)
+            # Serial pulls keep the single range query; parallel pulls split it into hourly windows
+            window = timedelta(hours=1) if max_workers > 1 else end_dt - start_dt
+            pool = get_snowflake_pool(max_size=max_workers)
+            rows = stream_usdt_flows_to_file(start_dt, end_dt, fpath, pool=pool, max_workers=max_workers, window=window,
+                                             checkpoint=checkpoint)
+            if rows is not None:
+                print(f"✅ Saved: {fpath} ({rows} rows)")
+            results = [(fpath, rows)] if rows else []
+
+        failed = checkpoint.failed()
+        if failed:
+            print(f"⚠️ {len(failed)} window(s) failed and were left for a rerun: {', '.join(sorted(failed))}")
+            print(f"🔁 Resume with: python main.py --resume {tag}")
+
+        if upload:
+            # Re-read each file in chunks so uploads stay within the same memory bound as extraction
+            for fpath, _ in results:
+                key = os.path.basename(fpath)
+                entry = checkpoint.get(key) or {}
+                if entry.get("uploaded"):
+                    continue
+                # Batches are cut the same way from an unchanged file, so loaded ones are skipped on
+                # resume, and job ids tied to the file's contents keep a partly loaded batch from
+                # appending its loaded chunks twice
+                checksum = entry.get("checksum") or file_checksum(fpath)
+                done = checkpoint.uploaded_batches(key, checksum)
+                results_ok = True
+                for i, df in enumerate(exportUtils.iter_batches(fpath, batch_rows=UPLOAD_CHUNK_ROWS)):
+                    if i in done:
+                        continue
+                    job_id_prefix = load_job_id("flows", table_id, checksum[:16], i)
+                    if _upload_flow_chunk(df, tag, table_id, job_id_prefix).ok:
+                        checkpoint.mark_batch_uploaded(key, checksum, i)
+                    else:
+                        results_ok = False
+                if results_ok:
+                    checkpoint.mark_uploaded(key)
+                else:
+                    print(f"⚠️ {key} was only partly uploaded; the remaining batches are retried on resume")
+            print("✅ Upload complete.")
+
+        get_scheduler().report()
+        return results
+
+
+def resume_stablecoin_flow_pull(tag: str):
+    """Rerun a previous pull with the parameters stored in its manifest."""
+    folder = os.path.join(FLOW_EXPORT_ROOT, tag)
+    if not CheckpointStore.exists(folder):
+        print(f"❌ No checkpoint manifest found in {folder}")
+        return None
+
+    params = CheckpointStore(folder).params
+    print(f"🔁 Resuming '{tag}': {params['start']} → {params['end']} (status: {CheckpointStore(folder).summary()})")
+    return run_stablecoin_flow_pull(
+        datetime.strptime(params["start"], "%Y-%m-%d %H:%M"),
+        datetime.strptime(params["end"], "%Y-%m-%d %H:%M"),
+        tag,
+        table_id=params.get("table_id", "usdt_to_binance"),
+        daily=params.get("daily", True),
+        max_workers=params.get("max_workers", 1),
+        upload=params.get("upload", False),
+        fmt=params.get("fmt", exportUtils.CSV),
+    )
+
+
 # ──────────────────────────────────────────────────────────────
 # 🧪 CLI Interface
 # ──────────────────────────────────────────────────────────────
 def interactive_stablecoin_flow_tracker():
     print("\n🔗 USDT On-Chain Flow Tracker (Snowflake)")
 
+    tag = input("🏷️ Label for this pull: ").strip().replace(" ", "_")
+    if CheckpointStore.exists(os.path.join(FLOW_EXPORT_ROOT, tag)):
+        if input(f"🔁 Found an earlier pull labelled '{tag}'. Resume it? (y/n): ").strip().lower() == "y":
+            return resume_stablecoin_flow_pull(tag)
+
     while True:
         try:
             start_dt = datetime.strptime(input("🕐 Start datetime (YYYY-MM-DD HH:MM): "), "%Y-%m-%d %H:%M")
@@ -98,38 +578,13 @@ def interactive_stablecoin_flow_tracker():
         except ValueError:
             print("❌ Invalid format. Try again.")
 
-    tag = input("🏷️ Label for this pull: ").strip().replace(" ", "_")
     table_id = input("📄 BigQuery table (default: usdt_to_binance): ").strip() or "usdt_to_binance"
-    folder = os.path.join("SNOWFLAKE_USDT_FLOWS", tag)
-    os.makedirs(folder, exist_ok=True)
 
     daily = input("🔁 Chunk into daily batches? (y/n): ").strip().lower() == "y"
+    workers = input("⚡ Hourly windows to run in parallel (default: 1 = serial): ").strip()
+    max_workers = int(workers) if workers.isdigit() and int(workers) > 0 else 1
+    fmt = exportUtils.prompt_format()
     upload = input("🚀 Upload to BigQuery? (y/n): ").strip().lower() == "y"
 
-    if daily:
-        results = fetch_usdt_flows_daily_range(start_dt, end_dt, export_dir=folder)
-    else:
-        df = fetch_usdt_transfers_snowflake(start_dt, end_dt)
-        fpath = os.path.join(folder, f"usdtflows_{start_dt:%Y%m%d_%H%M}_to_{end_dt:%Y%m%d_%H%M}.csv")
-        df.to_csv(fpath, index=False)
-        print(f"✅ Saved: {fpath} ({len(df)} rows)")
-        results = [(fpath, df)]
-
-    if upload:
-        for _, df in results:
-            df["date"] = pd.to_datetime(df["date"], utc=True, errors="coerce")
-            df["date_UTC"] = df["date"].dt.strftime("%Y-%m-%d %H:%M:%S")
-            df["tx_hash"] = df["tx_hash"].astype(str)
-            df["from_address"] = df["from_address"].astype(str)
-            df["to_address"] = df["to_address"].astype(str)
-            df["usdt_amount"] = pd.to_numeric(df["usdt_amount"], errors="coerce")
-            df["label"] = tag
-            print("🔍 Uploading sample row:", df.head(1).to_dict())
-
-            upload_flipside_to_bq(
-                df=df,
-                dataset_id="usdtFlows",
-                table_id=table_id,
-                tag=tag,
-            )
-        print("✅ Upload complete.")
+    return run_stablecoin_flow_pull(start_dt, end_dt, tag, table_id=table_id, daily=daily,
+                                    max_workers=max_workers, upload=upload, fmt=fmt)
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+LABEL_INDEX_DIR = "LABEL_INDEX"
+
+
+# ──────────────────────────────────────────────────────────────
+# 🏷️ Address → entity index
+# ──────────────────────────────────────────────────────────────
+class LabelIndex:
+    """
+    Compact, versioned address → entity lookup table.
+
+    Addresses are stored pre-lowercased and unique; entities are dictionary-encoded as int32
+    codes into a small list of distinct labels. Lookups hash a whole column of addresses at once,
+    so labels are attached client-side instead of joining DIM_LABELS in every window query.
+    """
+
+    def __init__(self, addresses: np.ndarray, codes: np.ndarray, entities: list,
+                 version: str, built_at: float = None, source: str = None):
+        self.addresses = addresses
+        self.codes = codes
+        self.entities = list(entities)
+        self.version = version
+        self.built_at = built_at or time.time()
+        self.source = source
+        self._index = pd.Index(addresses)
+        # One trailing slot so "not found" (-1) maps to None without a branch
+        self._entity_lookup = np.array(self.entities + [None], dtype=object)
+
+    def __len__(self):
+        return len(self.addresses)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, address_col: str = "address", entity_col: str = "label",
+                   source: str = None) -> "LabelIndex":
+        labels = pd.DataFrame({
+            "address": df[address_col].astype(str).str.lower(),
+            "entity": df[entity_col],
+        }).dropna()
+        # One label per address, chosen deterministically when the source has several
+        labels = labels.sort_values(["address", "entity"]).drop_duplicates("address", keep="first")
+
+        entity = pd.Categorical(labels["entity"])
+        addresses = labels["address"].to_numpy(dtype=object)
+        codes = entity.codes.astype("int32")
+        entities = [str(e) for e in entity.categories]
+
+        digest = hashlib.sha256()
+        for chunk in (addresses, np.asarray(entities, dtype=object)[codes]):
+            digest.update("\n".join(chunk).encode())
+        return cls(addresses, codes, entities, version=digest.hexdigest()[:12], source=source)
+
+    # ── lookups ───────────────────────────────────────────────
+    def lookup(self, addresses) -> np.ndarray:
+        """Entity for each address (case-insensitive), or None when unlabelled."""
+        lowered = pd.Series(addresses, dtype=object).str.lower()
+        if len(self) == 0:
+            return np.full(len(lowered), None, dtype=object)
+        pos = self._index.get_indexer(lowered)
+        codes = np.where(pos >= 0, self.codes[pos], -1)
+        return self._entity_lookup[codes]
+
+    def attach(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Add from_entity / to_entity next to from_address / to_address, matching the column case
+        the warehouse returned (Snowflake upper-cases unquoted aliases).
+        """
+        lower_cols = {c.lower(): c for c in df.columns}
+        for side in ("from", "to"):
+            addr_col = lower_cols.get(f"{side}_address")
+            if addr_col is None:
+                continue
+            entity_col = f"{side}_entity".upper() if addr_col.isupper() else f"{side}_entity"
+            values = self.lookup(df[addr_col].to_numpy()) if len(df) else np.array([], dtype=object)
+            if entity_col in df.columns:
+                df[entity_col] = values
+            else:
+                df.insert(df.columns.get_loc(addr_col) + 1, entity_col, values)
+        return df
+
+    # ── persistence ───────────────────────────────────────────
+    def save(self, cache_dir: str = LABEL_INDEX_DIR) -> str:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, f"labels_{self.version}.parquet")
+        table = pa.table({
+            "address": pa.array(self.addresses, type=pa.string()),
+            "entity": pa.DictionaryArray.from_arrays(pa.array(self.codes, type=pa.int32()),
+                                                     pa.array(self.entities, type=pa.string())),
+        })
+        pq.write_table(table, path, compression="zstd")
+
+        current = {"version": self.version, "built_at": self.built_at, "source": self.source,
+                   "rows": len(self), "path": os.path.basename(path)}
+        tmp = os.path.join(cache_dir, "CURRENT.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(current, f, indent=2)
+        os.replace(tmp, os.path.join(cache_dir, "CURRENT.json"))
+        return path
+
+    @classmethod
+    def load(cls, cache_dir: str = LABEL_INDEX_DIR) -> Optional["LabelIndex"]:
+        """Load the current snapshot from `cache_dir`, or None if there isn't one."""
+        current_path = os.path.join(cache_dir, "CURRENT.json")
+        if not os.path.exists(current_path):
+            return None
+        with open(current_path, "r") as f:
+            current = json.load(f)
+
+        table = pq.read_table(os.path.join(cache_dir, current["path"]), read_dictionary=["entity"])
+        entity = table.column("entity").combine_chunks()
+        return cls(
+            addresses=table.column("address").to_numpy(zero_copy_only=False).astype(object),
+            codes=entity.indices.to_numpy(zero_copy_only=False).astype("int32"),
+            entities=entity.dictionary.to_pylist(),
+            version=current["version"],
+            built_at=current["built_at"],
+            source=current.get("source"),
+        )
+
+
+# ──────────────────────────────────────────────────────────────
+# 🌱 Seed sources
+# ──────────────────────────────────────────────────────────────
+def cex_wallet_labels(table_id: str = "macropipeline.KYCWallets.CEXWallets") -> LabelIndex:
+    """Build an index from the CEXWallets table that getWalletData.py maintains in BigQuery."""
+    from bigQueryUtils import get_client
+
+    client = get_client()
+    df = client.query(f"SELECT LOWER(address) AS address, entity FROM `{table_id}`").to_dataframe()
+    return LabelIndex.from_frame(df, entity_col="entity", source=table_id)
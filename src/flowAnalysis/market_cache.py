@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import time
+
+import ccxt
+import ccxt.async_support as ccxt_async
+
+MARKET_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "shadowMarketTracker", "markets")
+MARKET_CACHE_TTL = 24 * 3600
+
+FIAT_CURRENCIES = {"USD", "EUR", "RUB", "TRY", "JPY", "GBP", "AUD", "CAD", "CHF", "ZAR", "MXN", "SGD", "HKD"}
+STABLECOINS = {"USDT", "USDC", "BUSD", "TUSD", "DAI", "GUSD", "USDP"}
+
+_exchanges = {}
+_pair_indexes = {}
+_lock = threading.RLock()
+
+
+# ──────────────────────────────────────────────────────────────
+# 💾 On-disk market metadata
+# ──────────────────────────────────────────────────────────────
+def _cache_path(exchange_name: str, cache_dir: str = MARKET_CACHE_DIR) -> str:
+    return os.path.join(cache_dir, f"{exchange_name}.json")
+
+
+def _read_cached_markets(exchange_name: str, ttl: float = MARKET_CACHE_TTL, cache_dir: str = MARKET_CACHE_DIR):
+    path = _cache_path(exchange_name, cache_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        cached = json.load(f)
+    if time.time() - cached.get("fetched_at", 0) > ttl:
+        return None
+    return cached
+
+
+def _write_cached_markets(exchange_name: str, markets: dict, currencies: dict, cache_dir: str = MARKET_CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(exchange_name, cache_dir)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"fetched_at": time.time(), "markets": markets, "currencies": currencies}, f, default=str)
+    os.replace(tmp, path)
+
+
+def load_markets_cached(exchange, ttl: float = MARKET_CACHE_TTL, refresh: bool = False,
+                        cache_dir: str = MARKET_CACHE_DIR) -> dict:
+    """
+    Populate `exchange.markets` from the on-disk cache when it is younger than `ttl` seconds,
+    otherwise call load_markets() once and save the result for later processes.
+    """
+    name = exchange.id
+    cached = None if refresh else _read_cached_markets(name, ttl, cache_dir)
+    if cached is not None:
+        exchange.set_markets(cached["markets"], cached.get("currencies") or None)
+        return exchange.markets
+
+    markets = exchange.load_markets(reload=refresh)
+    _write_cached_markets(name, markets, getattr(exchange, "currencies", None) or {}, cache_dir)
+    return markets
+
+
+# ──────────────────────────────────────────────────────────────
+# 🌐 Process-wide exchange registry
+# ──────────────────────────────────────────────────────────────
+def get_exchange(exchange_name: str, ttl: float = MARKET_CACHE_TTL):
+    """One ccxt exchange per name per process, with markets already loaded (from cache when fresh)."""
+    with _lock:
+        exchange = _exchanges.get(exchange_name)
+        if exchange is None:
+            exchange = getattr(ccxt, exchange_name)({"enableRateLimit": True})
+            load_markets_cached(exchange, ttl=ttl)
+            _exchanges[exchange_name] = exchange
+        return exchange
+
+
+def register_exchange(exchange_name: str, exchange):
+    """Put a ready-made exchange (e.g. an offline fake with `markets` set) in the registry under `exchange_name`."""
+    with _lock:
+        _exchanges[exchange_name] = exchange
+        _pair_indexes.pop(exchange_name, None)
+
+
+def new_async_exchange(exchange_name: str, ttl: float = MARKET_CACHE_TTL, config: dict = None):
+    """
+    Fresh ccxt.async_support exchange with markets preloaded from the shared cache. Async clients
+    are bound to an event loop, so they are created per run rather than kept in the registry.
+    `config` is passed to the constructor, e.g. {"rateLimit": ms}; ccxt builds its throttle there.
+    """
+    exchange = getattr(ccxt_async, exchange_name)({"enableRateLimit": True, **(config or {})})
+    markets = get_exchange(exchange_name, ttl=ttl).markets
+    exchange.set_markets(markets, get_exchange(exchange_name).currencies or None)
+    return exchange
+
+
+# ──────────────────────────────────────────────────────────────
+# 🔎 Fiat ⇄ stablecoin pair index
+# ──────────────────────────────────────────────────────────────
+def fiat_stable_pairs(exchange_name: str) -> list:
+    """
+    Precomputed fiat ⇄ stablecoin markets of an exchange, as dicts with
+    symbol, base, quote, fiat and stable keys.
+    """
+    with _lock:
+        if exchange_name not in _pair_indexes:
+            pairs = []
+            for symbol in get_exchange(exchange_name).markets:
+                # Spot markets only; derivatives carry a ":SETTLE" suffix
+                if "/" not in symbol or ":" in symbol:
+                    continue
+                base, quote = symbol.split("/", 1)
+                if base in FIAT_CURRENCIES and quote in STABLECOINS:
+                    pairs.append({"symbol": symbol, "base": base, "quote": quote, "fiat": base, "stable": quote})
+                elif base in STABLECOINS and quote in FIAT_CURRENCIES:
+                    pairs.append({"symbol": symbol, "base": base, "quote": quote, "fiat": quote, "stable": base})
+            _pair_indexes[exchange_name] = pairs
+        return _pair_indexes[exchange_name]
+
+
+def resolve_pair(exchange_name: str, base_symbol: str, quote_symbol: str):
+    """Return the market symbol for base/quote in whichever direction the exchange lists it, or None."""
+    base_upper, quote_upper = base_symbol.upper(), quote_symbol.upper()
+    markets = get_exchange(exchange_name).markets
+    for pair in (f"{base_upper}/{quote_upper}", f"{quote_upper}/{base_upper}"):
+        if pair in markets:
+            return pair
+    return None
+
+
+def clear_registry():
+    with _lock:
+        _exchanges.clear()
+        _pair_indexes.clear()
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from flowAnalysis.market_cache import new_async_exchange
+from flowAnalysis.trade_bars import RESOLUTIONS, rollup_bars
+from requestScheduler import ccxt_endpoint, get_scheduler
+
+OHLCV_CACHE_DIR = "OHLCV_CACHE"
+OHLCV_PAGE_LIMIT = 500
+OHLCV_MAX_REQUESTS = 200
+OHLCV_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+
+
+def choose_timeframe(start_ms: int, end_ms: int, max_requests: int = OHLCV_MAX_REQUESTS,
+                     page_limit: int = OHLCV_PAGE_LIMIT, supported=None) -> str:
+    """
+    Finest timeframe whose page count for [start_ms, end_ms) fits `max_requests`, among those the
+    exchange supports (its ccxt `timeframes`). Falls back to the coarsest one available.
+    """
+    candidates = [tf for tf in RESOLUTIONS if supported is None or tf in supported] or ["1d"]
+    for tf in candidates:
+        if -(-(end_ms - start_ms) // (RESOLUTIONS[tf] * page_limit)) <= max_requests:
+            return tf
+    return candidates[-1]
+
+
+# ──────────────────────────────────────────────────────────────
+# 💾 Completed-bar cache
+# ──────────────────────────────────────────────────────────────
+def _merge_spans(spans):
+    """Collapse overlapping or touching [start, end) ms spans."""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _subtract_spans(start, end, held):
+    """Parts of [start, end) not covered by the `held` spans."""
+    missing = []
+    cursor = start
+    for h_start, h_end in _merge_spans(held):
+        if h_end <= cursor:
+            continue
+        if h_start >= end:
+            break
+        if h_start > cursor:
+            missing.append((cursor, h_start))
+        cursor = max(cursor, h_end)
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+
+class BarCache:
+    """
+    On-disk Parquet cache of exchange OHLCV bars, one file per (exchange, symbol, timeframe).
+
+    Completed bars never change, so there is no TTL: a JSON manifest records which [start, end)
+    spans each file fully covers, and overlapping backfills only request what is missing. Bars
+    still forming at fetch time are returned but never written or marked as covered.
+    """
+
+    def __init__(self, cache_dir: str = OHLCV_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._lock = threading.RLock()
+        self._manifest_path = os.path.join(cache_dir, "manifest.json")
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, "r") as f:
+                self._manifest = json.load(f)
+        else:
+            self._manifest = {}
+
+    @staticmethod
+    def key(exchange_name: str, symbol: str, timeframe: str) -> str:
+        return f"{exchange_name}_{symbol.replace('/', '-').replace(':', '-')}_{timeframe}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def _save_manifest(self):
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._manifest, f, indent=2)
+        os.replace(tmp, self._manifest_path)
+
+    def missing_spans(self, key: str, start_ms: int, end_ms: int) -> list:
+        with self._lock:
+            held = self._manifest.get(key, {}).get("spans", [])
+            return _subtract_spans(start_ms, end_ms, held)
+
+    def read(self, key: str, start_ms: int, end_ms: int) -> np.ndarray:
+        """Cached bars with start_ms <= timestamp < end_ms as an (n, 6) float64 array."""
+        with self._lock:
+            path = self._path(key)
+            if key not in self._manifest or not os.path.exists(path):
+                return np.empty((0, len(OHLCV_COLUMNS)))
+            df = pd.read_parquet(path, filters=[("timestamp", ">=", start_ms), ("timestamp", "<", end_ms)])
+        return df[OHLCV_COLUMNS].to_numpy(dtype="float64")
+
+    def write(self, key: str, bars: np.ndarray, start_ms: int, end_ms: int, timeframe_ms: int):
+        """Merge fetched bars for [start_ms, end_ms) in, keeping only bars that have closed."""
+        complete_before = int(time.time() * 1000) // timeframe_ms * timeframe_ms
+        end_ms = min(end_ms, complete_before)
+        if end_ms <= start_ms:
+            return
+        bars = bars[(bars[:, 0] >= start_ms) & (bars[:, 0] < end_ms)]
+        new = pd.DataFrame(bars, columns=OHLCV_COLUMNS).astype({"timestamp": "int64"})
+
+        with self._lock:
+            path = self._path(key)
+            entry = self._manifest.get(key)
+            if entry and os.path.exists(path):
+                df = pd.concat([pd.read_parquet(path), new], ignore_index=True)
+                df = df.drop_duplicates(subset="timestamp", keep="last")
+            else:
+                entry = {"spans": []}
+                df = new
+            df = df.sort_values("timestamp").reset_index(drop=True)
+
+            tmp = path + ".tmp"
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, path)
+
+            entry["spans"] = _merge_spans(entry["spans"] + [[start_ms, end_ms]])
+            entry["rows"] = len(df)
+            self._manifest[key] = entry
+            self._save_manifest()
+
+
+# ──────────────────────────────────────────────────────────────
+# ⚡ Concurrent pagination
+# ──────────────────────────────────────────────────────────────
+async def _fetch_ohlcv_page(exchange, pair: str, timeframe: str, page_start: int, page_end: int,
+                            limit: int, semaphore: asyncio.Semaphore) -> list:
+    """Bars in [page_start, page_end); keeps paging if the exchange returns a short page mid-span."""
+    tf_ms = RESOLUTIONS[timeframe]
+    rows = []
+    since = page_start
+    while since < page_end:
+        async with semaphore:
+            batch = await get_scheduler().acall(ccxt_endpoint(exchange), exchange.fetch_ohlcv,
+                                                pair, timeframe=timeframe, since=since, limit=limit)
+        # Some exchanges ignore `since` past their history limit and return the latest bars instead
+        batch = [b for b in batch or [] if since <= b[0] < page_end]
+        if not batch:
+            break
+        rows.extend(batch)
+        since = batch[-1][0] + tf_ms
+    return rows
+
+
+async def fetch_ohlcv_range_async(exchange, pair: str, timeframe: str, start_ms: int, end_ms: int,
+                                  limit: int = OHLCV_PAGE_LIMIT, max_concurrency: int = 4):
+    """
+    All bars in [start_ms, end_ms) as an (n, 6) array sorted by time. The span is split into
+    page-sized sub-spans up front, so pages are requested concurrently rather than chained.
+    Returns (bars, errors) with errors as {(page_start, page_end): exception}.
+    """
+    step = RESOLUTIONS[timeframe] * limit
+    pages = [(s, min(s + step, end_ms)) for s in range(start_ms, end_ms, step)]
+    semaphore = asyncio.Semaphore(max_concurrency)
+    results = await asyncio.gather(
+        *(_fetch_ohlcv_page(exchange, pair, timeframe, s, e, limit, semaphore) for s, e in pages),
+        return_exceptions=True,
+    )
+
+    errors = {page: r for page, r in zip(pages, results) if isinstance(r, BaseException)}
+    rows = [row for r in results if not isinstance(r, BaseException) for row in r]
+    bars = np.asarray(rows, dtype="float64").reshape(-1, len(OHLCV_COLUMNS))
+    if len(bars):
+        order = np.argsort(bars[:, 0], kind="stable")
+        bars = bars[order]
+        bars = bars[np.r_[True, bars[1:, 0] != bars[:-1, 0]]]
+    return bars, errors
+
+
+async def backfill_ohlcv_async(exchange, exchange_name: str, pair: str, start_ms: int, end_ms: int,
+                               timeframe: str, cache: BarCache = None, limit: int = OHLCV_PAGE_LIMIT,
+                               max_concurrency: int = 4):
+    """Bars for [start_ms, end_ms) at `timeframe`, fetching only spans the cache doesn't hold."""
+    tf_ms = RESOLUTIONS[timeframe]
+    # Align to bar boundaries so cached spans line up across overlapping requests
+    start_ms = start_ms // tf_ms * tf_ms
+    end_ms = -(-end_ms // tf_ms) * tf_ms
+
+    key = BarCache.key(exchange_name, pair, timeframe)
+    gaps = cache.missing_spans(key, start_ms, end_ms) if cache is not None else [(start_ms, end_ms)]
+    fetched, errors = [], {}
+    for gap_start, gap_end in gaps:
+        bars, gap_errors = await fetch_ohlcv_range_async(exchange, pair, timeframe, gap_start, gap_end,
+                                                         limit, max_concurrency)
+        errors.update(gap_errors)
+        fetched.append(bars)
+        # Only cache a gap that came back whole; a failed page would otherwise be marked covered
+        if cache is not None and not gap_errors:
+            cache.write(key, bars, gap_start, gap_end, tf_ms)
+
+    parts = [cache.read(key, start_ms, end_ms)] if cache is not None else []
+    bars = np.concatenate(parts + fetched) if parts or fetched else np.empty((0, len(OHLCV_COLUMNS)))
+    if len(bars):
+        bars = bars[np.argsort(bars[:, 0], kind="stable")]
+        bars = bars[np.r_[True, bars[1:, 0] != bars[:-1, 0]]]
+    return bars, errors
+
+
+def backfill_ohlcv(exchange_name: str, pair: str, start_ms: int, end_ms: int, resolution: str = "1h",
+                   timeframe: str = None, max_requests: int = OHLCV_MAX_REQUESTS, max_concurrency: int = 4,
+                   cache_dir: str = OHLCV_CACHE_DIR, use_cache: bool = True, exchange=None) -> pd.DataFrame:
+    """
+    OHLCV bars for start_ms <= timestamp <= end_ms, paginated concurrently over the whole range.
+
+    Without an explicit `timeframe`, the finest one that fits `max_requests` pages is used; bars
+    finer than `resolution` are then rolled up to it, coarser ones are returned as they are.
+    `exchange` injects a ready-made async exchange (e.g. a local fake).
+    """
+    async def _run():
+        ex = exchange or new_async_exchange(exchange_name)
+        try:
+            supported = getattr(ex, "timeframes", None) or None
+            tf = timeframe or choose_timeframe(start_ms, end_ms + 1, max_requests, OHLCV_PAGE_LIMIT, supported)
+            bars, errors = await backfill_ohlcv_async(
+                ex, exchange_name, pair, start_ms, end_ms + 1, tf,
+                cache=BarCache(cache_dir) if use_cache else None, max_concurrency=max_concurrency,
+            )
+            return tf, bars, errors
+        finally:
+            if exchange is None:
+                await ex.close()
+
+    tf, bars, errors = asyncio.run(_run())
+    for (page_start, page_end), err in errors.items():
+        print(f"⚠️ OHLCV page {pd.to_datetime(page_start, unit='ms')} → "
+              f"{pd.to_datetime(page_end, unit='ms')} failed: {err}")
+
+    bars = bars[(bars[:, 0] >= start_ms) & (bars[:, 0] <= end_ms)]
+    df = pd.DataFrame(bars, columns=OHLCV_COLUMNS).astype({"timestamp": "int64"})
+    print(f"✅ Backfilled {len(df):,} {tf} bars")
+    if RESOLUTIONS[tf] < RESOLUTIONS[resolution]:
+        return rollup_bars(df, resolution)
+    df["datetime"] = pd.to_datetime(df["timestamp"], unit="ms")
+    return df
@@ -0,0 +1,168 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+RESOLUTIONS = {"1m": 60_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+               "1h": 3_600_000, "4h": 14_400_000, "1d": 86_400_000}
+
+BAR_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume", "quote_volume", "vwap",
+               "buy_volume", "sell_volume", "trades"]
+
+SIDE_CODES = {"buy": 1, "sell": -1}
+
+
+# ──────────────────────────────────────────────────────────────
+# 🧮 Trade arrays
+# ──────────────────────────────────────────────────────────────
+def trade_arrays(trades: list) -> dict:
+    """
+    Columnar view of ccxt trade dicts: int64 ms timestamps, float64 price / amount / cost and
+    int8 side codes (1 buy, -1 sell, 0 unknown). Missing costs are filled with price × amount.
+    """
+    n = len(trades)
+    ts = np.fromiter((t["timestamp"] for t in trades), dtype="int64", count=n)
+    price = np.fromiter((t["price"] for t in trades), dtype="float64", count=n)
+    amount = np.fromiter((t["amount"] for t in trades), dtype="float64", count=n)
+    cost = np.fromiter((np.nan if t.get("cost") is None else t["cost"] for t in trades), dtype="float64", count=n)
+    side = np.fromiter((SIDE_CODES.get(t.get("side"), 0) for t in trades), dtype="int8", count=n)
+    missing = np.isnan(cost)
+    cost[missing] = price[missing] * amount[missing]
+    return {"timestamp": ts, "price": price, "amount": amount, "cost": cost, "side": side}
+
+
+def _sorted(arrays: dict) -> dict:
+    ts = arrays["timestamp"]
+    if len(ts) < 2 or (ts[1:] >= ts[:-1]).all():
+        return arrays
+    # Stable sort keeps exchange order for trades sharing a millisecond, so open/close stay right
+    order = np.argsort(ts, kind="stable")
+    return {k: v[order] for k, v in arrays.items()}
+
+
+def window(arrays: dict, start_ms: int, end_ms: int) -> dict:
+    """Rows with start_ms <= timestamp <= end_ms, as slices (no copy) once the arrays are sorted."""
+    arrays = _sorted(arrays)
+    lo = np.searchsorted(arrays["timestamp"], start_ms, side="left")
+    hi = np.searchsorted(arrays["timestamp"], end_ms, side="right")
+    return {k: v[lo:hi] for k, v in arrays.items()}
+
+
+# ──────────────────────────────────────────────────────────────
+# 📊 Bar reduction
+# ──────────────────────────────────────────────────────────────
+def _segments(bucket: np.ndarray):
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(bucket)]
+    return starts, ends
+
+
+def _bars_from_trades(arrays: dict, ms: int) -> dict:
+    ts, price, amount, cost, side = (arrays[k] for k in ("timestamp", "price", "amount", "cost", "side"))
+    bucket = ts // ms
+    starts, ends = _segments(bucket)
+    return {
+        "timestamp": bucket[starts] * ms,
+        "open": price[starts],
+        "high": np.maximum.reduceat(price, starts),
+        "low": np.minimum.reduceat(price, starts),
+        "close": price[ends - 1],
+        "volume": np.add.reduceat(amount, starts),
+        "quote_volume": np.add.reduceat(cost, starts),
+        "buy_volume": np.add.reduceat(np.where(side > 0, amount, 0.0), starts),
+        "sell_volume": np.add.reduceat(np.where(side < 0, amount, 0.0), starts),
+        "trades": (ends - starts).astype("int64"),
+    }
+
+
+def _rollup(bars: dict, ms: int) -> dict:
+    """Coarser bars from finer ones: first open, last close, extreme high/low, summed volumes."""
+    bucket = bars["timestamp"] // ms
+    starts, ends = _segments(bucket)
+    out = {
+        "timestamp": bucket[starts] * ms,
+        "open": bars["open"][starts],
+        "high": np.maximum.reduceat(bars["high"], starts),
+        "low": np.minimum.reduceat(bars["low"], starts),
+        "close": bars["close"][ends - 1],
+    }
+    for col in ("volume", "quote_volume", "buy_volume", "sell_volume", "trades"):
+        if col in bars:
+            out[col] = np.add.reduceat(bars[col], starts)
+    return out
+
+
+def _frame(bars: dict) -> pd.DataFrame:
+    volume = bars["volume"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vwap = np.where(volume > 0, bars["quote_volume"] / volume, np.nan)
+    df = pd.DataFrame({**bars, "vwap": vwap}, columns=BAR_COLUMNS)
+    df["datetime"] = pd.to_datetime(df["timestamp"], unit="ms")
+    return df
+
+
+def aggregate_trades(arrays: dict, resolutions=("1m", "1h", "1d")) -> dict:
+    """
+    {resolution: bars DataFrame} with OHLCV, quote volume, VWAP, buy/sell base volume and trade
+    counts. Trades are sorted at most once and reduced to the finest resolution in a single pass
+    over the arrays; coarser resolutions are rolled up from the finer bars, not the trades.
+    """
+    order = sorted(resolutions, key=lambda r: RESOLUTIONS[r])
+    if len(arrays["timestamp"]) == 0:
+        return {r: pd.DataFrame(columns=BAR_COLUMNS + ["datetime"]) for r in order}
+
+    arrays = _sorted(arrays)
+    out = {}
+    bars = None
+    for res in order:
+        ms = RESOLUTIONS[res]
+        bars = _bars_from_trades(arrays, ms) if bars is None else _rollup(bars, ms)
+        out[res] = _frame(bars)
+    return out
+
+
+def rollup_bars(bars: pd.DataFrame, resolution: str) -> pd.DataFrame:
+    """Re-bucket sorted bars (e.g. exchange OHLCV at a finer timeframe) to `resolution`."""
+    if bars.empty:
+        return bars
+    cols = [c for c in BAR_COLUMNS if c in bars.columns and c != "vwap"]
+    out = _rollup({c: bars[c].to_numpy() for c in cols}, RESOLUTIONS[resolution])
+    if "quote_volume" in out:
+        return _frame(out)
+    df = pd.DataFrame(out, columns=cols)
+    df["datetime"] = pd.to_datetime(df["timestamp"], unit="ms")
+    return df
+
+
+def trades_to_bars(trades: list, resolution: str = "1h") -> pd.DataFrame:
+    return aggregate_trades(trade_arrays(trades), (resolution,))[resolution]
+
+
+# ──────────────────────────────────────────────────────────────
+# 📈 Summary
+# ──────────────────────────────────────────────────────────────
+def bars_summary(bars: pd.DataFrame, exchange_name: str, pair: str, adjusted_pair: str,
+                 start_dt: datetime, end_dt: datetime) -> dict:
+    """
+    The summary dict fetch_fiat_stable_trades returns for either path. usdt_volume is base volume
+    and fiat_volume quote volume, as the OHLCV path has always reported them. Exchange OHLCV bars
+    carry no quote volume, so it is estimated there as volume × close.
+    """
+    volume = bars["volume"].sum()
+    if "quote_volume" in bars.columns:
+        quote_volume = bars["quote_volume"].sum()
+        trades = int(bars["trades"].sum())
+    else:
+        quote_volume = (bars["volume"] * bars["close"]).sum()
+        trades = len(bars)
+    return {
+        "exchange": exchange_name,
+        "symbol": pair,                 # raw CCXT pair
+        "adjusted_pair": adjusted_pair, # use actual pair for correct direction
+        "usdt_volume": round(volume, 2),
+        "fiat_volume": round(quote_volume, 2),
+        "vwap": round(quote_volume / volume, 4) if volume else None,
+        "trades": trades,
+        "start": start_dt,
+        "end": end_dt,
+    }
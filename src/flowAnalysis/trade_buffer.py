@@ -0,0 +1,208 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from flowAnalysis.trade_bars import SIDE_CODES
+
+TRADE_BUFFER_SPILL_ROWS = 1_000_000
+TRADE_BUFFER_INITIAL_ROWS = 4_096
+ID_WIDTH = 16
+
+# Fixed-width columns; ids are kept as bytes and widened in place when a longer one arrives
+NUMERIC_COLUMNS = {"timestamp": "int64", "side": "int8", "price": "float64", "amount": "float64", "cost": "float64"}
+COLUMNS = ["timestamp", "id", "side", "price", "amount", "cost"]
+
+
+def trades_frame(arrays: dict) -> pd.DataFrame:
+    """Export-ready frame of buffer columns (ids decoded back to strings, side back to buy/sell)."""
+    side = np.array([None, "buy", "sell"], dtype=object)[np.asarray(arrays["side"]) % 3]
+    return pd.DataFrame({
+        "date": np.asarray(arrays["timestamp"]),
+        "id": pd.Series(np.asarray(arrays["id"])).str.decode("utf-8"),
+        "side": side,
+        "price": np.asarray(arrays["price"]),
+        "amount": np.asarray(arrays["amount"]),
+        "cost": np.asarray(arrays["cost"]),
+    })
+
+
+# ──────────────────────────────────────────────────────────────
+# 🧱 Columnar trade buffer
+# ──────────────────────────────────────────────────────────────
+class TradeBuffer:
+    """
+    Append-only trade store holding only timestamp, id, side, price, amount and cost in typed
+    NumPy columns (~40 bytes a trade instead of a ccxt dict with nested info/fee).
+
+    Rows fill an in-memory block that starts small and doubles up to `spill_rows`, so short pulls
+    (and the per-shard buffers of a sharded one) never hold a full block. A full block is written
+    to `spill_dir` as one .npy file per column and reused, so memory stays bounded however long
+    the pull.
+    `arrays()` exposes everything as contiguous columns without copying into RAM: slices of the
+    live block when nothing spilled, otherwise memory-mapped files consolidated on disk.
+    """
+
+    def __init__(self, spill_rows: int = TRADE_BUFFER_SPILL_ROWS, spill_dir: str = None):
+        self.spill_rows = spill_rows
+        self._spill_dir = spill_dir
+        self._owns_dir = spill_dir is None
+        self._block = self._new_block(min(spill_rows, TRADE_BUFFER_INITIAL_ROWS))
+        self._n = 0
+        self._spilled = []   # [(directory, rows)]
+        self._rows = 0
+        self._view = None
+
+    @staticmethod
+    def _new_block(rows: int, id_width: int = ID_WIDTH) -> dict:
+        block = {col: np.empty(rows, dtype=dtype) for col, dtype in NUMERIC_COLUMNS.items()}
+        block["id"] = np.empty(rows, dtype=f"S{id_width}")
+        return block
+
+    def __len__(self):
+        return self._rows
+
+    @property
+    def spilled_chunks(self) -> int:
+        return len(self._spilled)
+
+    @property
+    def spill_dir(self) -> str:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="trade_buffer_")
+        return self._spill_dir
+
+    # ── appends ───────────────────────────────────────────────
+    def append(self, trades: list):
+        """Copy the needed fields out of ccxt trade dicts; the dicts can be dropped afterwards."""
+        start = 0
+        while start < len(trades):
+            take = min(len(trades) - start, self._room())
+            self._fill(trades[start:start + take])
+            start += take
+            if self._n == self.spill_rows:
+                self._spill()
+
+    def append_arrays(self, arrays: dict):
+        """Append columns (e.g. another buffer's arrays()) chunk by chunk, spilling as needed."""
+        total = len(arrays["timestamp"])
+        start = 0
+        while start < total:
+            take = min(total - start, self._room())
+            sl = slice(self._n, self._n + take)
+            for col in NUMERIC_COLUMNS:
+                self._block[col][sl] = arrays[col][start:start + take]
+            ids = np.asarray(arrays["id"][start:start + take], dtype=bytes)
+            self._widen_ids(ids.dtype.itemsize)
+            self._block["id"][sl] = ids
+            self._n += take
+            self._rows += take
+            self._view = None
+            start += take
+            if self._n == self.spill_rows:
+                self._spill()
+
+    def _room(self) -> int:
+        """Free rows in the live block, doubling it first when it is full but below `spill_rows`."""
+        capacity = len(self._block["timestamp"])
+        if self._n == capacity and capacity < self.spill_rows:
+            capacity = min(capacity * 2, self.spill_rows)
+            block = self._new_block(capacity, self._block["id"].dtype.itemsize)
+            for col in COLUMNS:
+                block[col][:self._n] = self._block[col][:self._n]
+            self._block = block
+        return capacity - self._n
+
+    def _fill(self, trades: list):
+        n, sl = len(trades), slice(self._n, self._n + len(trades))
+        block = self._block
+        block["timestamp"][sl] = np.fromiter((t["timestamp"] for t in trades), dtype="int64", count=n)
+        block["price"][sl] = np.fromiter((t["price"] for t in trades), dtype="float64", count=n)
+        block["amount"][sl] = np.fromiter((t["amount"] for t in trades), dtype="float64", count=n)
+        block["cost"][sl] = np.fromiter((np.nan if t.get("cost") is None else t["cost"] for t in trades),
+                                        dtype="float64", count=n)
+        block["side"][sl] = np.fromiter((SIDE_CODES.get(t.get("side"), 0) for t in trades), dtype="int8", count=n)
+        ids = np.array([b"" if t.get("id") is None else str(t["id"]).encode() for t in trades], dtype=bytes)
+        self._widen_ids(ids.dtype.itemsize)
+        block["id"][sl] = ids
+
+        cost, price, amount = block["cost"][sl], block["price"][sl], block["amount"][sl]
+        missing = np.isnan(cost)
+        cost[missing] = price[missing] * amount[missing]
+
+        self._n += n
+        self._rows += n
+        self._view = None
+
+    def _widen_ids(self, width: int):
+        if width > self._block["id"].dtype.itemsize:
+            self._block["id"] = self._block["id"].astype(f"S{width}")
+
+    # ── spilling ──────────────────────────────────────────────
+    def _spill(self):
+        if not self._n:
+            return
+        chunk_dir = os.path.join(self.spill_dir, f"chunk_{len(self._spilled):05d}")
+        os.makedirs(chunk_dir, exist_ok=True)
+        for col in COLUMNS:
+            np.save(os.path.join(chunk_dir, f"{col}.npy"), self._block[col][:self._n])
+        self._spilled.append((chunk_dir, self._n))
+        self._n = 0
+
+    def _load_chunk(self, chunk_dir: str) -> dict:
+        return {col: np.load(os.path.join(chunk_dir, f"{col}.npy"), mmap_mode="r") for col in COLUMNS}
+
+    # ── views ─────────────────────────────────────────────────
+    def chunks(self):
+        """Yield each spilled chunk (memory-mapped) and then the live block (sliced), in append order."""
+        for chunk_dir, _ in self._spilled:
+            yield self._load_chunk(chunk_dir)
+        if self._n:
+            yield {col: self._block[col][:self._n] for col in COLUMNS}
+
+    def arrays(self) -> dict:
+        """
+        All rows as one contiguous column dict. Nothing is copied while everything fits in the live
+        block; once chunks have spilled, they and the live rows are consolidated into memory-mapped
+        .npy files (once per batch of appends), so RAM use stays at the page cache's discretion.
+        """
+        if not self._spilled:
+            return {col: self._block[col][:self._n] for col in COLUMNS}
+        if self._view is not None:
+            return self._view
+
+        out_dir = os.path.join(self.spill_dir, "consolidated")
+        os.makedirs(out_dir, exist_ok=True)
+        chunks = list(self.chunks())
+        id_width = max(c["id"].dtype.itemsize for c in chunks)
+        view = {}
+        for col in COLUMNS:
+            dtype = f"S{id_width}" if col == "id" else NUMERIC_COLUMNS[col]
+            out = np.lib.format.open_memmap(os.path.join(out_dir, f"{col}.npy"), mode="w+",
+                                            dtype=dtype, shape=(self._rows,))
+            pos = 0
+            for chunk in chunks:
+                out[pos:pos + len(chunk[col])] = chunk[col]
+                pos += len(chunk[col])
+            out.flush()
+            view[col] = out
+        self._view = view
+        return view
+
+    def to_frame(self) -> pd.DataFrame:
+        return trades_frame(self.arrays())
+
+    # ── lifecycle ─────────────────────────────────────────────
+    def close(self):
+        self._view = None
+        if self._owns_dir and self._spill_dir and os.path.isdir(self._spill_dir):
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+        self._spilled = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
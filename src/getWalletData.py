@@ -1,17 +1,12 @@
-from shroomdk import ShroomDK
-import pandas as pd
-import time
-from datetime import timedelta
 import os
-from google.cloud import bigquery
 
-# Initialize Flipside + BigQuery
-sdk = ShroomDK("fbd8fab9-d866-48aa-a895-ce9fe5ecaaa5")
+from dotenv import load_dotenv
 
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.path.abspath(
-    os.path.join(os.path.dirname(__file__), "..", "credentials.json")
-)
-client = bigquery.Client()
+from walletIngestion import ingest_wallet_labels
+
+load_dotenv()
+
+FLIPSIDE_API_KEY = os.getenv("FLIPSIDE_API_KEY")
 
 # BigQuery config
 PROJECT = "macropipeline"
@@ -23,85 +18,74 @@ STAGING_TABLE_ID = f"{PROJECT}.{DATASET}.{STAGING_TABLE}"
 
 # Batch config
 BATCH_SIZE = 100_000
-OFFSET = 0
 MAX_ROWS = 7_000_000
-
-# SQL query: Binance active in 2022–2023 only
-QUERY_TEMPLATE = """
-WITH active_labeled AS (
-  SELECT
-    LOWER(l.address) AS address,
-    MIN(LOWER(l.address_name)) AS entity,
-    'CEX' AS label,
-    ROW_NUMBER() OVER (ORDER BY LOWER(l.address)) AS rownum
-  FROM ethereum.core.dim_labels l
-  JOIN ethereum.core.fact_transactions tx
-    ON LOWER(tx.to_address) = LOWER(l.address)
-  WHERE (
-    LOWER(l.address_name) = 'binance deposit_wallet' OR
-    LOWER(l.address_name) = 'binance hot_wallet' OR
-    LOWER(l.address_name) = 'binance us deposit funder 1' OR
-    LOWER(l.address_name) LIKE 'binance %' OR
-    LOWER(l.address_name) LIKE 'binance-%'
-  )
-  AND tx.block_timestamp BETWEEN '2022-01-01' AND '2024-12-31'
-  GROUP BY l.address
-)
-SELECT address, entity, label
-FROM active_labeled
-WHERE rownum > {offset} AND rownum <= {offset} + {limit}
-"""
-
-# Ingestion loop
-print("🚀 Starting Binance timeline-filtered upload (2022–2023)...\n")
-start_time = time.time()
-batches_completed = 0
-total_uploaded = 0
-
-while OFFSET < MAX_ROWS:
-    sql = QUERY_TEMPLATE.format(limit=BATCH_SIZE, offset=OFFSET)
-
-    try:
-        response = sdk.query(sql)
-        df = pd.DataFrame(response.records)
-    except Exception as e:
-        print(f"❌ Query failed at offset {OFFSET}: {e}")
-        break
-
-    if df.empty:
-        print(f"✅ All data fetched. No more results after offset {OFFSET}.")
-        break
-
-    df = df[["address", "entity", "label"]]
-    print(f"🧮 Batch {batches_completed}: fetched {len(df):,} rows")
-
-    try:
-        # Upload to staging
-        job = client.load_table_from_dataframe(df, STAGING_TABLE_ID)
-        job.result()
-        print(f"📥 Uploaded to staging table ({len(df):,} rows)")
-
-        # Deduplicated insert into final table
-        insert_sql = f"""
-        INSERT INTO `{FINAL_TABLE_ID}` (address, entity, label)
-        SELECT address, entity, label
-        FROM `{STAGING_TABLE_ID}`
-        WHERE LOWER(address) NOT IN (
-          SELECT LOWER(address) FROM `{FINAL_TABLE_ID}`
-        )
-        """
-        client.query(insert_sql).result()
-        print("✅ Deduplicated insert completed.")
-
-        total_uploaded += len(df)
-
-    except Exception as err:
-        print(f"❌ Upload or insert failed at offset {OFFSET}: {err}")
-        break
-
-    batches_completed += 1
-    OFFSET += BATCH_SIZE
-
-# Summary
-elapsed = timedelta(seconds=int(time.time() - start_time))
-print(f"\n🎉 Done! Uploaded {total_uploaded:,} timeline-filtered Binance rows across {batches_completed} batches in {elapsed}.")
+MERGE_EVERY = 0     # 0 = a single MERGE once everything is staged
+MAX_IN_FLIGHT = 2   # fetched pages allowed to wait for upload
+
+# Binance active in 2022–2023 only
+BINANCE_PATTERNS = [
+    "binance deposit_wallet",
+    "binance hot_wallet",
+    "binance us deposit funder 1",
+    "binance %",
+    "binance-%",
+]
+
+
+def run_wallet_ingestion(patterns=BINANCE_PATTERNS, start="2022-01-01", end="2024-12-31",
+                         final_table_id=FINAL_TABLE_ID, staging_table_id=STAGING_TABLE_ID,
+                         batch_size=BATCH_SIZE, max_rows=MAX_ROWS, merge_every=MERGE_EVERY,
+                         max_in_flight=MAX_IN_FLIGHT, resume=False, sdk=None, sink=None):
+    """Ingest wallets whose Flipside label matches `patterns` (exact names or LIKE patterns with %)."""
+    if sdk is None:
+        if not FLIPSIDE_API_KEY:
+            raise RuntimeError("❌ FLIPSIDE_API_KEY is not set; add it to the environment or .env")
+        from shroomdk import ShroomDK
+        sdk = ShroomDK(FLIPSIDE_API_KEY)
+
+    print(f"🚀 Starting wallet upload for {', '.join(patterns)} ({start} → {end})...\n")
+    return ingest_wallet_labels(
+        sdk,
+        patterns,
+        final_table_id,
+        staging_table_id,
+        sink=sink,
+        start=start,
+        end=end,
+        batch_size=batch_size,
+        max_rows=max_rows,
+        merge_every=merge_every,
+        resume=resume,
+        max_in_flight=max_in_flight,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.path.abspath(
+        os.path.join(os.path.dirname(__file__), "..", "credentials.json")
+    )
+
+    parser = argparse.ArgumentParser(description="Flipside → BigQuery CEX wallet ingestion")
+    parser.add_argument("--pattern", action="append", dest="patterns",
+                        help="Exchange label name or LIKE pattern (repeatable), e.g. 'okx %%'. Default: Binance")
+    parser.add_argument("--start", default="2022-01-01")
+    parser.add_argument("--end", default="2024-12-31")
+    parser.add_argument("--max-rows", type=int, default=MAX_ROWS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--merge-every", type=int, default=MERGE_EVERY, help="MERGE every N batches (0 = once at the end)")
+    parser.add_argument("--in-flight", type=int, default=MAX_IN_FLIGHT, help="Fetched batches allowed to wait for upload")
+    parser.add_argument("--resume", action="store_true", help="Continue after the highest address already staged")
+    args = parser.parse_args()
+
+    run_wallet_ingestion(
+        patterns=args.patterns or BINANCE_PATTERNS,
+        start=args.start,
+        end=args.end,
+        batch_size=args.batch_size,
+        max_rows=args.max_rows,
+        merge_every=args.merge_every,
+        max_in_flight=args.in_flight,
+        resume=args.resume,
+    )
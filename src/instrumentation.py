@@ -0,0 +1,463 @@
+# src/instrumentation.py
+#
+# Stage-level metrics for pipeline runs: wall time, rows in/out, bytes and peak RSS of every
+# fetch / transform / merge / export / upload stage, emitted as structured records to the audit
+# table of the run's dataset and, optionally, a local JSON-lines file. Individual stages can be
+# profiled on demand with cProfile or a low-overhead stack sampler.
+
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+METRICS_PATH = os.getenv("PIPELINE_METRICS_PATH")        # JSON-lines file; unset = audit table only
+PROFILE_STAGES = os.getenv("PIPELINE_PROFILE", "")        # e.g. "fetch,merge" or "all"
+PROFILE_MODE = os.getenv("PIPELINE_PROFILE_MODE", "cprofile")   # cprofile / sample
+PROFILE_DIR = os.getenv("PIPELINE_PROFILE_DIR", "PROFILES")
+
+RSS_SAMPLE_SECONDS = 0.05
+PROFILE_SAMPLE_SECONDS = 0.005
+HOTSPOTS = 8
+
+_config = {"metrics_path": METRICS_PATH, "audit": True,
+           "profile": {s.strip() for s in PROFILE_STAGES.split(",") if s.strip()}, "profile_mode": PROFILE_MODE,
+           "profile_dir": PROFILE_DIR}
+_write_lock = threading.Lock()
+
+
+def configure(metrics_path=None, audit=None, profile=None, profile_mode=None, profile_dir=None):
+    """
+    Change where records and profiles go and what is profiled for the rest of the process.
+    `profile` is a set (or comma-separated string) of stage names, "all" for every stage, or ""
+    to turn profiling off.
+    """
+    if metrics_path is not None:
+        _config["metrics_path"] = metrics_path or None
+    if audit is not None:
+        _config["audit"] = audit
+    if profile is not None:
+        _config["profile"] = {s.strip() for s in profile.split(",") if s.strip()} if isinstance(profile, str) else set(profile)
+    if profile_mode is not None:
+        if profile_mode not in ("cprofile", "sample"):
+            raise ValueError(f"❌ Unknown profile mode '{profile_mode}' (expected cprofile or sample)")
+        _config["profile_mode"] = profile_mode
+    if profile_dir is not None:
+        _config["profile_dir"] = profile_dir
+
+
+# ──────────────────────────────────────────────────────────────
+# 🧠 Memory
+# ──────────────────────────────────────────────────────────────
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _max_rss_bytes():
+    """Process-wide RSS high-water mark (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def rss_bytes():
+    """Current resident set size; falls back to the high-water mark where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return _max_rss_bytes()
+
+
+class _RssMonitor:
+    """One daemon thread sampling RSS for every open stage, so a stage's peak is seen while it runs."""
+
+    def __init__(self, interval=RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self._stages = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, stage):
+        with self._lock:
+            self._stages.add(stage)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rss-monitor", daemon=True)
+                self._thread.start()
+
+    def unwatch(self, stage):
+        with self._lock:
+            self._stages.discard(stage)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                stages = list(self._stages)
+            if stages:
+                rss = rss_bytes()
+                for s in stages:
+                    s._peak_rss = max(s._peak_rss, rss)
+
+
+_rss_monitor = _RssMonitor()
+
+
+# ──────────────────────────────────────────────────────────────
+# 🔬 Profiling
+# ──────────────────────────────────────────────────────────────
+class _StackSampler:
+    """
+    Sampling profiler: every `interval` seconds, the innermost frame of every other thread is
+    counted, and its whole stack is kept in collapsed (flame graph) form. Unlike cProfile it sees
+    worker threads and costs almost nothing when stacks are shallow.
+    """
+
+    def __init__(self, interval=PROFILE_SAMPLE_SECONDS):
+        self.interval = interval
+        self.samples = 0
+        self.leaves = Counter()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        skip = {threading.get_ident(), _rss_monitor._thread.ident if _rss_monitor._thread else None}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident in skip:
+                    continue
+                self.samples += 1
+                code = frame.f_code
+                self.leaves[f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}"] += 1
+                stack = []
+                while frame is not None:
+                    stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def hotspots(self, n=HOTSPOTS):
+        return [f"{name} ({count / self.samples:.0%})" for name, count in self.leaves.most_common(n)] if self.samples else []
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+_profiling = threading.local()   # cProfile allows one active profiler per thread
+_sampling = threading.Lock()     # one stack sampler at a time; it already sees every thread
+
+
+def _should_profile(name, override):
+    if override is not None:
+        return bool(override)
+    wanted = _config["profile"]
+    return "all" in wanted or name in wanted
+
+
+def _profile_path(stage, ext):
+    profile_dir = _config["profile_dir"]
+    os.makedirs(profile_dir, exist_ok=True)
+    return os.path.join(profile_dir, f"{stage.run_id or 'adhoc'}_{stage.pipeline}.{stage.name}_{stage.seq}.{ext}")
+
+
+@contextmanager
+def _profiled(stage, mode):
+    if mode == "sample":
+        if not _sampling.acquire(blocking=False):
+            yield   # an enclosing or concurrent stage is already being sampled
+            return
+        sampler = _StackSampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            _sampling.release()
+            path = _profile_path(stage, "folded")
+            sampler.dump(path)
+            stage.details.update(profile=path, hotspots=sampler.hotspots(), samples=sampler.samples)
+        return
+
+    if getattr(_profiling, "active", False):
+        yield   # an enclosing stage is already being profiled on this thread
+        return
+    profiler = cProfile.Profile()
+    _profiling.active = True
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _profiling.active = False
+        path = _profile_path(stage, "prof")
+        profiler.dump_stats(path)
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        own = os.path.abspath(__file__)
+        hot = sorted(((k, v) for k, v in stats.stats.items() if os.path.abspath(k[0]) != own),
+                     key=lambda kv: kv[1][3], reverse=True)[:HOTSPOTS]
+        stage.details.update(profile=path, hotspots=[
+            f"{os.path.basename(f)}:{line} {fn} ({cum:.2f}s)" for (f, line, fn), (_, _, _, cum, _) in hot
+        ])
+
+
+# ──────────────────────────────────────────────────────────────
+# 📏 Stages & runs
+# ──────────────────────────────────────────────────────────────
+def describe(value):
+    """(rows, bytes) of a stage's output: DataFrames, UploadResults, (df, summary) pairs, sized objects or row counts."""
+    if value is None:
+        return None, None
+    if hasattr(value, "rows_loaded"):   # bigQueryUtils.UploadResult
+        return value.rows_loaded, value.bytes_loaded
+    if hasattr(value, "memory_usage") and hasattr(value, "columns"):
+        return len(value), int(value.memory_usage(index=True).sum())
+    if isinstance(value, tuple) and value:
+        return describe(value[0])
+    if isinstance(value, bool):
+        return None, None
+    if isinstance(value, int):
+        return value, None
+    if hasattr(value, "__len__"):
+        return len(value), None
+    return None, None
+
+
+class Stage:
+    """One measured stage; fill in rows/bytes with `set()` or `output()` while it runs."""
+
+    def __init__(self, name, run=None, table=None, rows_in=None, details=None):
+        self.name = name
+        self.run = run
+        self.pipeline = run.pipeline if run else "adhoc"
+        self.run_id = run.run_id if run else None
+        self.seq = run._next_seq() if run else 0
+        self.table = table
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.bytes = None
+        self.details = dict(details or {})
+        self.status = "success"
+        self.error = None
+        self.seconds = None
+        self._peak_rss = 0
+
+    def set(self, rows_in=None, rows_out=None, bytes=None, **details):
+        if rows_in is not None:
+            self.rows_in = rows_in
+        if rows_out is not None:
+            self.rows_out = rows_out
+        if bytes is not None:
+            self.bytes = bytes
+        self.details.update(details)
+        return self
+
+    def output(self, value):
+        """Take rows_out / bytes from the stage's result and hand the result back."""
+        rows, nbytes = describe(value)
+        self.set(rows_out=rows, bytes=nbytes)
+        return value
+
+    @property
+    def peak_rss_mb(self):
+        return round(self._peak_rss / 1024 ** 2, 1)
+
+    def record(self) -> dict:
+        run = self.run
+        return {
+            "project_id": run.project_id if run else None,
+            "dataset_id": run.dataset_id if run else None,
+            "table_name": self.table,
+            "start_date": str(run.start_date) if run and run.start_date is not None else None,
+            "end_date": str(run.end_date) if run and run.end_date is not None else None,
+            "row_count": self.rows_out,
+            "status": self.status,
+            "error_message": self.error,
+            "load_time": datetime.now(timezone.utc),
+            "run_id": self.run_id,
+            "pipeline": self.pipeline,
+            "stage": self.name,
+            "seconds": round(self.seconds, 3) if self.seconds is not None else None,
+            "rows_in": self.rows_in,
+            "bytes": self.bytes,
+            "peak_rss_mb": self.peak_rss_mb,
+            "details": json.dumps(self.details, default=str) if self.details else None,
+        }
+
+
+class PipelineRun:
+    """A pipeline invocation; stages opened while it is active are tagged with its run_id."""
+
+    def __init__(self, pipeline, project_id=None, dataset_id=None, start_date=None, end_date=None, **params):
+        self.pipeline = pipeline
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.start_date = start_date
+        self.end_date = end_date
+        self.params = params
+        self.run_id = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}_{uuid.uuid4().hex[:8]}"
+        self.stages = []   # finished stage records, in completion order
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _next_seq(self):
+        with self._lock:
+            self._seq += 1
+            return self._seq
+
+
+_current_run = contextvars.ContextVar("pipeline_run", default=None)
+
+
+def current_run():
+    return _current_run.get()
+
+
+def current_run_id():
+    run = current_run()
+    return run.run_id if run else None
+
+
+def in_run_context(fn):
+    """
+    Wrap `fn` for a worker pool so it runs in a copy of the caller's context: worker threads don't
+    inherit ContextVars, and without it their stages and audit rows lose the current run.
+    """
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def inner(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so every call gets its own copy
+        return ctx.copy().run(fn, *args, **kwargs)
+    return inner
+
+
+def _emit(stage):
+    rec = stage.record()
+    if stage.run is not None:
+        with stage.run._lock:
+            stage.run.stages.append(rec)
+
+    path = _config["metrics_path"]
+    if path:
+        with _write_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "a") as f:
+                f.write(json.dumps(rec, default=str) + "\n")
+
+    if _config["audit"] and stage.run is not None and stage.run.dataset_id:
+        # Imported here: bigQueryUtils stamps its own audit rows with the current run id
+        import bigQueryUtils
+        try:
+            bigQueryUtils._sink().audit(stage.run.project_id, stage.run.dataset_id, rec)
+        except Exception as e:
+            print(f"⚠️ Could not queue metrics for stage {stage.name}: {e}")
+
+
+@contextmanager
+def stage(name, table=None, rows_in=None, profile=None, **details):
+    """
+    Measure the enclosed block as stage `name` of the current run:
+
+        with stage("fetch", rows_in=len(series_ids)) as st:
+            df = ...
+            st.output(df)
+
+    Wall time, peak RSS and the outcome are always recorded; an exception marks the stage
+    failed and is re-raised. `profile` forces profiling on or off for this stage.
+    """
+    st = Stage(name, current_run(), table=table, rows_in=rows_in, details=details)
+    st._peak_rss = rss_bytes()
+    max_rss_before = _max_rss_bytes()
+    _rss_monitor.watch(st)
+    t0 = time.perf_counter()
+    try:
+        if _should_profile(name, profile):
+            with _profiled(st, _config["profile_mode"]):
+                yield st
+        else:
+            yield st
+    except BaseException as e:
+        st.status = "failed"
+        st.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        st.seconds = time.perf_counter() - t0
+        _rss_monitor.unwatch(st)
+        # A new process-wide high-water mark was set inside this stage: that is its exact peak
+        max_rss_after = _max_rss_bytes()
+        st._peak_rss = max(st._peak_rss, rss_bytes(), max_rss_after if max_rss_after > max_rss_before else 0)
+        _emit(st)
+
+
+def instrumented(name, table=None, rows_in=None):
+    """
+    Decorator form of `stage`: the return value becomes rows_out / bytes, and `rows_in`, if
+    given, is called with the function's arguments (e.g. `rows_in=lambda df, *a, **k: len(df)`).
+    """
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with stage(name, table=table, rows_in=rows_in(*args, **kwargs) if rows_in else None) as st:
+                return st.output(fn(*args, **kwargs))
+        return inner
+    return wrap
+
+
+@contextmanager
+def pipeline_run(pipeline, project_id=None, dataset_id=None, start_date=None, end_date=None, report=True, **params):
+    """
+    Scope a pipeline invocation: stages inside share its run_id and their records go to
+    `<dataset_id>.load_audit_log` through the active warehouse sink. Prints a stage report and
+    flushes the audit log when the run ends.
+    """
+    run = PipelineRun(pipeline, project_id, dataset_id, start_date, end_date, **params)
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+        if report:
+            print_run_report(run)
+        if _config["audit"] and dataset_id:
+            import bigQueryUtils
+            bigQueryUtils.flush_audit_log()
+
+
+def print_run_report(run):
+    """Per-stage totals of a run; nested stages count toward their parents too."""
+    if not run.stages:
+        return
+    totals = {}
+    for rec in run.stages:
+        t = totals.setdefault(rec["stage"], {"count": 0, "seconds": 0.0, "rows_in": 0, "rows_out": 0,
+                                             "bytes": 0, "peak": 0.0, "failed": 0})
+        t["count"] += 1
+        t["seconds"] += rec["seconds"] or 0
+        t["rows_in"] += rec["rows_in"] or 0
+        t["rows_out"] += rec["row_count"] or 0
+        t["bytes"] += rec["bytes"] or 0
+        t["peak"] = max(t["peak"], rec["peak_rss_mb"] or 0)
+        t["failed"] += rec["status"] != "success"
+
+    print(f"\n⏱️ {run.pipeline} run {run.run_id}:")
+    for name, t in totals.items():
+        flag = f"  ❌ {t['failed']} failed" if t["failed"] else ""
+        print(f"   {name:<10} x{t['count']:<4} {t['seconds']:>8.2f}s  {t['rows_in']:>12,} in  {t['rows_out']:>12,} out  "
+              f"{t['bytes'] / 1e6:>9,.1f} MB  peak RSS {t['peak']:>8,.0f} MB{flag}")
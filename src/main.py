@@ -4,10 +4,15 @@ import os
 from datetime import datetime, timedelta
 
 from treasuryData.pipeline import merge_yield_series_incremental
+from requestScheduler import get_scheduler
+from treasuryData.cache import ObservationCache
 import bigQueryUtils
+from instrumentation import pipeline_run, stage
 from treasuryData.config import (
     SERIES_IDS, SPREADS, GOOGLE_CLOUD_PROJECT,
-    BIGQUERY_DATASET, FRED_API_KEY
+    BIGQUERY_DATASET, FRED_API_KEY,
+    FRED_MAX_WORKERS, FRED_MAX_REQUESTS_PER_MINUTE,
+    CACHE_ENABLED, CACHE_DIR, CACHE_TTL_DAYS, CACHE_MAX_BYTES
 )
 
 # Set up Google credentials
@@ -23,56 +28,98 @@ LOG_TABLE = "audit_log"
 
 # --- Macro Data Logic ---
 def run_macro_pipeline():
-    latest_date = bigQueryUtils.get_latest_date_from_bq(
-        GOOGLE_CLOUD_PROJECT, BIGQUERY_DATASET, TABLE_NAME
-    )
-    start_date = (latest_date + timedelta(days=1)).date() if latest_date else datetime.strptime("1968-01-01", "%Y-%m-%d").date()
-    end_date = datetime.today().date()
-
-    if start_date > end_date:
-        print("✅ Macro data up to date.")
-        status, row_count, error_msg = "skipped", 0, None
-    else:
-        print(f"📡 Fetching macro data from {start_date} to {end_date}...")
-        df = merge_yield_series_incremental(
-            SERIES_IDS,
-            FRED_API_KEY,
-            str(start_date),
-            str(end_date),
-            spreads_to_compute=SPREADS
+    with pipeline_run("macro", GOOGLE_CLOUD_PROJECT, BIGQUERY_DATASET) as run:
+        latest_date = bigQueryUtils.get_latest_date_from_bq(
+            GOOGLE_CLOUD_PROJECT, BIGQUERY_DATASET, TABLE_NAME
         )
-        bigQueryUtils.upload_to_bigquery(
-            df, BIGQUERY_DATASET, TABLE_NAME, GOOGLE_CLOUD_PROJECT, mode="append"
+        start_date = (latest_date + timedelta(days=1)).date() if latest_date else datetime.strptime("1968-01-01", "%Y-%m-%d").date()
+        end_date = datetime.today().date()
+        run.start_date, run.end_date = start_date, end_date
+
+        if start_date > end_date:
+            print("✅ Macro data up to date.")
+            status, row_count, error_msg = "skipped", 0, None
+        else:
+            print(f"📡 Fetching macro data from {start_date} to {end_date}...")
+            get_scheduler().configure("fred", rate=FRED_MAX_REQUESTS_PER_MINUTE / 60, burst=FRED_MAX_REQUESTS_PER_MINUTE)
+            cache = ObservationCache(CACHE_DIR, ttl_days=CACHE_TTL_DAYS, max_bytes=CACHE_MAX_BYTES) if CACHE_ENABLED else None
+            df = merge_yield_series_incremental(
+                SERIES_IDS,
+                FRED_API_KEY,
+                str(start_date),
+                str(end_date),
+                spreads_to_compute=SPREADS,
+                max_workers=FRED_MAX_WORKERS,
+                cache=cache
+            )
+            with stage("upload", table=TABLE_NAME, rows_in=len(df)) as st:
+                result = st.output(bigQueryUtils.upload_to_bigquery(
+                    df, BIGQUERY_DATASET, TABLE_NAME, GOOGLE_CLOUD_PROJECT, mode="append"
+                ))
+                if not result.ok:
+                    # Chunked loads don't raise; a failed chunk is recorded against the stage and the audit log
+                    st.status, st.error = "failed", result.failed[0]["error"]
+            result.report()
+            if result.ok:
+                print("✅ Macro data upload complete.")
+                status, row_count, error_msg = "success", result.rows_loaded, None
+            else:
+                status, row_count, error_msg = "failed", result.rows_loaded, result.failed[0]["error"]
+
+        bigQueryUtils.log_load_metadata(
+            GOOGLE_CLOUD_PROJECT,
+            BIGQUERY_DATASET,
+            LOG_TABLE,
+            start_date,
+            end_date,
+            row_count,
+            status,
+            error_msg
         )
-        print("✅ Macro data upload complete.")
-        status, row_count, error_msg = "success", len(df), None
-
-    bigQueryUtils.log_load_metadata(
-        GOOGLE_CLOUD_PROJECT,
-        BIGQUERY_DATASET,
-        LOG_TABLE,
-        start_date,
-        end_date,
-        row_count,
-        status,
-        error_msg
-    )
-
 
 
 
 
 # --- CLI Runner ---
 if __name__ == "__main__":
+    import argparse
     import sys
     from flowAnalysis.fiat_tracker import interactive_fiat_tracker, list_fiat_stable_pairs
 
+    parser = argparse.ArgumentParser(description="Macro / stablecoin flow pipelines")
+    parser.add_argument("--resume", metavar="TAG", help="Resume a checkpointed USDT flow pull by its label")
+    parser.add_argument("--sink", choices=["bigquery", "duckdb"],
+                        help="Where uploads go (default: $WAREHOUSE_SINK or bigquery); duckdb stays local")
+    parser.add_argument("--metrics", metavar="PATH", help="Also append stage metrics to this JSON-lines file")
+    parser.add_argument("--profile", metavar="STAGES",
+                        help="Profile these stages (comma-separated, e.g. fetch,merge, or 'all')")
+    parser.add_argument("--profile-mode", choices=["cprofile", "sample"],
+                        help="cProfile (calling thread, exact) or stack sampling (all threads, cheap)")
+    parser.add_argument("--profile-dir", metavar="DIR", help="Where stage profiles are written (default: PROFILES)")
+    args = parser.parse_args()
+
+    if args.metrics or args.profile or args.profile_mode or args.profile_dir:
+        import instrumentation
+        instrumentation.configure(metrics_path=args.metrics, profile=args.profile, profile_mode=args.profile_mode,
+                                  profile_dir=args.profile_dir)
+
+    if args.sink:
+        from warehouseSink import BigQuerySink, DuckDBSink, set_sink
+        set_sink(DuckDBSink() if args.sink == "duckdb" else BigQuerySink())
+
+    if args.resume:
+        from flowAnalysis.flowfetcher import resume_stablecoin_flow_pull
+        resume_stablecoin_flow_pull(args.resume)
+        sys.exit()
+
     print("\n📊 Choose a pipeline to run:")
     print("1. Update Macro Treasury Yield Data")
     print("2. Run Stablecoin --> Exchanges (Custom Period)")
     print("3. Track Fiat → Stablecoin Market Trades (via CEX)")
     print("4. View Available Fiat ⇄ Stablecoin Pairs")
-    print("5. Exit")
+    print("5. Batch Scan Fiat ⇄ Stablecoin Pairs (Multiple Exchanges)")
+    print("6. Tail Fiat ⇄ Stablecoin Pairs (Continuous)")
+    print("7. Exit")
 
     choice = input("\nEnter number: ").strip()
 
@@ -93,6 +140,14 @@ if __name__ == "__main__":
         list_fiat_stable_pairs(exch, fiat or None, stable or None)
 
     elif choice == "5":
+        from flowAnalysis.fiat_scanner import interactive_fiat_scanner
+        interactive_fiat_scanner()
+
+    elif choice == "6":
+        from flowAnalysis.fiat_tail import interactive_fiat_tail
+        interactive_fiat_tail()
+
+    elif choice == "7":
         print("👋 Exiting.")
         sys.exit()
     else:
@@ -0,0 +1,282 @@
+# src/requestScheduler.py
+#
+# One scheduler for every call to an external service (FRED, Snowflake, exchanges via ccxt,
+# BigQuery): per-endpoint token buckets, backoff that adapts to 429/503 throttling, jitter,
+# and live metrics.
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+THROTTLE_STATUS = {429, 503}
+TRANSIENT_STATUS = {500, 502, 504}
+
+# Matched by class name anywhere in the exception's MRO, so no client library has to be imported
+THROTTLE_ERRORS = {"RateLimitExceeded", "DDoSProtection", "TooManyRequests", "ServiceUnavailable"}
+TRANSIENT_ERRORS = {
+    "NetworkError", "RequestTimeout", "ExchangeNotAvailable",          # ccxt
+    "ConnectionError", "Timeout", "ChunkedEncodingError",              # requests
+    "InternalServerError", "BadGateway", "GatewayTimeout", "DeadlineExceeded",  # google.api_core
+    "OperationalError", "InterfaceError",                              # DB-API / Snowflake
+    "TimeoutError", "ConnectionResetError",
+}
+
+METRICS_WINDOW = 60.0
+
+
+def _status_code(exc):
+    code = getattr(exc, "code", None)
+    if code is None and getattr(exc, "response", None) is not None:
+        code = getattr(exc.response, "status_code", None)
+    return code if isinstance(code, int) and 100 <= code < 600 else None
+
+
+def classify(exc):
+    """'throttle' for 429/503-style errors, 'transient' for retryable failures, else None."""
+    status = _status_code(exc)
+    if status in THROTTLE_STATUS:
+        return "throttle"
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if names & THROTTLE_ERRORS:
+        return "throttle"
+    if status in TRANSIENT_STATUS or names & TRANSIENT_ERRORS:
+        return "transient"
+    return None
+
+
+def retry_after(exc):
+    """Seconds from a Retry-After header on the failed response, if the server sent one."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+# ──────────────────────────────────────────────────────────────
+# 🪣 Adaptive token bucket
+# ──────────────────────────────────────────────────────────────
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate` tokens/s up to `burst`. `reserve()` takes a token
+    and returns how long the caller must wait for it, so threads and coroutines can share one
+    bucket. The rate is cut multiplicatively on throttling and recovers additively on success.
+    A `rate` of None means unlimited.
+    """
+
+    def __init__(self, rate: float = None, burst: float = None):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = burst or (max(1.0, rate) if rate else 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def slow_down(self, factor: float = 0.5):
+        if self.rate:
+            with self._lock:
+                self.rate = max(self.base_rate * 0.05, self.rate * factor)
+
+    def speed_up(self, step: float = 0.05):
+        if self.rate and self.rate < self.base_rate:
+            with self._lock:
+                self.rate = min(self.base_rate, self.rate + self.base_rate * step)
+
+
+# ──────────────────────────────────────────────────────────────
+# 🎯 Endpoints
+# ──────────────────────────────────────────────────────────────
+class Endpoint:
+    """Bucket, retry policy and counters for one external service (or one exchange)."""
+
+    def __init__(self, name: str, rate: float = None, burst: float = None, max_retries: int = 4,
+                 base_delay: float = 0.5, max_delay: float = 60.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._completed = deque()
+        self._first_call = None
+        self.counters = {"in_flight": 0, "queued": 0, "calls": 0, "successes": 0, "failures": 0,
+                         "retries": 0, "throttled": 0}
+
+    def _count(self, **deltas):
+        with self._lock:
+            if self._first_call is None:
+                self._first_call = time.monotonic()
+            for key, delta in deltas.items():
+                self.counters[key] += delta
+
+    def _done(self):
+        now = time.monotonic()
+        with self._lock:
+            self._completed.append(now)
+            while self._completed and now - self._completed[0] > METRICS_WINDOW:
+                self._completed.popleft()
+
+    def backoff(self, attempt: int, kind: str, server_hint: float = None) -> float:
+        """Exponential delay with equal jitter; throttling also halves the bucket's rate."""
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if kind == "throttle":
+            self.bucket.slow_down()
+            self._count(throttled=1)
+            if server_hint:
+                delay = max(delay, server_hint)
+        self._count(retries=1)
+        return delay
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            recent = sum(1 for t in self._completed if now - t <= METRICS_WINDOW)
+            # Short runs are averaged over their own duration, not the whole window
+            span = min(METRICS_WINDOW, now - self._first_call) if self._first_call else 0.0
+            out = dict(self.counters)
+        out["rate_limit"] = round(self.bucket.rate, 3) if self.bucket.rate else None
+        out["achieved_rps"] = round(recent / span, 3) if span > 0 else 0.0
+        return out
+
+
+# ──────────────────────────────────────────────────────────────
+# 🗓️ Scheduler
+# ──────────────────────────────────────────────────────────────
+class RequestScheduler:
+    """
+    Registry of endpoints. `call()` (threads) and `acall()` (asyncio) wait for a token, run the
+    request, and retry throttled or transient failures with backoff; anything else is raised
+    at once. Endpoints that were never configured get no rate limit and the default retries.
+    """
+
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def configure(self, name: str, **settings) -> Endpoint:
+        """Create or replace endpoint `name` (rate, burst, max_retries, base_delay, max_delay)."""
+        with self._lock:
+            self._endpoints[name] = Endpoint(name, **settings)
+            return self._endpoints[name]
+
+    def endpoint(self, name: str, **defaults) -> Endpoint:
+        """Endpoint `name`, created with `defaults` the first time it is used."""
+        with self._lock:
+            if name not in self._endpoints:
+                self._endpoints[name] = Endpoint(name, **defaults)
+            return self._endpoints[name]
+
+    def call(self, name: str, fn, *args, **kwargs):
+        ep = self.endpoint(name)
+        attempt = 0
+        while True:
+            wait = ep.bucket.reserve()
+            if wait:
+                ep._count(queued=1)
+                time.sleep(wait)
+                ep._count(queued=-1)
+
+            ep._count(in_flight=1, calls=1)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                ep._count(in_flight=-1)
+                kind = classify(e)
+                if kind is None or attempt >= ep.max_retries:
+                    ep._count(failures=1)
+                    raise
+                delay = ep.backoff(attempt, kind, retry_after(e))
+                print(f"⚠️ {name}: {type(e).__name__} ({kind}), retry {attempt + 1}/{ep.max_retries} in {delay:.1f}s")
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            ep._count(in_flight=-1, successes=1)
+            ep._done()
+            ep.bucket.speed_up()
+            return result
+
+    async def acall(self, name: str, fn, *args, **kwargs):
+        """`call()` for coroutine functions; waits with asyncio.sleep so the loop keeps running."""
+        ep = self.endpoint(name)
+        attempt = 0
+        while True:
+            wait = ep.bucket.reserve()
+            if wait:
+                ep._count(queued=1)
+                await asyncio.sleep(wait)
+                ep._count(queued=-1)
+
+            ep._count(in_flight=1, calls=1)
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                ep._count(in_flight=-1)
+                kind = classify(e)
+                if kind is None or attempt >= ep.max_retries:
+                    ep._count(failures=1)
+                    raise
+                delay = ep.backoff(attempt, kind, retry_after(e))
+                print(f"⚠️ {name}: {type(e).__name__} ({kind}), retry {attempt + 1}/{ep.max_retries} in {delay:.1f}s")
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+
+            ep._count(in_flight=-1, successes=1)
+            ep._done()
+            ep.bucket.speed_up()
+            return result
+
+    # ── metrics ───────────────────────────────────────────────
+    def metrics(self) -> dict:
+        """{endpoint: counters} with in-flight, queued, retries, throttled and achieved req/s."""
+        with self._lock:
+            endpoints = list(self._endpoints.values())
+        return {ep.name: ep.snapshot() for ep in endpoints}
+
+    def report(self):
+        print("\n📡 Request scheduler:")
+        for name, m in self.metrics().items():
+            print(f"   {name}: {m['successes']:,} ok / {m['failures']:,} failed, {m['retries']:,} retries "
+                  f"({m['throttled']:,} throttled), {m['in_flight']} in flight, {m['queued']} queued, "
+                  f"{m['achieved_rps']} req/s (limit {m['rate_limit'] or '∞'})")
+
+
+# Starting budgets; callers can re-`configure()` them from config (e.g. main.py for FRED)
+DEFAULT_ENDPOINTS = {
+    "fred": {"rate": 2.0, "burst": 120},             # FRED: 120 requests/minute per API key
+    "snowflake": {"max_retries": 2, "base_delay": 1.0},
+    "bigquery": {"rate": 10.0, "burst": 10, "base_delay": 1.0},
+    "flipside": {"max_retries": 2, "base_delay": 5.0},
+}
+
+_scheduler = RequestScheduler()
+for _name, _settings in DEFAULT_ENDPOINTS.items():
+    _scheduler.configure(_name, **_settings)
+
+
+def get_scheduler() -> RequestScheduler:
+    """The process-wide scheduler shared by all fetch and upload paths."""
+    return _scheduler
+
+
+def ccxt_endpoint(exchange) -> str:
+    """Endpoint name for a ccxt exchange, paced at the exchange's own documented rateLimit."""
+    name = f"ccxt:{getattr(exchange, 'id', None) or type(exchange).__name__}"
+    rate_limit_ms = getattr(exchange, "rateLimit", None)
+    _scheduler.endpoint(name, rate=1000.0 / rate_limit_ms if rate_limit_ms else None, burst=1)
+    return name
@@ -0,0 +1,23 @@
+# src/tests/conftest.py
+#
+# Tests import modules the way the pipelines do (`import warehouseSink`, `from flowAnalysis...`),
+# so src/ goes on the path. Run from src/:  python -m pytest tests
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from warehouseSink import DuckDBSink, set_sink  # noqa: E402
+
+
+@pytest.fixture
+def sink():
+    """An in-memory DuckDB warehouse, also installed as the active sink for audit writes."""
+    duck = DuckDBSink(":memory:")
+    previous = set_sink(duck)
+    yield duck
+    set_sink(previous)
+    duck.close()
@@ -0,0 +1,37 @@
+# src/tests/test_bigquery_load.py
+
+import io
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud import bigquery
+
+from bigQueryUtils import encode_for_load, plan_load
+
+FRAME = pd.DataFrame({
+    "date": pd.date_range("2024-01-01", periods=3),                 # naive, as aligned_frame builds it
+    "loaded_at": pd.date_range("2024-01-01", periods=3, tz="UTC"),
+    "DGS10": [4.1, 4.2, 4.3],
+})
+
+
+def _parquet_schema(df, schema):
+    buf = next(encode_for_load(df, schema))
+    return pq.ParquetFile(io.BytesIO(buf.to_pybytes())).schema_arrow
+
+
+def test_inferred_timestamps_load_as_microseconds():
+    _, fields, _ = plan_load(FRAME, [])
+    assert [(f.name, f.field_type) for f in fields] == [("date", "DATETIME"), ("loaded_at", "TIMESTAMP"),
+                                                        ("DGS10", "FLOAT")]
+    written = _parquet_schema(FRAME, [])
+    assert written.field("date").type == pa.timestamp("us")
+    assert written.field("loaded_at").type == pa.timestamp("us", tz="UTC")
+
+
+def test_declared_types_win_over_inference():
+    schema = [bigquery.SchemaField("date", "TIMESTAMP")]
+    _, fields, _ = plan_load(FRAME, schema)
+    assert fields[0].field_type == "TIMESTAMP"
+    assert _parquet_schema(FRAME, schema).field("date").type == pa.timestamp("us", tz="UTC")
@@ -0,0 +1,73 @@
+# src/tests/test_wallet_ingestion.py
+
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from bigQueryUtils import AUDIT_TABLE
+from walletIngestion import ingest_wallet_labels
+
+FINAL = "proj.wallets.cex_wallets"
+STAGING = "proj.wallets.cex_wallets_staging"
+ADDRESSES = [f"0x{i:040x}" for i in range(1, 26)]
+
+
+class FakeSDK:
+    """Answers keyset queries from a fixed, sorted address list, as Flipside would."""
+
+    def __init__(self, addresses=ADDRESSES):
+        self.addresses = sorted(addresses)
+        self.queries = []
+
+    def query(self, sql):
+        after = re.search(r"LOWER\(l\.address\) > '([^']*)'", sql).group(1)
+        limit = int(re.search(r"LIMIT (\d+)", sql).group(1))
+        self.queries.append(after)
+        page = [a for a in self.addresses if a > after][:limit]
+        return SimpleNamespace(records=[{"address": a, "entity": "binance 1", "label": "CEX"} for a in page],
+                               run_stats=SimpleNamespace(query_exec_seconds=0.1, bytes=len(page) * 64))
+
+
+def _final_addresses(sink):
+    return sink.query('SELECT address FROM "wallets"."cex_wallets" ORDER BY address')["address"].tolist()
+
+
+@pytest.mark.parametrize("merge_every", [0, 2])
+def test_fresh_run(sink, merge_every):
+    result = ingest_wallet_labels(FakeSDK(), ["binance%"], FINAL, STAGING, sink=sink, batch_size=10,
+                                  merge_every=merge_every)
+
+    assert result["error"] is None
+    assert result["rows_staged"] == result["rows_inserted"] == len(ADDRESSES)
+    assert [b["rows"] for b in result["batches"]] == [10, 10, 5]
+    assert result["last_address"] == ADDRESSES[-1]
+    assert _final_addresses(sink) == ADDRESSES
+
+    audit = sink.query(f'SELECT table_name, row_count, status FROM "wallets"."{AUDIT_TABLE}"')
+    assert audit.to_dict("records") == [{"table_name": "cex_wallets", "row_count": 25, "status": "success"}]
+
+
+def test_rerun_inserts_nothing_new(sink):
+    ingest_wallet_labels(FakeSDK(), ["binance%"], FINAL, STAGING, sink=sink, batch_size=10)
+    result = ingest_wallet_labels(FakeSDK(), ["binance%"], FINAL, STAGING, sink=sink, batch_size=10)
+
+    assert result["rows_staged"] == len(ADDRESSES)
+    assert result["rows_inserted"] == 0
+    assert _final_addresses(sink) == ADDRESSES
+    # Staging was emptied first, so it holds this run's pages only
+    assert sink.query('SELECT COUNT(*) AS n FROM "wallets"."cex_wallets_staging"')["n"][0] == len(ADDRESSES)
+
+
+def test_resume_continues_after_staged_addresses(sink):
+    first = ingest_wallet_labels(FakeSDK(), ["binance%"], FINAL, STAGING, sink=sink, batch_size=10, max_rows=12)
+    assert first["rows_staged"] == 12
+    assert _final_addresses(sink) == ADDRESSES[:12]
+
+    sdk = FakeSDK()
+    resumed = ingest_wallet_labels(sdk, ["binance%"], FINAL, STAGING, sink=sink, batch_size=10, resume=True)
+
+    assert sdk.queries[0] == ADDRESSES[11]
+    assert resumed["rows_staged"] == len(ADDRESSES) - 12
+    assert resumed["rows_inserted"] == len(ADDRESSES) - 12
+    assert _final_addresses(sink) == ADDRESSES
@@ -0,0 +1,87 @@
+# src/tests/test_warehouse_sink.py
+
+import pandas as pd
+import pytest
+from google.cloud import bigquery
+
+from bigQueryUtils import AUDIT_TABLE, log_load_metadata
+from warehouseSink import WarehouseSink
+
+SCHEMA = [
+    bigquery.SchemaField("address", "STRING"),
+    bigquery.SchemaField("amount", "FLOAT"),
+]
+
+
+def test_base_sink_is_abstract():
+    with pytest.raises(TypeError):
+        WarehouseSink()
+
+
+def test_append_adds_new_fields(sink):
+    sink.append(pd.DataFrame({"address": ["a", "b"], "amount": [1, 2]}), "ds.t", SCHEMA)
+    result = sink.append(pd.DataFrame({"address": ["c"], "amount": [3.5], "label": ["cex"]}), "ds.t",
+                         SCHEMA + [bigquery.SchemaField("label", "STRING")], allow_field_addition=True)
+
+    assert result.ok
+    df = sink.query('SELECT * FROM "ds"."t" ORDER BY address')
+    assert list(df.columns) == ["address", "amount", "label"]
+    assert df["amount"].tolist() == [1.0, 2.0, 3.5]
+    assert df["label"].isna().tolist() == [True, True, False]
+
+
+def test_append_replace_and_fail_modes(sink):
+    sink.append(pd.DataFrame({"address": ["a", "b"]}), "ds.t")
+    sink.append(pd.DataFrame({"address": ["c"]}), "ds.t", mode="replace")
+    assert sink.query('SELECT address FROM "ds"."t"')["address"].tolist() == ["c"]
+
+    with pytest.raises(ValueError):
+        sink.append(pd.DataFrame({"address": ["d"]}), "ds.t", mode="fail")
+
+
+def test_latest_date(sink):
+    assert sink.latest_date("ds.bars") is None
+
+    dates = pd.to_datetime(["2024-03-01", "2024-03-03", "2024-03-02"], utc=True)
+    sink.append(pd.DataFrame({"date": dates, "close": [1.0, 2.0, 3.0]}), "ds.bars",
+                [bigquery.SchemaField("date", "TIMESTAMP"), bigquery.SchemaField("close", "FLOAT")])
+
+    assert sink.latest_date("proj.ds.bars") == pd.Timestamp("2024-03-03", tz="UTC")
+
+
+def test_merge_dedupe_is_idempotent(sink):
+    staged = pd.DataFrame({"address": ["a", "b", "b", "c"], "amount": [1.0, 2.0, 2.0, 3.0]})
+    sink.append(staged, "ds.staging", SCHEMA)
+
+    first = sink.merge_dedupe("ds.staging", "ds.final", "address", ["address", "amount"])
+    second = sink.merge_dedupe("ds.staging", "ds.final", "address", ["address", "amount"])
+
+    assert first["inserted"] == 3
+    assert second["inserted"] == 0
+    assert sink.query('SELECT address FROM "ds"."final" ORDER BY address')["address"].tolist() == ["a", "b", "c"]
+
+
+def test_merge_dedupe_where_limits_range(sink):
+    sink.append(pd.DataFrame({"address": list("abcde"), "amount": [1.0] * 5}), "ds.staging", SCHEMA)
+
+    stats = sink.merge_dedupe("ds.staging", "ds.final", "address", ["address", "amount"],
+                              where="address > 'a' AND address <= 'c'")
+    assert stats["inserted"] == 2
+    assert sink.query('SELECT address FROM "ds"."final" ORDER BY address')["address"].tolist() == ["b", "c"]
+
+    stats = sink.merge_dedupe("ds.staging", "ds.final", "address", ["address", "amount"],
+                              where="address > 'c'")
+    assert stats["inserted"] == 2
+    assert sink.max_value("ds.final", "address") == "e"
+
+
+def test_audit_rows(sink):
+    log_load_metadata("proj", "ds", "bars", "2024-03-01", "2024-03-02", 10, "success", None)
+    log_load_metadata("proj", "ds", "bars", "2024-03-02", "2024-03-03", 0, "failed", "boom")
+
+    df = sink.query(f'SELECT * FROM "ds"."{AUDIT_TABLE}" ORDER BY start_date')
+    assert df["table_name"].tolist() == ["bars", "bars"]
+    assert df["row_count"].tolist() == [10, 0]
+    assert df["status"].tolist() == ["success", "failed"]
+    assert df["error_message"].tolist()[1] == "boom"
+    assert df["load_time"].notna().all()
@@ -0,0 +1,33 @@
+# src/treasuryData/align.py
+
+import numpy as np
+import pandas as pd
+
+
+def align_series(series):
+    """
+    Align many single-series observations on one shared, sorted date index.
+
+    `series` is a list of (series_id, dates, values) with `dates` as datetime64 arrays.
+    The union of all dates is built once and every series is scattered into a preallocated
+    float64 block of shape (n_dates, n_series); dates a series does not report stay NaN,
+    exactly as a chain of outer merges would leave them.
+    """
+    if not series:
+        return np.array([], dtype="datetime64[ns]"), np.empty((0, 0)), []
+
+    all_dates = np.unique(np.concatenate([np.asarray(d) for _, d, _ in series]))
+    block = np.full((len(all_dates), len(series)), np.nan, dtype="float64")
+
+    for j, (_, dates, values) in enumerate(series):
+        rows = np.searchsorted(all_dates, np.asarray(dates, dtype=all_dates.dtype))
+        block[rows, j] = values
+
+    return all_dates, block, [sid for sid, _, _ in series]
+
+
+def aligned_frame(dates, block, columns):
+    """Wrap an aligned (dates, block) pair as the wide DataFrame the pipeline returns."""
+    df = pd.DataFrame(block, columns=columns)
+    df.insert(0, "date", dates)
+    return df
@@ -0,0 +1,196 @@
+# src/treasuryData/cache.py
+
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+ONE_DAY = timedelta(days=1)
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def _merge_ranges(ranges):
+    """Collapse overlapping or adjacent [start, end] date ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + ONE_DAY:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _subtract_ranges(start, end, held):
+    """Return the parts of [start, end] not covered by the `held` ranges."""
+    missing = []
+    cursor = start
+    for h_start, h_end in _merge_ranges(held):
+        if h_end < cursor:
+            continue
+        if h_start > end:
+            break
+        if h_start > cursor:
+            missing.append((cursor, h_start - ONE_DAY))
+        cursor = max(cursor, h_end + ONE_DAY)
+        if cursor > end:
+            break
+    if cursor <= end:
+        missing.append((cursor, end))
+    return missing
+
+
+class ObservationCache:
+    """
+    On-disk Parquet cache of FRED observations, one file per series_id.
+
+    A JSON manifest records which date ranges each file fully covers, so only the missing
+    sub-ranges are requested from FRED. Entries older than `ttl_days` are dropped, and the least
+    recently used series are evicted once the cache grows past `max_bytes`. The most recent
+    `settle_days` of any request are never marked as covered, since FRED may still publish them.
+    """
+
+    def __init__(self, cache_dir, ttl_days=30, max_bytes=512 * 1024 ** 2, settle_days=3):
+        self.cache_dir = cache_dir
+        self.ttl = timedelta(days=ttl_days)
+        self.max_bytes = max_bytes
+        self.settle_days = settle_days
+        self._lock = threading.RLock()
+        self._manifest_path = os.path.join(cache_dir, "manifest.json")
+        os.makedirs(cache_dir, exist_ok=True)
+        self._manifest = self._load_manifest()
+
+    # ── manifest ──────────────────────────────────────────────
+    def _load_manifest(self):
+        if not os.path.exists(self._manifest_path):
+            return {}
+        with open(self._manifest_path, "r") as f:
+            return json.load(f)
+
+    def _save_manifest(self):
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._manifest, f, indent=2)
+        os.replace(tmp, self._manifest_path)
+
+    def _path(self, series_id):
+        return os.path.join(self.cache_dir, f"{series_id}.parquet")
+
+    def _held_ranges(self, series_id):
+        entry = self._manifest.get(series_id)
+        if not entry:
+            return []
+        return [(date.fromisoformat(s), date.fromisoformat(e)) for s, e in entry["ranges"]]
+
+    def _drop(self, series_id):
+        self._manifest.pop(series_id, None)
+        if os.path.exists(self._path(series_id)):
+            os.remove(self._path(series_id))
+
+    # ── public API ────────────────────────────────────────────
+    def missing_ranges(self, series_id, start_date, end_date):
+        """Sub-ranges of [start_date, end_date] that must still be fetched for `series_id`."""
+        with self._lock:
+            self._expire()
+            return _subtract_ranges(_to_date(start_date), _to_date(end_date), self._held_ranges(series_id))
+
+    def read(self, series_id, start_date, end_date):
+        """Cached observations for `series_id` in [start_date, end_date], in FRED's raw format."""
+        with self._lock:
+            path = self._path(series_id)
+            if series_id not in self._manifest or not os.path.exists(path):
+                return []
+            self._manifest[series_id]["last_access"] = time.time()
+            df = pd.read_parquet(path, filters=[
+                ("date", ">=", _to_date(start_date)), ("date", "<=", _to_date(end_date))
+            ])
+
+        values = df["value"].to_numpy()
+        return [
+            {"date": d, "value": "." if np.isnan(v) else repr(float(v))}
+            for d, v in zip(pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d"), values)
+        ]
+
+    def write(self, series_id, observations, start_date, end_date):
+        """Merge freshly fetched `observations` for [start_date, end_date] into the cache."""
+        start, end = _to_date(start_date), _to_date(end_date)
+        new = pd.DataFrame({
+            "date": pd.to_datetime([o["date"] for o in observations]).date if observations else [],
+            "value": pd.to_numeric(pd.Series([o["value"] for o in observations], dtype=object)
+                                   .replace(".", np.nan), errors="coerce").astype("float64"),
+        })
+
+        with self._lock:
+            path = self._path(series_id)
+            entry = self._manifest.get(series_id)
+            if entry and os.path.exists(path):
+                df = pd.concat([pd.read_parquet(path), new], ignore_index=True)
+                df = df.drop_duplicates(subset="date", keep="last")
+            else:
+                entry = {"ranges": [], "created_at": time.time()}
+                df = new
+            df = df.sort_values("date").reset_index(drop=True)
+
+            tmp = path + ".tmp"
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, path)
+
+            covered_end = min(end, date.today() - timedelta(days=self.settle_days))
+            held = self._held_ranges(series_id)
+            if covered_end >= start:
+                held.append((start, covered_end))
+            entry["ranges"] = [[s.isoformat(), e.isoformat()] for s, e in _merge_ranges(held)]
+            entry["bytes"] = os.path.getsize(path)
+            entry["last_access"] = time.time()
+            self._manifest[series_id] = entry
+
+            self._evict(keep=series_id)
+            self._save_manifest()
+
+    def fetch(self, series_id, api_key, start_date, end_date, fetcher):
+        """
+        Return observations for [start_date, end_date], calling
+        `fetcher(series_id, api_key, start, end)` only for the ranges not already on disk.
+        """
+        for gap_start, gap_end in self.missing_ranges(series_id, start_date, end_date):
+            raw = fetcher(series_id, api_key, gap_start.isoformat(), gap_end.isoformat())
+            self.write(series_id, raw, gap_start, gap_end)
+        return self.read(series_id, start_date, end_date)
+
+    # ── eviction ──────────────────────────────────────────────
+    def _expire(self):
+        now = time.time()
+        expired = [sid for sid, e in self._manifest.items()
+                   if now - e.get("created_at", now) > self.ttl.total_seconds()]
+        for sid in expired:
+            self._drop(sid)
+        if expired:
+            self._save_manifest()
+
+    def _evict(self, keep=None):
+        self._expire()
+        total = sum(e.get("bytes", 0) for e in self._manifest.values())
+        by_age = sorted(self._manifest.items(), key=lambda kv: kv[1].get("last_access", 0))
+        for sid, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            if sid == keep:
+                continue
+            total -= entry.get("bytes", 0)
+            self._drop(sid)
+
+    def clear(self):
+        with self._lock:
+            for sid in list(self._manifest):
+                self._drop(sid)
+            self._save_manifest()
@@ -14,6 +14,15 @@ SERIES_IDS = CONFIG.get("series_ids", [])
 SPREADS = [tuple(pair) for pair in CONFIG.get("spreads", [])]
 OBSERVATION_START = CONFIG.get("dateRange", {}).get("observationStart", "1968-01-01")
 OBSERVATION_END = CONFIG.get("dateRange", {}).get("observationEnd", "2025-04-08")
+FRED_MAX_WORKERS = CONFIG.get("fred", {}).get("maxWorkers", 1)
+FRED_MAX_REQUESTS_PER_MINUTE = CONFIG.get("fred", {}).get("maxRequestsPerMinute", 120)
+
+# Local FRED observation cache (paths are relative to the repo root)
+CACHE_CONFIG = CONFIG.get("cache", {})
+CACHE_ENABLED = CACHE_CONFIG.get("enabled", True)
+CACHE_DIR = os.path.join(CURRENT_DIR, "../..", CACHE_CONFIG.get("dir", "fred_cache"))
+CACHE_TTL_DAYS = CACHE_CONFIG.get("ttlDays", 30)
+CACHE_MAX_BYTES = CACHE_CONFIG.get("maxMegabytes", 512) * 1024 ** 2
 
 # Optional: hardcoded cloud values
 GOOGLE_CLOUD_PROJECT = "macropipeline"
@@ -1,10 +1,37 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import in_run_context
+from requestScheduler import get_scheduler
+
+FRED_BASE_URL = "https://api.stlouisfed.org/fred/series/observations"
 
-def fetch_yield_data(series_id, api_key, start_date, end_date):
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size=16):
+    """
+    Return the process-wide keep-alive session used for FRED requests.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def fetch_yield_data(series_id, api_key, start_date, end_date, session=None, base_url=FRED_BASE_URL):
     """
     Fetch raw FRED data for a given series_id between start_date and end_date.
     """
-    base_url = "https://api.stlouisfed.org/fred/series/observations"
     params = {
         "series_id": series_id,
         "api_key": api_key,
@@ -12,10 +39,51 @@ def fetch_yield_data(series_id, api_key, start_date, end_date):
         "observation_start": start_date,
         "observation_end": end_date
     }
-    response = requests.get(base_url, params=params)
-    response.raise_for_status()
+    session = session or get_session()
+
+    def _get():
+        response = session.get(base_url, params=params)
+        response.raise_for_status()
+        return response
+
+    # Paced by the shared "fred" budget; 429/5xx responses and dropped connections are retried
+    response = get_scheduler().call("fred", _get)
     return response.json()['observations']
 
+
+def fetch_many_yield_series(series_ids, api_key, start_date, end_date, max_workers=4,
+                            session=None, base_url=FRED_BASE_URL, cache=None):
+    """
+    Fetch several FRED series concurrently on a bounded worker pool sharing one session.
+    Requests are paced by the scheduler's "fred" endpoint. When an ObservationCache is given,
+    only the date ranges it does not hold are requested.
+
+    Returns (results, errors): `results` maps series_id -> raw observations for every series
+    that succeeded, in the order of `series_ids`; `errors` maps series_id -> the exception raised.
+    """
+    session = session or get_session(pool_size=max(max_workers, 1))
+
+    def _fetch_range(sid, key, start, end):
+        return fetch_yield_data(sid, key, start, end, session=session, base_url=base_url)
+
+    def _fetch(sid):
+        if cache is not None:
+            return cache.fetch(sid, api_key, start_date, end_date, fetcher=_fetch_range)
+        return _fetch_range(sid, api_key, start_date, end_date)
+
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        fetch = in_run_context(_fetch)
+        futures = {sid: pool.submit(fetch, sid) for sid in series_ids}
+        for sid, future in futures.items():
+            try:
+                results[sid] = future.result()
+            except Exception as e:
+                errors[sid] = e
+
+    return results, errors
+
+
 #Not used yet, debating if we even need rrp_data
 def fetch_rrp_data(api_key):
     data = fetch_yield_data("RRPONTSYD", api_key, "2013-10-14", "2025-04-08")
@@ -1,41 +1,69 @@
 # src/pipeline.py
 
-def merge_yield_series_incremental(series_ids, api_key, start_date, end_date, spreads_to_compute=None):
+def merge_yield_series_incremental(series_ids, api_key, start_date, end_date, spreads_to_compute=None,
+                                   max_workers=1, cache=None):
+    import numpy as np
     import pandas as pd
-    import gc
-    from treasuryData.fetch import fetch_yield_data
-    from treasuryData.transform import clean_yield_data, calculate_spreads
+    from treasuryData.fetch import fetch_yield_data, fetch_many_yield_series
+    from treasuryData.transform import clean_yield_data, spread_matrix
+    from treasuryData.align import align_series, aligned_frame
+    from instrumentation import stage
 
 
-    merged_df = None
+    cleaned = []
     missing_series = []
 
+    # With more than one worker, pull every series up front over a shared session
+    prefetched = None
+    if max_workers > 1:
+        with stage("fetch", rows_in=len(series_ids), workers=max_workers) as st:
+            prefetched, errors = fetch_many_yield_series(
+                series_ids, api_key, start_date, end_date,
+                max_workers=max_workers, cache=cache
+            )
+            st.set(rows_out=sum(len(raw) for raw in prefetched.values()), failed=sorted(errors))
+        for sid, err in errors.items():
+            print(f"❌ Failed to fetch {sid}: {err}")
+            missing_series.append(sid)
+
     for sid in series_ids:
-        raw = fetch_yield_data(sid, api_key, start_date, end_date)
-        df = clean_yield_data(raw, sid)
+        if prefetched is None:
+            with stage("fetch", table=sid, rows_in=1) as st:
+                if cache is not None:
+                    raw = cache.fetch(sid, api_key, start_date, end_date, fetcher=fetch_yield_data)
+                else:
+                    raw = fetch_yield_data(sid, api_key, start_date, end_date)
+                st.output(raw)
+        elif sid in prefetched:
+            raw = prefetched.pop(sid)
+        else:
+            continue
+
+        with stage("transform", table=sid, rows_in=len(raw)) as st:
+            df = st.output(clean_yield_data(raw, sid))
 
         if df.empty:
             print(f"⚠️ Skipping merge for {sid} — no data returned.")
             missing_series.append(sid)
             continue
 
-        if merged_df is None:
-            merged_df = df
-        else:
-            merged_df = pd.merge(merged_df, df, on='date', how='outer')
-
-        del df, raw
-        gc.collect()
+        # Keep only the typed arrays; the combined index is built once below
+        cleaned.append((sid, df['date'].to_numpy(), df[sid].to_numpy(dtype='float64')))
 
-    if merged_df is None or merged_df.empty:
+    if not cleaned:
         print("❌ No data could be merged from any series.")
         return pd.DataFrame()
 
-    merged_df.sort_values(by='date', inplace=True)
-    merged_df.reset_index(drop=True, inplace=True)
+    with stage("merge", rows_in=sum(len(dates) for _, dates, _ in cleaned), series=len(cleaned)) as st:
+        dates, block, columns = align_series(cleaned)
+        del cleaned
+
+        if spreads_to_compute:
+            spread_names, spreads = spread_matrix(block, columns, spreads_to_compute)
+            block = np.hstack([block, spreads])
+            columns = columns + spread_names
 
-    if spreads_to_compute:
-        merged_df = calculate_spreads(merged_df, spreads_to_compute)
+        merged_df = st.output(aligned_frame(dates, block, columns))
 
     if missing_series:
         print(f"\n⚠️ The following series had no data and were skipped: {', '.join(missing_series)}")
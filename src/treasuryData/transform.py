@@ -1,11 +1,70 @@
 import numpy as np
 import pandas as pd
 
+# Resolution pd.to_datetime gives date strings in the installed pandas, so the fast path
+# produces exactly the same column dtype as the generic one.
+_DATE_DTYPE = pd.to_datetime(pd.Series(["1970-01-01"])).dtype
+
+
+def decode_observations(raw_observations):
+    """
+    Decode raw FRED observations straight into typed (dates, values) arrays.
+
+    `dates` is datetime64[D], parsed with numpy's fixed ISO YYYY-MM-DD parser; `values` is
+    float64 with FRED's '.' placeholder masked to NaN in one vectorized pass. Returns None when
+    the observations don't fit that shape, so callers can fall back to the generic path.
+    """
+    try:
+        date_strs = [obs['date'] for obs in raw_observations]
+        value_strs = [obs['value'] for obs in raw_observations]
+        dates = np.array(date_strs, dtype='datetime64[D]')
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    value_arr = np.array(value_strs, dtype=object)
+    missing = value_arr == '.'
+    value_arr[missing] = 'nan'
+    try:
+        values = value_arr.astype('float64')
+    except (TypeError, ValueError):
+        values = pd.to_numeric(pd.Series(value_arr), errors='coerce').to_numpy(dtype='float64')
+
+    return dates, values
+
+
+def _ffill(values):
+    valid = ~np.isnan(values)
+    if valid.all():
+        return values
+    idx = np.where(valid, np.arange(len(values)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    return values[idx]
+
+
 def clean_yield_data(raw_observations, series_id):
     if not raw_observations:
         print(f"⚠️ Warning: No data returned for series {series_id}")
         return pd.DataFrame()
 
+    decoded = decode_observations(raw_observations)
+    if decoded is None:
+        return _clean_yield_data_generic(raw_observations, series_id)
+
+    dates, values = decoded
+
+    # FRED returns observations in date order; only sort when that isn't the case
+    index = None
+    if len(dates) > 1 and not (dates[1:] >= dates[:-1]).all():
+        index = np.argsort(dates, kind='stable')
+        dates, values = dates[index], values[index]
+
+    return pd.DataFrame(
+        {'date': dates.astype(_DATE_DTYPE), series_id: _ffill(values)},
+        index=index,
+    )
+
+
+def _clean_yield_data_generic(raw_observations, series_id):
     df = pd.DataFrame(raw_observations)
 
     # Ensure required columns exist
@@ -27,14 +86,37 @@ def clean_yield_data(raw_observations, series_id):
 
 # src/transform.py
 
-def calculate_spreads(df, spreads_to_compute):
+def spread_matrix(block, columns, spreads_to_compute):
+    """
+    Compute every (long, short) spread over a (n_dates, n_series) value block in one
+    vectorized subtraction. Returns (spread_names, matrix of shape (n_dates, n_spreads)).
+    """
+    position = {col: i for i, col in enumerate(columns)}
+    long_idx, short_idx, names = [], [], []
+
     for long, short in spreads_to_compute:
-        if long not in df.columns or short not in df.columns:
+        if long not in position or short not in position:
             print(f"⚠️ Skipping spread {long} - {short}: missing column(s) in dataframe.")
             continue
+        long_idx.append(position[long])
+        short_idx.append(position[short])
+        names.append(f"{long}_{short}_spread")
 
-        spread_name = f"{long}_{short}_spread"
-        df[spread_name] = df[long] - df[short]
+    if not names:
+        return [], np.empty((block.shape[0], 0))
 
-    return df
+    return names, block[:, long_idx] - block[:, short_idx]
+
+
+def calculate_spreads(df, spreads_to_compute):
+    referenced = dict.fromkeys(col for pair in spreads_to_compute for col in pair)
+    columns = [c for c in referenced if c in df.columns]
+    block = df[columns].to_numpy(dtype='float64', na_value=np.nan)
+
+    names, spreads = spread_matrix(block, columns, spreads_to_compute)
+    if not names:
+        return df
 
+    df = df.drop(columns=[n for n in names if n in df.columns])
+    spread_df = pd.DataFrame(spreads, columns=names, index=df.index)
+    return pd.concat([df, spread_df], axis=1)
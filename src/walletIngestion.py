@@ -0,0 +1,276 @@
+# src/walletIngestion.py
+#
+# Flipside → BigQuery ingestion of labeled CEX wallets: keyset pagination on the address,
+# append-only loads into a staging table, and a deduplicating MERGE into the final table.
+
+import queue
+import threading
+import time
+from datetime import timedelta
+
+import pandas as pd
+from google.cloud import bigquery
+
+from bigQueryUtils import log_load_metadata
+from requestScheduler import get_scheduler
+from warehouseSink import get_sink
+
+FLIPSIDE_BATCH_SIZE = 100_000
+BQ_USD_PER_TIB = 6.25     # on-demand query pricing, for the per-merge cost estimate
+
+WALLET_COLUMNS = ["address", "entity", "label"]
+STAGING_SCHEMA = [
+    bigquery.SchemaField("address", "STRING"),
+    bigquery.SchemaField("entity", "STRING"),
+    bigquery.SchemaField("label", "STRING"),
+]
+
+# Each page starts strictly after the last address of the previous one, so Flipside only has to
+# find the next `limit` addresses instead of numbering the whole join again for every offset
+KEYSET_QUERY_TEMPLATE = """
+SELECT
+  LOWER(l.address) AS address,
+  MIN(LOWER(l.address_name)) AS entity,
+  '{label}' AS label
+FROM ethereum.core.dim_labels l
+JOIN ethereum.core.fact_transactions tx
+  ON LOWER(tx.to_address) = LOWER(l.address)
+WHERE ({name_filter})
+  AND tx.block_timestamp BETWEEN '{start}' AND '{end}'
+  AND LOWER(l.address) > '{after}'
+GROUP BY LOWER(l.address)
+ORDER BY address
+LIMIT {limit}
+"""
+
+
+def _quote(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
+def name_filter(patterns) -> str:
+    """
+    SQL predicate on LOWER(l.address_name) for exchange-name patterns: entries containing % are
+    LIKE patterns, anything else must match exactly. Matching is case-insensitive.
+    """
+    clauses = []
+    for p in patterns:
+        p = _quote(p.lower())
+        op = "LIKE" if "%" in p else "="
+        clauses.append(f"LOWER(l.address_name) {op} '{p}'")
+    return " OR\n    ".join(clauses)
+
+
+def keyset_query(patterns, after: str = "", limit: int = FLIPSIDE_BATCH_SIZE, start: str = "2022-01-01",
+                 end: str = "2024-12-31", label: str = "CEX") -> str:
+    return KEYSET_QUERY_TEMPLATE.format(name_filter=name_filter(patterns), start=start, end=end,
+                                        after=_quote(after), limit=int(limit), label=_quote(label))
+
+
+# ──────────────────────────────────────────────────────────────
+# 📡 Flipside pages
+# ──────────────────────────────────────────────────────────────
+def fetch_wallet_page(sdk, sql: str):
+    """One Flipside page as (DataFrame, stats), through the shared "flipside" endpoint."""
+    t0 = time.perf_counter()
+    response = get_scheduler().call("flipside", sdk.query, sql)
+    df = pd.DataFrame(response.records or [], columns=WALLET_COLUMNS)
+    run = response.run_stats
+    return df, {
+        "rows": len(df),
+        "flipside_seconds": round(time.perf_counter() - t0, 2),
+        # Flipside bills query compute time; queued and streaming time are free
+        "flipside_exec_seconds": getattr(run, "query_exec_seconds", None),
+        "flipside_bytes": getattr(run, "bytes", None),
+    }
+
+
+# ──────────────────────────────────────────────────────────────
+# 🗄️ Staging & merge
+# ──────────────────────────────────────────────────────────────
+def load_staging(sink, df: pd.DataFrame, staging_table_id: str, truncate: bool = False) -> dict:
+    """Append a page to staging (or replace its contents with `truncate`); no reads of other tables."""
+    t0 = time.perf_counter()
+    result = sink.append(df[WALLET_COLUMNS], staging_table_id, STAGING_SCHEMA, mode="replace" if truncate else "append")
+    if not result.ok:
+        raise RuntimeError(result.failed[0]["error"])
+    return {"load_seconds": round(time.perf_counter() - t0, 2)}
+
+
+def merge_staging(sink, staging_table_id: str, final_table_id: str, after: str, through: str) -> dict:
+    """MERGE staged addresses in (after, through] into the final table, inserting only new ones."""
+    stats = sink.merge_dedupe(staging_table_id, final_table_id, "address", WALLET_COLUMNS,
+                              where=f"address > '{_quote(after)}' AND address <= '{_quote(through)}'")
+    return {
+        "inserted": stats["inserted"],
+        "merge_seconds": stats["seconds"],
+        "bytes_billed": stats["bytes_billed"],
+        "est_cost_usd": round(stats["bytes_billed"] / 2 ** 40 * BQ_USD_PER_TIB, 4),
+    }
+
+
+def staged_max_address(sink, staging_table_id: str) -> str:
+    """Last address already in staging, where a resumed run picks the keyset up."""
+    return sink.max_value(staging_table_id, "address") or ""
+
+
+# ──────────────────────────────────────────────────────────────
+# 🔁 Ingestion run
+# ──────────────────────────────────────────────────────────────
+_DONE = object()
+
+
+def _produce_pages(sdk, patterns, pages: queue.Queue, stop: threading.Event, status: dict, after: str,
+                   batch_size: int, max_rows: int, start: str, end: str, label: str):
+    """Query pages back to back; `pages.put` blocks once `max_in_flight` pages await upload."""
+    total, batch = 0, 0
+    try:
+        while not stop.is_set() and (max_rows is None or total < max_rows):
+            limit = batch_size if max_rows is None else min(batch_size, max_rows - total)
+            df, stats = fetch_wallet_page(sdk, keyset_query(patterns, after, limit, start, end, label))
+            if df.empty:
+                print(f"✅ All data fetched. No more addresses after {after or 'start'}.")
+                break
+
+            after = df["address"].iloc[-1]
+            total += len(df)
+            stats.update(batch=batch, last_address=after)
+            batch += 1
+            t0 = time.perf_counter()
+            pages.put((df, stats))
+            status["producer_blocked"] += time.perf_counter() - t0
+            if len(df) < limit:
+                break
+    except Exception as e:
+        status["error"] = f"Query failed after {after or 'start'}: {e}"
+        print(f"❌ {status['error']}")
+    finally:
+        pages.put(_DONE)
+
+
+def print_stage_report(result: dict):
+    """Rows/s per stage; busy time adds up to more than wall time when stages overlap."""
+    batches, merges = result["batches"], result["merges"]
+    staged, wall = result["rows_staged"], result["seconds"]
+    stages = [
+        ("Flipside query", staged, sum(b["flipside_seconds"] for b in batches)),
+        ("Staging load", staged, sum(b["load_seconds"] for b in batches)),
+        ("MERGE", result["rows_inserted"], sum(m["merge_seconds"] for m in merges)),
+    ]
+    print("\n⏱️ Stage throughput:")
+    for name, rows, busy in stages:
+        print(f"   {name:<15} {rows:>12,} rows  {busy:>8.1f}s busy  {rows / busy if busy else 0:>10,.0f} rows/s")
+    busy_total = sum(busy for _, _, busy in stages)
+    print(f"   {'End to end':<15} {staged:>12,} rows  {wall:>8.1f}s wall  {staged / wall if wall else 0:>10,.0f} rows/s "
+          f"({max(0.0, busy_total - wall):.1f}s overlapped)")
+    print(f"   Uploader waited {result['uploader_idle']:.1f}s for pages; "
+          f"producer waited {result['producer_blocked']:.1f}s on a full queue")
+
+
+def ingest_wallet_labels(sdk, patterns, final_table_id: str, staging_table_id: str, sink=None,
+                         start: str = "2022-01-01", end: str = "2024-12-31", label: str = "CEX",
+                         batch_size: int = FLIPSIDE_BATCH_SIZE, max_rows: int = None, merge_every: int = 0,
+                         resume: bool = False, max_in_flight: int = 2) -> dict:
+    """
+    Page labeled wallets matching `patterns` out of Flipside by address and land them in BigQuery.
+
+    Queries and uploads overlap: a producer thread fetches the next page while the previous one
+    loads into staging, with at most `max_in_flight` fetched pages waiting in between. Loads run
+    in page order, so staging always holds a contiguous address range.
+
+    Pages only ever append to staging; the final table is touched by one MERGE at the end, or one
+    every `merge_every` pages (each covering just the addresses staged since the last one).
+    Without `resume`, staging is emptied first; with it, paging continues after the highest
+    address already staged. Tables live in `sink` (the active warehouse sink by default).
+    Returns run totals with a per-batch log and stage timings.
+    """
+    sink = sink or get_sink()
+    project_id, dataset_id, final_table = final_table_id.split(".")
+
+    after = staged_max_address(sink, staging_table_id) if resume else ""
+    merged_through = ""
+    if after:
+        print(f"🔁 Resuming after {after}")
+
+    batches, merges = [], []
+    status = {"error": None, "producer_blocked": 0.0}
+    uploader_idle = 0.0
+    t0 = time.time()
+
+    def _merge(through):
+        nonlocal merged_through
+        stats = merge_staging(sink, staging_table_id, final_table_id, merged_through, through)
+        merged_through = through
+        merges.append(stats)
+        print(f"🔀 MERGE → {final_table}: {stats['inserted']:,} new rows in {stats['merge_seconds']}s, "
+              f"{stats['bytes_billed'] / 1e9:,.2f} GB billed (~${stats['est_cost_usd']})")
+
+    pages = queue.Queue(maxsize=max(1, max_in_flight))
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=_produce_pages, name="flipside-producer", daemon=True,
+        args=(sdk, patterns, pages, stop, status, after, batch_size, max_rows, start, end, label),
+    )
+    producer.start()
+
+    try:
+        # Emptying staging overlaps the first query instead of delaying it
+        if not resume:
+            load_staging(sink, pd.DataFrame(columns=WALLET_COLUMNS), staging_table_id, truncate=True)
+
+        while True:
+            t_wait = time.perf_counter()
+            item = pages.get()
+            uploader_idle += time.perf_counter() - t_wait
+            if item is _DONE:
+                break
+            if stop.is_set():
+                continue   # draining so the producer can see the stop and finish
+
+            df, stats = item
+            try:
+                stats.update(load_staging(sink, df, staging_table_id))
+            except Exception as e:
+                status["error"] = f"Staging load failed for batch {stats['batch']}: {e}"
+                print(f"❌ {status['error']}")
+                stop.set()
+                continue
+
+            after = stats["last_address"]
+            batches.append(stats)
+            exec_s = stats["flipside_exec_seconds"]
+            print(f"🧮 Batch {stats['batch']}: {len(df):,} rows through {after} — Flipside {stats['flipside_seconds']}s"
+                  f"{f' (exec {exec_s}s)' if exec_s is not None else ''}, staging load {stats['load_seconds']}s")
+
+            if merge_every and len(batches) % merge_every == 0:
+                _merge(after)
+    except Exception as e:
+        status["error"] = status["error"] or f"{type(e).__name__}: {e}"
+        print(f"❌ {status['error']}")
+        stop.set()
+        while pages.get() is not _DONE:
+            pass
+    producer.join()
+
+    # Whatever reached staging is merged, even when a later page failed
+    if after and after != merged_through:
+        try:
+            _merge(after)
+        except Exception as e:
+            status["error"] = status["error"] or f"MERGE failed: {e}"
+            print(f"❌ MERGE failed: {e}")
+
+    elapsed = time.time() - t0
+    total = sum(b["rows"] for b in batches)
+    inserted = sum(m["inserted"] for m in merges)
+    error = status["error"]
+    log_load_metadata(project_id, dataset_id, final_table, start, end, inserted,
+                      "failed" if error else "success", error)
+    print(f"\n🎉 Staged {total:,} rows across {len(batches)} batches, merged {inserted:,} new rows "
+          f"in {timedelta(seconds=int(elapsed))}.")
+
+    result = {"rows_staged": total, "rows_inserted": inserted, "batches": batches, "merges": merges,
+              "seconds": round(elapsed, 2), "error": error, "last_address": after,
+              "uploader_idle": round(uploader_idle, 2), "producer_blocked": round(status["producer_blocked"], 2)}
+    print_stage_report(result)
+    return result
@@ -0,0 +1,282 @@
+# src/warehouseSink.py
+#
+# Where pipelines store data. One interface for watermarks, appends, deduplicating merges and
+# the audit log, with a BigQuery sink for real runs and an in-process DuckDB sink for local
+# runs, tests and benchmarks that need no network at all.
+
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import pandas as pd
+
+import bigQueryUtils
+from requestScheduler import get_scheduler
+
+WAREHOUSE_SINK = os.getenv("WAREHOUSE_SINK", "bigquery")
+WAREHOUSE_DUCKDB_PATH = os.getenv("WAREHOUSE_DUCKDB_PATH", "local_warehouse.duckdb")
+
+BQ_TO_DUCKDB = {"STRING": "VARCHAR", "FLOAT": "DOUBLE", "FLOAT64": "DOUBLE", "INTEGER": "BIGINT",
+                "INT64": "BIGINT", "TIMESTAMP": "TIMESTAMPTZ", "DATETIME": "TIMESTAMP", "DATE": "DATE",
+                "BOOLEAN": "BOOLEAN"}
+
+
+class WarehouseSink(ABC):
+    """
+    Storage operations the pipelines need. Tables are "dataset.table" or "project.dataset.table";
+    a sink resolves missing parts itself. Schemas are lists of bigquery.SchemaField.
+    """
+
+    name = "sink"
+
+    @abstractmethod
+    def max_value(self, table, column):
+        """MAX(column) of `table`, e.g. a date watermark or the last keyset address."""
+        raise NotImplementedError
+
+    def latest_date(self, table, column="date"):
+        return self.max_value(table, column)
+
+    @abstractmethod
+    def append(self, df, table, schema=None, mode="append", allow_field_addition=False, job_id_prefix=None):
+        """
+        Write `df` to `table` (mode: append / replace / fail, as pandas_gbq's if_exists); returns an
+        UploadResult. Appends under the same `job_id_prefix` are only applied once.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def merge_dedupe(self, source, target, key, columns, where=None):
+        """
+        Insert rows of `source` (optionally filtered by the SQL `where`) whose `key` is not yet in
+        `target`, one row per key. Returns {"inserted", "seconds", "bytes_billed"}.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def audit(self, project_id, dataset_id, row):
+        """Queue one audit-log row for `<dataset_id>.load_audit_log`."""
+        raise NotImplementedError
+
+    def flush_audit(self):
+        return 0
+
+
+# ──────────────────────────────────────────────────────────────
+# ☁️ BigQuery
+# ──────────────────────────────────────────────────────────────
+class BigQuerySink(WarehouseSink):
+    """The shared BigQuery clients, chunked load jobs and buffered audit log from bigQueryUtils."""
+
+    name = "bigquery"
+
+    def __init__(self, project_id=None):
+        self.project_id = project_id
+
+    def _ref(self, table):
+        parts = table.split(".")
+        if len(parts) == 3:
+            return parts[0], table
+        project = self.project_id or bigQueryUtils.get_client().project
+        return project, f"{project}.{table}"
+
+    @staticmethod
+    def _table_schema(client, ref):
+        """The destination's own schema, so an undeclared append matches it; [] (inferred) for a new table."""
+        from google.api_core.exceptions import NotFound
+
+        try:
+            return get_scheduler().call("bigquery", client.get_table, ref).schema
+        except NotFound:
+            return []
+
+    def max_value(self, table, column):
+        project, ref = self._ref(table)
+        client = bigQueryUtils.get_client(project)
+        query = f"SELECT MAX({column}) AS latest FROM `{ref}`"
+        rows = list(get_scheduler().call("bigquery", lambda: client.query(query).result()))
+        return rows[0].latest if rows else None
+
+    def append(self, df, table, schema=None, mode="append", allow_field_addition=False, job_id_prefix=None):
+        from google.cloud import bigquery
+
+        project, ref = self._ref(table)
+        client = bigQueryUtils.get_client(project)
+        if mode == "append":
+            if schema is None:
+                schema = self._table_schema(client, ref)
+            options = [bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION] if allow_field_addition else None
+            return bigQueryUtils.upload_dataframe_chunked(df, ref, schema, client=client,
+                                                          schema_update_options=options,
+                                                          job_id_prefix=job_id_prefix)
+
+        # Replacing or guarding a table's contents has to be one job, so it isn't chunked
+        t0 = time.perf_counter()
+        job_config = bigquery.LoadJobConfig(schema=schema, write_disposition=bigQueryUtils.WRITE_DISPOSITIONS[mode])
+        job = get_scheduler().call("bigquery", lambda: client.load_table_from_dataframe(
+            df, ref, job_config=job_config).result())
+        seconds = round(time.perf_counter() - t0, 3)
+        chunk = {"chunk": 0, "rows": len(df), "bytes": 0, "seconds": seconds, "attempts": 1,
+                 "status": "loaded", "error": None, "job_id": job.job_id}
+        return bigQueryUtils.UploadResult(ref, [chunk], seconds)
+
+    def merge_dedupe(self, source, target, key, columns, where=None):
+        project, target_ref = self._ref(target)
+        _, source_ref = self._ref(source)
+        client = bigQueryUtils.get_client(project)
+        others = [c for c in columns if c != key]
+        sql = f"""
+        MERGE `{target_ref}` T
+        USING (
+          SELECT {key}{''.join(f', MIN({c}) AS {c}' for c in others)}
+          FROM `{source_ref}`
+          {f'WHERE {where}' if where else ''}
+          GROUP BY {key}
+        ) S
+        ON T.{key} = S.{key}
+        WHEN NOT MATCHED THEN
+          INSERT ({', '.join(columns)}) VALUES ({', '.join(f'S.{c}' for c in columns)})
+        """
+        t0 = time.perf_counter()
+        job = get_scheduler().call("bigquery", lambda: client.query(sql))
+        job.result()
+        return {"inserted": job.num_dml_affected_rows or 0, "seconds": round(time.perf_counter() - t0, 2),
+                "bytes_billed": job.total_bytes_billed or 0}
+
+    def audit(self, project_id, dataset_id, row):
+        bigQueryUtils._audit_log.add(project_id, dataset_id, row)
+
+    def flush_audit(self):
+        return bigQueryUtils._audit_log.flush()
+
+
+# ──────────────────────────────────────────────────────────────
+# 🦆 DuckDB (local)
+# ──────────────────────────────────────────────────────────────
+class DuckDBSink(WarehouseSink):
+    """
+    One DuckDB file (or ":memory:") standing in for the warehouse: datasets become schemas, the
+    project part of a table id is ignored. Appends add missing columns as BigQuery's field
+    addition would, and audit rows are inserted right away since there is no job overhead. An
+    append is a single insert that lands whole or not at all, so `job_id_prefix` is ignored.
+    """
+
+    name = "duckdb"
+
+    def __init__(self, path=WAREHOUSE_DUCKDB_PATH):
+        import duckdb
+
+        self.path = path
+        self.con = duckdb.connect(path)
+        self.con.execute("SET TimeZone = 'UTC'")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _ref(table):
+        dataset, name = table.split(".")[-2:]
+        return dataset, f'"{dataset}"."{name}"'
+
+    def _exists(self, table):
+        dataset, name = table.split(".")[-2:]
+        return bool(self.con.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = ? AND table_name = ?",
+            [dataset, name]).fetchone()[0])
+
+    def max_value(self, table, column):
+        with self._lock:
+            if not self._exists(table):
+                return None
+            _, ref = self._ref(table)
+            return self.con.execute(f'SELECT MAX("{column}") FROM {ref}').fetchone()[0]
+
+    def append(self, df, table, schema=None, mode="append", allow_field_addition=False, job_id_prefix=None):
+        t0 = time.perf_counter()
+        dataset, ref = self._ref(table)
+        declared = {f.name: BQ_TO_DUCKDB.get(f.field_type.upper(), "VARCHAR") for f in schema or []}
+        select = ", ".join(f'CAST("{c}" AS {declared[c]}) AS "{c}"' if c in declared else f'"{c}"'
+                           for c in df.columns)
+
+        with self._lock:
+            self.con.execute(f'CREATE SCHEMA IF NOT EXISTS "{dataset}"')
+            self.con.register("_incoming", df)
+            try:
+                exists = self._exists(table)
+                if exists and mode == "fail" and self.con.execute(f"SELECT COUNT(*) FROM {ref}").fetchone()[0]:
+                    raise ValueError(f"❌ {table} already has data")
+                if exists and mode == "replace":
+                    self.con.execute(f"DROP TABLE {ref}")
+                    exists = False
+
+                if not exists:
+                    self.con.execute(f"CREATE TABLE {ref} AS SELECT {select} FROM _incoming")
+                else:
+                    current = {r[0] for r in self.con.execute(f"DESCRIBE {ref}").fetchall()}
+                    incoming = self.con.execute(f"DESCRIBE SELECT {select} FROM _incoming").fetchall()
+                    for col, col_type, *_ in incoming:
+                        if col not in current:
+                            self.con.execute(f'ALTER TABLE {ref} ADD COLUMN "{col}" {col_type}')
+                    self.con.execute(f"INSERT INTO {ref} BY NAME SELECT {select} FROM _incoming")
+            finally:
+                self.con.unregister("_incoming")
+
+        seconds = round(time.perf_counter() - t0, 3)
+        chunk = {"chunk": 0, "rows": len(df), "bytes": int(df.memory_usage(deep=True).sum()), "seconds": seconds,
+                 "attempts": 1, "status": "loaded", "error": None, "job_id": None}
+        return bigQueryUtils.UploadResult(table, [chunk], seconds)
+
+    def merge_dedupe(self, source, target, key, columns, where=None):
+        t0 = time.perf_counter()
+        target_dataset, target_ref = self._ref(target)
+        _, source_ref = self._ref(source)
+        others = [c for c in columns if c != key]
+        cols = ", ".join(f'"{c}"' for c in columns)
+        with self._lock:
+            if not self._exists(target):
+                self.con.execute(f'CREATE SCHEMA IF NOT EXISTS "{target_dataset}"')
+                self.con.execute(f"CREATE TABLE {target_ref} AS SELECT {cols} FROM {source_ref} LIMIT 0")
+            inserted = self.con.execute(f"""
+                INSERT INTO {target_ref} ({cols})
+                SELECT "{key}"{''.join(f', MIN("{c}")' for c in others)}
+                FROM {source_ref} S
+                WHERE {where or 'TRUE'}
+                  AND NOT EXISTS (SELECT 1 FROM {target_ref} T WHERE T."{key}" = S."{key}")
+                GROUP BY "{key}"
+            """).fetchone()[0]
+        return {"inserted": inserted, "seconds": round(time.perf_counter() - t0, 2), "bytes_billed": 0}
+
+    def audit(self, project_id, dataset_id, row):
+        self.append(pd.DataFrame([row]), f"{dataset_id}.{bigQueryUtils.AUDIT_TABLE}",
+                    schema=bigQueryUtils.AUDIT_SCHEMA)
+
+    def query(self, sql):
+        """Run SQL against the local warehouse and return a DataFrame (for inspection and benchmarks)."""
+        with self._lock:
+            return self.con.execute(sql).df()
+
+    def close(self):
+        self.con.close()
+
+
+# ──────────────────────────────────────────────────────────────
+# 🔌 Active sink
+# ──────────────────────────────────────────────────────────────
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_sink():
+    """The sink every storing path uses: WAREHOUSE_SINK=duckdb switches the process to local storage."""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = DuckDBSink() if WAREHOUSE_SINK == "duckdb" else BigQuerySink()
+        return _sink
+
+
+def set_sink(sink):
+    """Swap the active sink (e.g. a DuckDBSink(":memory:") in a benchmark); returns the previous one."""
+    global _sink
+    with _sink_lock:
+        previous, _sink = _sink, sink
+        return previous